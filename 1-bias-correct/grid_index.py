@@ -0,0 +1,131 @@
+import hashlib
+import os
+import cartopy.crs as ccrs
+import numpy as np
+import pandas as pd
+from sklearn.neighbors import BallTree
+
+EARTH_RADIUS_KM = 6371.0
+
+# Largest distance (km) between a grid centre and its model cell, the
+# notebooks searched in a box of +-0.5 degrees around the centre
+MAX_DISTANCE_KM = 50.0
+
+# Rotated pole of the CLIMEX2 grid
+CLIMEX_POLE_LAT = 39.25
+CLIMEX_POLE_LON = 198.0
+
+
+def grid_centres(grid):
+    """Lon/lat (EPSG:4326) of the centre of every cell of the 10 km grid."""
+    centres = grid.centroid.to_crs(4326)
+    return centres.x.to_numpy(), centres.y.to_numpy()
+
+
+def to_rotated_pole(lon, lat, pole_lon=CLIMEX_POLE_LON, pole_lat=CLIMEX_POLE_LAT):
+    """Convert arrays of lon/lat to the rotated-pole coordinates of CLIMEX2 in one transform."""
+    rotated_pole = ccrs.RotatedPole(pole_longitude=pole_lon, pole_latitude=pole_lat)
+    points = rotated_pole.transform_points(ccrs.PlateCarree(), np.asarray(lon, dtype=float), np.asarray(lat, dtype=float))
+    return points[:, 0], points[:, 1]
+
+
+def valid_cells(x, y, values):
+    """
+    Coordinates and indices of the model cells holding a value.
+
+    Parameters:
+    - x: (nx,) array, longitudes (rlon for CLIMEX2) of the model grid
+    - y: (ny,) array, latitudes (rlat for CLIMEX2) of the model grid
+    - values: (ny, nx) array, NaN where the model has no value (sea)
+
+    Returns:
+    - pd.DataFrame with the columns lon, lat, i (index along x) and j (index along y)
+    """
+    j, i = np.nonzero(~np.isnan(values))
+    return pd.DataFrame({'lon': np.asarray(x)[i], 'lat': np.asarray(y)[j], 'i': i, 'j': j})
+
+
+class GridIndex:
+    """
+    Haversine BallTree over the valid cells of a model grid.
+
+    The coordinates are the ones of the model grid: lon/lat for ERA5-Land and
+    rlon/rlat for CLIMEX2, the rotation of the pole keeping the great-circle
+    distances. All the points are answered in one batched query.
+
+    Parameters:
+    - cells: pd.DataFrame, valid cells with the columns lon, lat, i, j (see valid_cells)
+    """
+
+    def __init__(self, cells):
+        self.cells = cells.reset_index(drop=True)
+        self.tree = BallTree(np.deg2rad(self.cells[['lat', 'lon']].to_numpy()), metric='haversine')
+
+    def query(self, lon, lat, max_distance_km=MAX_DISTANCE_KM):
+        """
+        Nearest valid cell of every point.
+
+        Returns a pd.DataFrame with the i, j, lon, lat of the cell and the
+        distance (km), NaN for the points without any cell closer than
+        max_distance_km.
+        """
+        points = np.deg2rad(np.column_stack([lat, lon]))
+        distance, nearest = self.tree.query(points, k=1)
+        distance_km = distance[:, 0] * EARTH_RADIUS_KM
+
+        result = self.cells.iloc[nearest[:, 0]].reset_index(drop=True).astype(float)
+        result['distance_km'] = distance_km
+        result.loc[distance_km > max_distance_km, :] = np.nan
+        return result
+
+
+def cache_key(ids, lon, lat, x, y, values, max_distance_km):
+    """Hash of the grid (ids and centres), of the model grid and of its mask."""
+    digest = hashlib.sha1()
+    for array in (ids, lon, lat, x, y, np.isnan(values)):
+        array = np.ascontiguousarray(array)
+        digest.update(str(array.shape).encode())
+        digest.update(array.tobytes())
+    digest.update(str(max_distance_km).encode())
+    return digest.hexdigest()[:16]
+
+
+def grid_index_table(grid, x, y, values, rotated=False, max_distance_km=MAX_DISTANCE_KM, cache_dir=None):
+    """
+    Table id -> (i, j) of the nearest valid model cell of every cell of the 10 km grid.
+
+    Parameters:
+    - grid: gpd.GeoDataFrame, 10 km grid with a unique 'id' per cell
+    - x: (nx,) array, longitudes (rlon for CLIMEX2) of the model grid
+    - y: (ny,) array, latitudes (rlat for CLIMEX2) of the model grid
+    - values: (ny, nx) array, one time step of the model, NaN where it has no value
+    - rotated: bool, the model grid is in the rotated-pole coordinates of CLIMEX2
+    - max_distance_km: float, grid cells farther than this from any model cell are missed
+    - cache_dir: str, folder where the table is kept, keyed by the grid and the mask (default: no cache)
+
+    Returns:
+    - table: pd.DataFrame with the columns id, i, j, lon, lat (of the model cell) and distance_km
+    - missed_ids: list of the grid ids without any model cell within max_distance_km
+    """
+    ids = grid['id'].to_numpy()
+    lon, lat = grid_centres(grid)
+    if rotated:
+        lon, lat = to_rotated_pole(lon, lat)
+
+    path = None
+    if cache_dir is not None:
+        key = cache_key(ids, lon, lat, x, y, values, max_distance_km)
+        path = os.path.join(cache_dir, f'grid_index_{key}.csv')
+
+    if path is not None and os.path.exists(path):
+        table = pd.read_csv(path)
+    else:
+        table = GridIndex(valid_cells(x, y, values)).query(lon, lat, max_distance_km)
+        table.insert(0, 'id', ids)
+        if path is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+            table.to_csv(path + '.tmp', index=False)
+            os.replace(path + '.tmp', path)
+
+    missed_ids = table.loc[table['i'].isna(), 'id'].astype(int).tolist()
+    return table, missed_ids
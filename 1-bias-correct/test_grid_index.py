@@ -0,0 +1,66 @@
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+from grid_index import EARTH_RADIUS_KM, GridIndex, grid_index_table, to_rotated_pole, valid_cells
+
+
+def haversine_km(lon1, lat1, lon2, lat2):
+    lon1, lat1, lon2, lat2 = (np.deg2rad(v) for v in (lon1, lat1, lon2, lat2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+
+def model_grid(seed=0):
+    """0.1 degree model grid over southern Europe with a 'sea' of NaN."""
+    x, y = np.arange(-5.0, 5.0, 0.1), np.arange(38.0, 44.0, 0.1)
+    values = np.random.default_rng(seed).random((len(y), len(x)))
+    values[:, :30] = np.nan
+    return x, y, values
+
+
+def test_nearest_valid_cell():
+    x, y, values = model_grid()
+    cells = valid_cells(x, y, values)
+    rng = np.random.default_rng(1)
+    lon, lat = rng.uniform(-6, 6, 300), rng.uniform(37, 45, 300)
+    result = GridIndex(cells).query(lon, lat, max_distance_km=30)
+
+    # brute force over all the valid cells
+    distances = haversine_km(lon[:, None], lat[:, None], cells['lon'].to_numpy()[None], cells['lat'].to_numpy()[None])
+    nearest = distances.min(axis=1)
+    far = nearest > 30
+    assert far.any() and not far.all()
+    assert result.loc[far].isna().all().all()
+    np.testing.assert_allclose(result.loc[~far, 'distance_km'], nearest[~far], rtol=1e-9)
+    expected = cells.iloc[distances.argmin(axis=1)].reset_index(drop=True)
+    np.testing.assert_array_equal(result.loc[~far, ['i', 'j']], expected.loc[~far, ['i', 'j']])
+    assert not np.isnan(values[result.loc[~far, 'j'].astype(int), result.loc[~far, 'i'].astype(int)]).any()
+
+
+def test_rotated_pole_keeps_distances():
+    lon, lat = np.array([2.0, 14.5, -8.0]), np.array([41.0, 46.2, 38.7])
+    rlon, rlat = to_rotated_pole(lon, lat)
+    assert not np.allclose(rlon, lon)
+    np.testing.assert_allclose(haversine_km(rlon[:, None], rlat[:, None], rlon[None], rlat[None]),
+                               haversine_km(lon[:, None], lat[:, None], lon[None], lat[None]), atol=1e-6)
+
+
+def test_cached_table(tmp_path):
+    x, y, values = model_grid()
+    squares = [shapely.box(lon, lat, lon + 0.1, lat + 0.1) for lon in np.arange(-4, 4, 0.5) for lat in (39.0, 42.0)]
+    grid = gpd.GeoDataFrame({'id': np.arange(len(squares)) + 1}, geometry=squares, crs=4326).to_crs(3035)
+
+    table, missed = grid_index_table(grid, x, y, values, cache_dir=tmp_path)
+    assert list(table['id']) == list(grid['id'])
+    assert missed == table.loc[table['i'].isna(), 'id'].tolist() and missed
+    assert len(list(tmp_path.iterdir())) == 1
+
+    cached, cached_missed = grid_index_table(grid, x, y, values, cache_dir=tmp_path)
+    pd.testing.assert_frame_equal(cached, table, check_dtype=False)
+    assert cached_missed == missed
+
+    # another mask is another entry
+    values[:, 30:40] = np.nan
+    other, other_missed = grid_index_table(grid, x, y, values, cache_dir=tmp_path)
+    assert len(list(tmp_path.iterdir())) == 2 and len(other_missed) > len(missed)
@@ -0,0 +1,264 @@
+import json
+import os
+import pickle
+import time
+import numpy as np
+
+# numba compiles the traversal of ArrayForest.predict_proba; without it the
+# trees are walked with numpy, slower than the sklearn forest
+try:
+    import numba
+except ImportError:
+    numba = None
+
+# Node arrays of a fitted forest: they load in milliseconds and are
+# memory-mapped, so the worker processes of the inference share one copy of
+# the trees instead of unpickling one each. With numba, predict_proba walks
+# every tree for LANES rows in lockstep, so that the memory reads of the
+# rows overlap instead of waiting for each other as in the one-row-at-a-time
+# traversal of sklearn.
+
+# Description of an exported forest (trees, features, classes), next to the node arrays
+FOREST_FILE = 'forest.json'
+
+# Node arrays of an exported forest, one .npy each, the nodes of all the trees one after the other
+NODE_ARRAYS = ('feature', 'threshold', 'left', 'value')
+
+# Rows predicted at once by ArrayForest.predict_proba
+BATCH_ROWS = 65536
+
+# Levels walked between two checks of the rows that reached a leaf (numpy traversal)
+CHECK_EVERY = 4
+
+# Rows walked in lockstep through a tree, and rows of a task of the thread pool (compiled traversal)
+LANES = 8
+THREAD_ROWS = 4096
+
+
+def float32_thresholds(threshold):
+    """
+    Largest float32 not above every float64 threshold, so that x <= threshold
+    gives the same result in float32 for float32 x (the features are compared
+    in float32 by the sklearn trees).
+    """
+    threshold = np.asarray(threshold, dtype=np.float64)
+    rounded = threshold.astype(np.float32)
+    above = rounded.astype(np.float64) > threshold
+    rounded[above] = np.nextafter(rounded[above], np.float32(-np.inf))
+    return rounded
+
+
+def breadth_first_order(children_left, children_right):
+    """Nodes of a sklearn tree level by level, the two children of a node next to each other."""
+    levels, level = [], np.array([0])
+    while len(level):
+        levels.append(level)
+        split = level[children_left[level] >= 0]
+        level = np.column_stack([children_left[split], children_right[split]]).ravel()
+    return np.concatenate(levels)
+
+
+def export_forest(model, path):
+    """
+    Flatten a fitted RandomForestClassifier (or any forest of decision tree
+    classifiers) into contiguous node arrays saved as .npy files, read back
+    memory-mapped by ArrayForest.
+
+    The nodes of every tree are stored level by level, so that the right
+    child of a node is next to its left child, and the trees one after the
+    other. The leaves point to themselves.
+
+    Layout of the folder:
+    - forest.json: classes, features, depth and the first node of every tree
+    - feature.npy (int32), threshold.npy (float32): split of every node, go left if x <= threshold
+    - left.npy (int32): left child of every node in its tree (right child: left + 1, leaves: the node itself)
+    - value.npy (float32): class probabilities of every node, (nodes, classes)
+
+    Parameters:
+    - model: fitted forest classifier (estimators_ and classes_)
+    - path: str, output folder
+
+    Returns the ArrayForest.
+    """
+    arrays = {name: [] for name in NODE_ARRAYS}
+    offsets = [0]
+    for estimator in model.estimators_:
+        tree = estimator.tree_
+        order = breadth_first_order(tree.children_left, tree.children_right)
+        position = np.empty(tree.node_count, dtype=np.int64)
+        position[order] = np.arange(tree.node_count)
+        leaf = tree.children_left[order] < 0
+
+        arrays['feature'].append(np.where(leaf, 0, tree.feature[order]).astype(np.int32))
+        arrays['threshold'].append(np.where(leaf, np.inf, float32_thresholds(tree.threshold[order])).astype(np.float32))
+        arrays['left'].append(np.where(leaf, np.arange(tree.node_count), position[tree.children_left[order]])
+                              .astype(np.int32))
+        # counts (or fractions) of the training samples of every class in the node
+        value = tree.value[order, 0, :]
+        arrays['value'].append((value / value.sum(axis=1, keepdims=True)).astype(np.float32))
+        offsets.append(offsets[-1] + tree.node_count)
+
+    os.makedirs(path, exist_ok=True)
+    for name, parts in arrays.items():
+        np.save(os.path.join(path, f'{name}.npy'), np.concatenate(parts))
+    info = {
+        'classes': np.asarray(model.classes_).tolist(),
+        'n_features': int(model.n_features_in_),
+        'max_depth': int(max(estimator.tree_.max_depth for estimator in model.estimators_)),
+        'offsets': offsets,
+    }
+    with open(os.path.join(path, FOREST_FILE), 'w') as f:
+        json.dump(info, f, indent=4)
+    return ArrayForest(path)
+
+
+if numba is not None:
+    @numba.njit(parallel=True, nogil=True, cache=True)
+    def _forest_proba(XT, feature, threshold, left, value, offsets, depth, out):
+        """
+        Sum over the trees of the class probabilities of the leaf of every row
+        of XT (features x rows float32) in out (rows x classes).
+        """
+        n_rows = XT.shape[1]
+        for task in numba.prange((n_rows + THREAD_ROWS - 1) // THREAD_ROWS):
+            nodes = np.empty(LANES, dtype=np.int64)
+            stop_task = min(n_rows, (task + 1) * THREAD_ROWS)
+            for t in range(len(offsets) - 1):
+                base = offsets[t]
+                for start in range(task * THREAD_ROWS, stop_task, LANES):
+                    lanes = min(LANES, stop_task - start)
+                    nodes[:lanes] = 0
+                    # the leaves point to themselves, so the rows that reached one stay there
+                    for _ in range(depth):
+                        for k in range(lanes):
+                            node = base + nodes[k]
+                            nodes[k] = left[node] + (XT[feature[node], start + k] > threshold[node])
+                    for k in range(lanes):
+                        for c in range(value.shape[1]):
+                            out[start + k, c] += value[base + nodes[k], c]
+
+
+class ArrayForest:
+    """
+    Forest exported by export_forest, with the node arrays memory-mapped so
+    that it loads in milliseconds and the processes using the same forest
+    share its pages.
+
+    predict_proba gives the probabilities of the sklearn forest (mean of
+    the class probabilities of the leaves, up to the float32 rounding of the
+    leaves). With numba it is compiled and runs in a thread pool; without it,
+    each tree is walked with numpy for a whole batch of rows at once, one
+    level per step, which is slower than the sklearn forest.
+
+    Parameters:
+    - path: str, folder written by export_forest
+    - mmap: bool, memory-map the node arrays (False to read them in memory)
+    - n_jobs: int, threads of the compiled traversal, -1 for all of them (default: 1, as sklearn)
+    """
+
+    def __init__(self, path, mmap=True, n_jobs=None):
+        self.path = str(path)
+        with open(os.path.join(self.path, FOREST_FILE)) as f:
+            self.info = json.load(f)
+        self.arrays = {name: np.load(os.path.join(self.path, f'{name}.npy'), mmap_mode='r' if mmap else None)
+                       for name in NODE_ARRAYS}
+        self.classes_ = np.asarray(self.info['classes'])
+        self.n_features_in_ = self.info['n_features']
+        self.n_jobs = n_jobs
+        self.offsets = np.asarray(self.info['offsets'], dtype=np.int64)
+
+    @property
+    def n_trees(self):
+        return len(self.info['offsets']) - 1
+
+    def tree(self, t):
+        """feature, threshold, left and value arrays of tree t."""
+        start, stop = self.info['offsets'][t], self.info['offsets'][t + 1]
+        return tuple(self.arrays[name][start:stop] for name in NODE_ARRAYS)
+
+    def apply(self, X, t):
+        """Leaf of every row of X (features x rows float32 array, flattened) in tree t."""
+        feature, threshold, left, _ = self.tree(t)
+        n_rows = len(X) // self.n_features_in_
+        # feature * n_rows: offset of the feature of every node in the flattened X
+        column = feature.astype(np.int64) * n_rows
+
+        leaves = np.empty(n_rows, dtype=np.int64)
+        rows = np.arange(n_rows, dtype=np.int64)
+        nodes = np.zeros(n_rows, dtype=np.int64)
+        step = 0
+        while len(rows):
+            x = np.take(X, np.take(column, nodes) + rows)
+            nodes = np.take(left, nodes) + (x > np.take(threshold, nodes))
+            step += 1
+            if step % CHECK_EVERY == 0 or step >= self.info['max_depth']:
+                done = np.take(left, nodes) == nodes
+                if done.all():
+                    leaves[rows] = nodes
+                    break
+                if step >= self.info['max_depth'] or 2 * np.count_nonzero(done) > len(done):
+                    leaves[rows[done]] = nodes[done]
+                    rows, nodes = rows[~done], nodes[~done]
+        return leaves
+
+    def predict_proba(self, X, batch_rows=BATCH_ROWS):
+        """Class probabilities of every row, (rows, classes) float64 array."""
+        X = np.asarray(X)
+        if X.ndim != 2 or X.shape[1] != self.n_features_in_:
+            raise ValueError(f'X has shape {X.shape}, the forest expects {self.n_features_in_} features')
+        probabilities = np.zeros((len(X), len(self.classes_)))
+        if numba is not None:
+            threads = numba.config.NUMBA_NUM_THREADS
+            numba.set_num_threads(threads if self.n_jobs == -1 else max(1, min(self.n_jobs or 1, threads)))
+        for start in range(0, len(X), batch_rows):
+            batch = np.ascontiguousarray(X[start:start + batch_rows].T, dtype=np.float32)
+            if numba is not None:
+                _forest_proba(batch, self.arrays['feature'], self.arrays['threshold'], self.arrays['left'],
+                              self.arrays['value'], self.offsets, self.info['max_depth'],
+                              probabilities[start:start + batch_rows])
+                continue
+            for t in range(self.n_trees):
+                value = self.tree(t)[3]
+                probabilities[start:start + batch_rows] += np.take(value, self.apply(batch.ravel(), t), axis=0)
+        return probabilities / self.n_trees
+
+    def predict(self, X):
+        return self.classes_[self.predict_proba(X).argmax(axis=1)]
+
+
+def benchmark(model_path, forest_path, X, repeat=3):
+    """
+    Compare an ArrayForest with the pickled sklearn forest it was exported
+    from: load time, scoring time and agreement of the probabilities, to
+    weigh the faster start-up of the workers against the slower scoring.
+
+    Parameters:
+    - model_path: str, pickled sklearn forest
+    - forest_path: str, folder of the exported forest
+    - X: array, scaled predictors to score
+    - repeat: int, runs of each predict_proba, the best time is kept
+
+    Returns a dict with the load times (s), the predict_proba times (s), the
+    rows per second of each, the largest difference of the probabilities and
+    whether the traversal of the ArrayForest is compiled (numba).
+    """
+    start = time.perf_counter()
+    with open(model_path, 'rb') as f:
+        model = pickle.load(f)
+    results = {'sklearn_load_s': time.perf_counter() - start}
+    start = time.perf_counter()
+    forest = ArrayForest(forest_path, n_jobs=getattr(model, 'n_jobs', None))
+    results['arrays_load_s'] = time.perf_counter() - start
+
+    probabilities = {}
+    for name, predictor in (('sklearn', model), ('arrays', forest)):
+        best = np.inf
+        for _ in range(repeat):
+            start = time.perf_counter()
+            probabilities[name] = predictor.predict_proba(X)
+            best = min(best, time.perf_counter() - start)
+        results[f'{name}_predict_s'] = best
+        results[f'{name}_rows_per_s'] = len(X) / best
+    results['max_abs_diff'] = float(np.abs(probabilities['sklearn'] - probabilities['arrays']).max())
+    results['compiled'] = numba is not None
+    return results
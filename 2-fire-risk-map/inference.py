@@ -0,0 +1,179 @@
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+import os
+import pickle
+import numpy as np
+import pandas as pd
+from joblib import load
+from forest_arrays import ArrayForest
+from predictors import WEATHER_FEATURES, ROLLING_FEATURES, feature_values
+from weather_store import WeatherStore, write_rows
+
+# Variable of the output store holding the probabilities
+PROBABILITY = 'probability'
+
+# Cells (grid id x date) of the design matrix of one task, bounds the memory of each worker
+CHUNK_CELLS = 2_000_000
+
+# Conversion of the climex2 units: predictor -> (scale, offset), value * scale + offset.
+# The rolling features are derived in the store from the raw climex2 variables, they are converted too
+CLIMEX_UNITS = {
+    'temp': (1.0, -273.15),
+    'temp_mean_7day': (1.0, -273.15),
+    'wind': (3600 / 1000, 0.0),
+    'prcp': (3600 * 24 / 1000, 0.0),
+    'prcp_sum_7day': (3600 * 24 / 1000, 0.0),
+    'prcp_sum_28day': (3600 * 24 / 1000, 0.0),
+}
+
+# State of each worker process, loaded once by _init_worker
+_worker = {}
+
+
+def load_model(model_path):
+    """
+    Pickled sklearn model, or forest exported with forest_arrays.export_forest
+    (folder) memory-mapped: it loads in milliseconds, is shared by the
+    processes and, with numba installed, scores faster than the pickled forest.
+    """
+    if os.path.isdir(model_path):
+        return ArrayForest(model_path)
+    with open(model_path, 'rb') as f:
+        return pickle.load(f)
+
+
+def _init_worker(model_path, scaler_path, store_path, static, features, weather_features, rolling_features, units):
+    model = load_model(model_path)
+    if hasattr(model, 'n_jobs'):
+        model.n_jobs = 1  # the parallelism is across the chunks
+    _worker.update(model=model, scaler=load(scaler_path), store=WeatherStore(store_path), static=static,
+                   features=features, weather_features=weather_features, rolling_features=rolling_features,
+                   units=units)
+
+
+def design_matrix(store, static, features, rows, cols, static_rows, weather_features, rolling_features, units):
+    """
+    Design matrix of a block of grid ids x dates, one line per (id, date) in row-major order.
+
+    Parameters:
+    - store: WeatherStore of the inputs
+    - static: (ids, static predictors) array, the predictors of features that are not weather ones, in that order
+    - features: list of str, predictors in the order of the scaler
+    - rows, cols: int arrays, positions of the ids and dates in the store
+    - static_rows: int array, lines of static of the ids
+    - weather_features, rolling_features: see predictors.py
+    - units: dict, {predictor: (scale, offset)}
+
+    Returns a float64 array (len(rows) * len(cols), len(features)).
+    """
+    pair_rows = np.repeat(rows, len(cols))
+    pair_cols = np.tile(cols, len(rows))
+    X = np.empty((len(pair_rows), len(features)))
+    static_names = [name for name in features if name not in weather_features and name not in rolling_features]
+    static_index = [features.index(name) for name in static_names]
+    X[:, static_index] = np.repeat(static[static_rows], len(cols), axis=0)
+    for k, name in enumerate(features):
+        if name not in weather_features and name not in rolling_features:
+            continue
+        X[:, k] = feature_values(store, name, pair_rows, pair_cols, weather_features, rolling_features)
+        if name in units:
+            scale, offset = units[name]
+            X[:, k] = X[:, k] * scale + offset
+    return X
+
+
+def _predict_chunk(row_start, row_stop, rows, cols):
+    """Scale and predict one block, NaN where a predictor is missing."""
+    w = _worker
+    X = design_matrix(w['store'], w['static'], w['features'], rows, cols, np.arange(row_start, row_stop),
+                      w['weather_features'], w['rolling_features'], w['units'])
+    probabilities = np.full(len(X), np.nan, dtype=np.float32)
+    valid = ~np.isnan(X).any(axis=1)
+    if valid.any():
+        X_scaled = w['scaler'].transform(pd.DataFrame(X[valid], columns=w['features']))
+        probabilities[valid] = w['model'].predict_proba(X_scaled)[:, 1]
+    return row_start, row_stop, probabilities.reshape(row_stop - row_start, len(cols))
+
+
+def predict_period(static, store_path, model_path, scaler_path, dates, output_path,
+                   weather_features=WEATHER_FEATURES, rolling_features=ROLLING_FEATURES, units=None,
+                   chunk_cells=CHUNK_CELLS, workers=4):
+    """
+    Daily fire probability of every grid cell over a period, by chunks of cells x dates.
+
+    The design matrix of each chunk is built from the weather store, scaled
+    and predicted in a worker pool, and the probabilities are written in a
+    preallocated (grid id x date) store on disk, so the memory used does not
+    depend on the length of the period. At most two chunks per worker are in
+    flight.
+
+    Parameters:
+    - static: pd.DataFrame, static predictors indexed by grid id (extra columns are ignored)
+    - store_path: str, WeatherStore of the weather of the period
+    - model_path: str, pickled model with predict_proba (RF_model_<season>.sav) or folder of the
+      forest exported with forest_arrays.export_forest, shared by the workers (faster to score
+      with numba, slower without it, see forest_arrays.py)
+    - scaler_path: str, fitted scaler saved with joblib; its feature_names_in_ give the predictors
+    - dates: list of dates to predict
+    - output_path: str, folder of the output WeatherStore (variable 'probability')
+    - weather_features, rolling_features: see predictors.py
+    - units: dict, {predictor: (scale, offset)} applied to the weather predictors (e.g. CLIMEX_UNITS)
+    - chunk_cells: int, cells (grid id x date) predicted by each task
+    - workers: int, worker processes
+
+    Returns the output WeatherStore.
+    """
+    units = units or {}
+    store = WeatherStore(store_path)
+    features = list(load(scaler_path).feature_names_in_)
+    static_names = [name for name in features if name not in weather_features and name not in rolling_features]
+    static_values = static[static_names].to_numpy(dtype=np.float64)
+
+    rows = store.id_positions(static.index)
+    cols = store.date_positions(dates)
+    if (cols < 0).any():
+        raise ValueError(f'{(cols < 0).sum()} dates are not in the weather store {store_path}')
+    if (rows < 0).any():
+        print(f'{(rows < 0).sum()} grid ids are not in the weather store, their probability is NaN')
+
+    output = WeatherStore.create(output_path, static.index, dates)
+    data = output.writer(PROBABILITY)
+    out_cols = output.date_positions(dates)
+
+    # Blocks of dates and ids of about chunk_cells cells
+    date_block = min(len(cols), max(1, chunk_cells // max(1, len(rows))))
+    id_block = max(1, chunk_cells // date_block)
+    tasks = [(start, min(start + id_block, len(rows)), c)
+             for c in range(0, len(cols), date_block) for start in range(0, len(rows), id_block)]
+
+    def write_finished(limit):
+        """Wait for the chunks in flight until at most limit are left, and write them."""
+        while len(pending) > limit:
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                c = pending.pop(future)
+                row_start, row_stop, probabilities = future.result()
+                write_rows(data, np.arange(row_start, row_stop), out_cols[c:c + probabilities.shape[1]], probabilities)
+                written[0] += 1
+                if written[0] % 50 == 0 or written[0] == len(tasks):
+                    print(f'{written[0]}/{len(tasks)} chunks predicted')
+
+    initargs = (model_path, scaler_path, store_path, static_values, features, weather_features, rolling_features, units)
+    pending, written = {}, [0]
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=initargs) as executor:
+        for row_start, row_stop, c in tasks:
+            write_finished(2 * workers - 1)
+            future = executor.submit(_predict_chunk, row_start, row_stop, rows[row_start:row_stop], cols[c:c + date_block])
+            pending[future] = c
+        write_finished(0)
+
+    output.commit(PROBABILITY, data)
+    return output
+
+
+def row_mean(store, variable=PROBABILITY, chunk_ids=4096):
+    """Mean over the dates of every grid id of a store variable, read by blocks of ids."""
+    cube = store[variable]
+    means = np.empty(store.shape[0])
+    for start in range(0, store.shape[0], chunk_ids):
+        means[start:start + chunk_ids] = np.nanmean(cube[start:start + chunk_ids, :], axis=1)
+    return means
@@ -0,0 +1,269 @@
+import hashlib
+import json
+import math
+import os
+import time
+import traceback
+import warnings
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from sklearn.base import clone
+from sklearn.exceptions import FitFailedWarning
+from sklearn.metrics import f1_score
+from sklearn.model_selection import ParameterGrid
+
+# Training samples of the first round of successive halving are at least this many
+MIN_RESOURCES = 500
+
+# Columns of the score memo, one row per (estimator, params, folds, fold, training samples)
+MEMO_COLUMNS = ['estimator', 'params', 'folds', 'fold', 'n_samples',
+                'f1', 'fit_time', 'predict_time', 'proba_time', 'n_test']
+
+
+def stratified_order(y, seed):
+    """
+    Order of the samples such that the first n of them keep the class
+    proportions of y, for any n (random order within each class).
+    """
+    rng = np.random.default_rng(seed)
+    quantile = np.empty(len(y))
+    for label in np.unique(y):
+        members = np.flatnonzero(y == label)
+        quantile[rng.permutation(members)] = (np.arange(len(members)) + 0.5) / len(members)
+    return np.argsort(quantile, kind='stable')
+
+
+class FoldCache:
+    """
+    Cross-validation folds of a dataset, split and scaled once and kept on disk.
+
+    The scaler is fitted on the training part of each fold, and the training
+    rows are stored in a stratified random order so that the first n of them
+    are the training subsample of n rows used by successive halving.
+
+    Parameters:
+    - X: array or pd.DataFrame, predictors (not scaled)
+    - y: array or pd.Series, labels
+    - cv: cross-validation splitter (e.g. StratifiedKFold with a random_state)
+    - scaler: transformer fitted on each training fold (e.g. StandardScaler()), None to keep X as it is
+    - cache_dir: str, folder where the folds are kept, keyed by the data, cv and scaler (default: no cache)
+    - seed: int, seed of the order of the training rows
+    """
+
+    def __init__(self, X, y, cv, scaler=None, cache_dir=None, seed=0):
+        X = np.asarray(X, dtype=np.float64)
+        y = np.asarray(y)
+        digest = hashlib.sha1()
+        for array in (X, y):
+            digest.update(str(array.shape).encode())
+            digest.update(np.ascontiguousarray(array).tobytes())
+        digest.update(f'{cv!r} {scaler!r} {seed}'.encode())
+        self.key = digest.hexdigest()[:16]
+
+        path = None if cache_dir is None else os.path.join(cache_dir, f'folds_{self.key}.npz')
+        if path is not None and os.path.exists(path):
+            with np.load(path) as stored:
+                arrays = dict(stored)
+        else:
+            arrays = {}
+            for k, (train, test) in enumerate(cv.split(X, y)):
+                train = train[stratified_order(y[train], seed + k)]
+                X_train, X_test = X[train], X[test]
+                if scaler is not None:
+                    fold_scaler = clone(scaler).fit(X_train)
+                    X_train, X_test = fold_scaler.transform(X_train), fold_scaler.transform(X_test)
+                arrays.update({f'X_train_{k}': X_train, f'y_train_{k}': y[train],
+                               f'X_test_{k}': X_test, f'y_test_{k}': y[test]})
+            if path is not None:
+                os.makedirs(cache_dir, exist_ok=True)
+                with open(path + '.tmp', 'wb') as f:
+                    np.savez(f, **arrays)
+                os.replace(path + '.tmp', path)
+
+        self.folds = [tuple(arrays[f'{name}_{k}'] for name in ('X_train', 'y_train', 'X_test', 'y_test'))
+                      for k in range(len(arrays) // 4)]
+
+    def __len__(self):
+        return len(self.folds)
+
+    @property
+    def n_train(self):
+        """Training rows of the smallest fold, the most a round can use."""
+        return min(len(fold[1]) for fold in self.folds)
+
+    def fold(self, k, n_samples=None):
+        """X_train, y_train, X_test, y_test of fold k, with the first n_samples training rows."""
+        X_train, y_train, X_test, y_test = self.folds[k]
+        return X_train[:n_samples], y_train[:n_samples], X_test, y_test
+
+
+class ScoreMemo:
+    """
+    Scores of every (estimator, params, folds, fold, training samples) already
+    evaluated, appended to a CSV so that a new search only evaluates what is new.
+
+    Parameters:
+    - path: str, CSV of the scores (created if needed)
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.scores = {}
+        if os.path.exists(path):
+            for row in pd.read_csv(path, dtype={'estimator': str, 'params': str, 'folds': str}).to_dict('records'):
+                self.scores[self.key(row)] = row
+
+    @staticmethod
+    def key(row):
+        return row['estimator'], row['params'], row['folds'], int(row['fold']), int(row['n_samples'])
+
+    def get(self, row):
+        return self.scores.get(self.key(row))
+
+    def add(self, rows):
+        """Store new scores (list of dicts with the MEMO_COLUMNS)."""
+        if not rows:
+            return
+        for row in rows:
+            self.scores[self.key(row)] = row
+        folder = os.path.dirname(self.path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        pd.DataFrame(rows, columns=MEMO_COLUMNS).to_csv(self.path, mode='a', index=False,
+                                                        header=not os.path.exists(self.path))
+
+
+def candidate_id(estimator, params):
+    """Name of the estimator and JSON of all its parameters once params are set."""
+    all_params = clone(estimator).set_params(**params).get_params(deep=False)
+    return type(estimator).__name__, json.dumps(all_params, sort_keys=True, default=repr)
+
+
+def evaluate(estimator, X_train, y_train, X_test, y_test):
+    """
+    Fit on a training fold and score on the test fold: F1 and fit/predict times (s).
+    A fit that fails is scored NaN with a warning, as GridSearchCV(error_score=np.nan).
+    """
+    start = time.perf_counter()
+    try:
+        model = clone(estimator).fit(X_train, y_train)
+    except Exception:
+        warnings.warn(f'Fit failed, the candidate is scored NaN:\n{traceback.format_exc()}', FitFailedWarning)
+        return {'f1': np.nan, 'fit_time': time.perf_counter() - start, 'predict_time': np.nan,
+                'proba_time': np.nan, 'n_test': len(y_test)}
+    fit_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    y_pred = model.predict(X_test)
+    predict_time = time.perf_counter() - start
+
+    proba_time = np.nan
+    if hasattr(model, 'predict_proba'):
+        start = time.perf_counter()
+        model.predict_proba(X_test)
+        proba_time = time.perf_counter() - start
+
+    return {'f1': f1_score(y_test, y_pred), 'fit_time': fit_time, 'predict_time': predict_time,
+            'proba_time': proba_time, 'n_test': len(y_test)}
+
+
+def halving_budgets(n_candidates, n_max, factor=3, min_resources=MIN_RESOURCES):
+    """
+    Training samples of every round: the last round uses n_max and each round
+    factor times fewer than the next one, the first round having at least
+    min_resources, with enough rounds to bring the candidates down to one.
+    """
+    rounds = 1 + math.ceil(math.log(max(n_candidates, 1)) / math.log(factor))
+    if n_max > min_resources:
+        rounds = min(rounds, 1 + int(math.log(n_max / min_resources) / math.log(factor)))
+    else:
+        rounds = 1
+    return [n_max // factor ** (rounds - 1 - r) for r in range(rounds)]
+
+
+def successive_halving(estimator, param_grid, folds, memo=None, factor=3, min_resources=MIN_RESOURCES,
+                       n_jobs=-1, verbose=True):
+    """
+    Successive-halving search of the parameters maximising the mean F1 over the folds.
+
+    All the candidates are scored on small training subsamples, and only the
+    best 1/factor of them go to the next round, with factor times more
+    training samples, up to the whole training folds. The scores of the
+    (candidate, fold, samples) already in the memo are not computed again.
+    A candidate whose fit fails on a fold is scored NaN (kept in the memo)
+    and does not go to the next round.
+
+    Parameters:
+    - estimator: sklearn classifier
+    - param_grid: dict or list of dicts, as for GridSearchCV
+    - folds: FoldCache
+    - memo: ScoreMemo (default: no memo)
+    - factor: int, ratio of candidates dropped and of samples added at each round
+    - min_resources: int, least training samples of the first round
+    - n_jobs: int, parallel evaluations (joblib)
+    - verbose: bool, print a line per round
+
+    Returns:
+    - best_params: dict, parameters of the best candidate of the last round
+    - results: pd.DataFrame, one row per candidate and round with the mean F1 (and std),
+      fit time (s), predict and predict_proba times (s) and predict_proba latency (µs per row)
+    """
+    candidates = list(ParameterGrid(param_grid))
+    budgets = halving_budgets(len(candidates), folds.n_train, factor, min_resources)
+    rows = []
+    for r, n_samples in enumerate(budgets):
+        tasks = []
+        for c, params in enumerate(candidates):
+            name, all_params = candidate_id(estimator, params)
+            for k in range(len(folds)):
+                tasks.append((c, {'estimator': name, 'params': all_params, 'folds': folds.key,
+                                  'fold': k, 'n_samples': n_samples}))
+
+        todo = [(c, key) for c, key in tasks if memo is None or memo.get(key) is None]
+        computed = Parallel(n_jobs=n_jobs)(
+            delayed(evaluate)(clone(estimator).set_params(**candidates[c]), *folds.fold(key['fold'], n_samples))
+            for c, key in todo)
+        new_rows = [{**key, **scores} for (_, key), scores in zip(todo, computed)]
+        if memo is not None:
+            memo.add(new_rows)
+        scores = {ScoreMemo.key(row): row for row in new_rows}
+
+        fold_scores = pd.DataFrame([{'candidate': c, **(scores.get(ScoreMemo.key(key)) or memo.get(key))}
+                                    for c, key in tasks])
+        summary = fold_scores.groupby('candidate').agg(
+            f1_mean=('f1', 'mean'), f1_std=('f1', 'std'), fit_time=('fit_time', 'mean'),
+            predict_time=('predict_time', 'mean'), proba_time=('proba_time', 'mean'), n_test=('n_test', 'mean'))
+        # NaN if a fold failed, as GridSearchCV(error_score=np.nan)
+        summary.loc[fold_scores['f1'].isna().groupby(fold_scores['candidate']).any(), 'f1_mean'] = np.nan
+        summary['predict_us_per_row'] = 1e6 * summary['proba_time'].fillna(summary['predict_time']) / summary['n_test']
+        summary = summary.sort_values('f1_mean', ascending=False, kind='stable')
+        failed = int(summary['f1_mean'].isna().sum())
+        if failed == len(summary):
+            raise ValueError(f'All the {len(candidates)} candidates failed to fit on {n_samples} samples')
+        if verbose:
+            print(f'round {r + 1}/{len(budgets)}: {len(candidates)} candidates on {n_samples} samples, '
+                  f'{len(todo)} fits ({len(tasks) - len(todo)} from the memo), best F1 {summary.f1_mean.iloc[0]:.4f}'
+                  + (f', {failed} failed' if failed else ''))
+
+        for c, line in summary.iterrows():
+            rows.append({'estimator': type(estimator).__name__, 'params': candidates[c], 'round': r + 1,
+                         'n_samples': n_samples, **line.drop('n_test').to_dict()})
+        keep = summary.index[summary['f1_mean'].notna()][:max(1, math.ceil(len(candidates) / factor))]
+        best_params = candidates[summary.index[0]]
+        candidates = [candidates[c] for c in keep]
+
+    return best_params, pd.DataFrame(rows)
+
+
+def best_within_budget(results, max_us_per_row=None):
+    """
+    Best candidate (highest mean F1) of the last round of a search whose
+    predict_proba latency is at most max_us_per_row µs per row, None if none is.
+    """
+    last = results[results['round'] == results['round'].max()]
+    if max_us_per_row is not None:
+        last = last[last['predict_us_per_row'] <= max_us_per_row]
+    if last.empty:
+        return None
+    return last.sort_values('f1_mean', ascending=False, kind='stable').iloc[0]['params']
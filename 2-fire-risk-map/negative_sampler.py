@@ -0,0 +1,112 @@
+import numpy as np
+import pandas as pd
+
+# Candidates drawn per missing sample in each batch, a bit more than one to
+# make up for the rejected ones
+OVERSAMPLING = 1.25
+
+
+def pair_keys(id_pos, date_pos, n_dates):
+    """Integer key of (id, date) positions: id position * number of dates + date position."""
+    return np.asarray(id_pos, dtype=np.int64) * n_dates + np.asarray(date_pos, dtype=np.int64)
+
+
+def candidate_strata(ids, dates, stratify=None, regions=None):
+    """
+    Stratum of every candidate id and date.
+
+    Parameters:
+    - ids: array of the candidate grid ids
+    - dates: pd.DatetimeIndex of the candidate dates
+    - stratify: None, 'month', 'region' or a list of them
+    - regions: pd.Series, region of every grid id (index), needed for 'region'
+
+    Returns:
+    - id_strata: array (one value per id, 0 when the ids are not stratified)
+    - date_strata: array (one value per date, 0 when the dates are not stratified)
+    """
+    stratify = [] if stratify is None else [stratify] if isinstance(stratify, str) else list(stratify)
+    unknown = set(stratify) - {'month', 'region'}
+    if unknown:
+        raise ValueError(f"Unknown strata {unknown}, use 'month' and/or 'region'")
+
+    id_strata = np.zeros(len(ids), dtype=np.int64)
+    if 'region' in stratify:
+        if regions is None:
+            raise ValueError("regions (region of every grid id) is needed to stratify by 'region'")
+        id_strata = regions.reindex(ids).to_numpy()
+        if pd.isna(id_strata).any():
+            raise ValueError(f'{pd.isna(id_strata).sum()} candidate ids have no region')
+    date_strata = dates.month.to_numpy() if 'month' in stratify else np.zeros(len(dates), dtype=np.int64)
+    return id_strata, date_strata
+
+
+def sample_negatives(positives, location_ids, dates, n=None, seed=None, stratify=None, regions=None):
+    """
+    Draw random (id, date) pairs without ignition, none of them being a
+    historical ignition nor drawn twice.
+
+    The pairs are encoded as integer keys and drawn by vectorized batches from
+    a seeded generator; the collisions with the ignitions and the pairs
+    already drawn are rejected with hash-based set lookups, so the cost is
+    linear in the number of samples.
+
+    With stratify, the samples of every stratum (month of the date and/or
+    region of the id) are as many as the ignitions of that stratum, and are
+    drawn among its ids and dates.
+
+    Parameters:
+    - positives: pd.DataFrame, historical ignitions with the columns id and date
+    - location_ids: array of the grid ids to draw from
+    - dates: dates to draw from
+    - n: int, number of samples (default: one per ignition), only without stratify
+    - seed: int or np.random.Generator, seed of the draws
+    - stratify: None, 'month', 'region' or ['month', 'region']
+    - regions: pd.Series, region of every grid id (index), needed for 'region'
+
+    Returns a pd.DataFrame with the columns id and date (datetime64), in the order of the draws.
+    """
+    rng = np.random.default_rng(seed)
+    ids = pd.Index(pd.unique(np.asarray(location_ids)))
+    dates = pd.DatetimeIndex(pd.unique(pd.DatetimeIndex(pd.to_datetime(dates)).normalize()))
+
+    # Keys of the ignitions among the candidates; the other ones cannot collide
+    ignit_ids = ids.get_indexer(positives['id'].to_numpy())
+    ignit_dates = dates.get_indexer(pd.DatetimeIndex(pd.to_datetime(positives['date'])).normalize())
+    inside = (ignit_ids >= 0) & (ignit_dates >= 0)
+    taken = pd.Index(pair_keys(ignit_ids[inside], ignit_dates[inside], len(dates))).unique()
+
+    id_strata, date_strata = candidate_strata(ids, dates, stratify, regions)
+    if stratify is None:
+        counts = {(0, 0): len(positives) if n is None else int(n)}
+    else:
+        if n is not None:
+            raise ValueError('n cannot be set with stratify, the strata follow the ignitions')
+        if not inside.all():
+            raise ValueError(f'{(~inside).sum()} ignitions are not among the candidate ids and dates')
+        counts = pd.Series(list(zip(id_strata[ignit_ids], date_strata[ignit_dates]))).value_counts().to_dict()
+
+    samples = []
+    for (id_stratum, date_stratum), count in counts.items():
+        stratum_ids = np.flatnonzero(id_strata == id_stratum)
+        stratum_dates = np.flatnonzero(date_strata == date_stratum)
+        size = len(stratum_ids) * len(stratum_dates)
+        stratum_taken = taken[np.isin(taken // len(dates), stratum_ids) & np.isin(taken % len(dates), stratum_dates)]
+        if count > size - len(stratum_taken):
+            raise ValueError(f'{count} samples asked in the stratum {(id_stratum, date_stratum)} '
+                             f'but only {size - len(stratum_taken)} pairs without ignition')
+
+        drawn = np.empty(0, dtype=np.int64)
+        while len(drawn) < count:
+            missing = count - len(drawn)
+            batch = rng.integers(0, size, int(missing * OVERSAMPLING) + 16)
+            keys = pair_keys(stratum_ids[batch // len(stratum_dates)], stratum_dates[batch % len(stratum_dates)],
+                             len(dates))
+            # pd.unique keeps the first occurrence in the order of the draws
+            keys = pd.unique(keys[~pd.Index(keys).isin(stratum_taken)])
+            drawn = np.concatenate([drawn, keys[:missing]])
+            stratum_taken = stratum_taken.append(pd.Index(keys[:missing]))
+        samples.append(drawn)
+
+    keys = np.concatenate(samples) if samples else np.empty(0, dtype=np.int64)
+    return pd.DataFrame({'id': ids.to_numpy()[keys // len(dates)], 'date': dates[keys % len(dates)]})
@@ -0,0 +1,156 @@
+import numpy as np
+import pandas as pd
+from weather_store import write_rows
+
+# Grid ids derived at once by derive_rolling_features (all the dates of each id are read)
+DERIVE_CHUNK_IDS = 1024
+
+# Daily weather predictors: name in the training table -> variable of the weather store
+WEATHER_FEATURES = {
+    'temp': 'temp',
+    'wind': 'wind',
+    'rhum': 'rhum',
+    'prcp': 'prcp',
+}
+
+# Rolling predictors: name -> (variable, rolling windows applied one after the other).
+# The windows end on the day of the sample, as DataFrame.rolling, and are taken on
+# the daily series. They are derived once in the weather store (derive_rolling_features).
+ROLLING_FEATURES = {
+    'temp_mean_7day': ('temp', [(7, 'mean')]),
+    'prcp_sum_7day': ('prcp', [(7, 'sum')]),
+    'prcp_sum_28day': ('prcp', [(28, 'sum')]),
+}
+
+
+def resolve_positions(store, ids, dates):
+    """
+    Rows and columns of the weather store of (id, date) pairs, all at once.
+
+    Returns:
+    - rows, cols: int arrays, -1 where the id or the date is not in the store
+    - matched: bool array
+    """
+    rows = store.id_positions(ids)
+    cols = store.date_positions(dates)
+    return rows, cols, (rows >= 0) & (cols >= 0)
+
+
+def rolling_window(values, days, how='sum'):
+    """
+    Rolling sum (or mean) along the last axis from cumulative sums, O(1) per cell.
+
+    The window ends on each day; it is NaN on the first days - 1 days and when
+    a day of the window is NaN (as DataFrame.rolling with the default min_periods).
+    """
+    missing = np.isnan(values)
+    pad = [(0, 0)] * (values.ndim - 1) + [(1, 0)]
+    # sums[..., k] and counts[..., k]: sum and number of missing values of the first k days
+    sums = np.pad(np.cumsum(np.where(missing, 0.0, values), axis=-1, dtype=np.float64), pad)
+    counts = np.pad(np.cumsum(missing, axis=-1), pad)
+    window = np.full(values.shape, np.nan)
+    window[..., days - 1:] = np.where(counts[..., days:] > counts[..., :-days], np.nan,
+                                      sums[..., days:] - sums[..., :-days])
+    if how == 'mean':
+        window /= days
+    return window
+
+
+def rolling_values(cube, rows, cols, windows):
+    """
+    Rolling features of (row, col) positions from a single gather of the days they cover,
+    for the features that are not derived in the store.
+
+    Parameters:
+    - cube: WeatherCube of the variable
+    - rows, cols: int arrays, positions of the samples
+    - windows: list of (days, 'sum' or 'mean'), applied one after the other
+
+    Returns a float array, NaN if a day of a window is missing (as DataFrame.rolling).
+    """
+    span = sum(days - 1 for days, _ in windows) + 1
+    days = cols[:, None] + np.arange(-span + 1, 1)[None, :]
+    values = cube.gather(rows[:, None], np.where(days >= 0, days, -1)).astype(np.float64)
+    for days, how in windows:
+        values = rolling_window(values, days, how)
+    return values[:, -1]
+
+
+def derive_rolling_features(store, rolling_features=ROLLING_FEATURES, chunk_ids=DERIVE_CHUNK_IDS, overwrite=False):
+    """
+    Compute the rolling features once along the time axis and store them next
+    to the raw weather, as variables named after the features.
+
+    The windows count the days of the store (its date axis is one column per
+    day). Each block of grid ids is read once per variable with all its dates.
+
+    Parameters:
+    - store: WeatherStore
+    - rolling_features: dict, {name: (variable, windows)}
+    - chunk_ids: int, grid ids derived at once
+    - overwrite: bool, derive the features already in the store again
+
+    Returns the list of derived features.
+    """
+    derived = []
+    for name, (variable, windows) in rolling_features.items():
+        if name in store.variables and not overwrite:
+            continue
+        cube = store[variable]
+        data = store.writer(name)
+        all_dates = np.arange(store.shape[1])
+        for start in range(0, store.shape[0], chunk_ids):
+            rows = np.arange(start, min(start + chunk_ids, store.shape[0]))
+            values = cube[rows, :].astype(np.float64)
+            for days, how in windows:
+                values = rolling_window(values, days, how)
+            write_rows(data, rows, all_dates, values.astype(np.float32))
+        store.commit(name, data)
+        derived.append(name)
+        print(f'{name} derived from {variable}')
+    return derived
+
+
+def feature_values(store, name, rows, cols, weather_features=WEATHER_FEATURES, rolling_features=ROLLING_FEATURES):
+    """Values of a weather or rolling predictor at (row, col) positions, read from the store when it is derived."""
+    if name in weather_features:
+        return store[weather_features[name]].gather(rows, cols)
+    if name in store.variables:
+        return store[name].gather(rows, cols)
+    variable, windows = rolling_features[name]
+    return rolling_values(store[variable], rows, cols, windows)
+
+
+def assemble_predictors(samples, store, weather_features=WEATHER_FEATURES, rolling_features=ROLLING_FEATURES):
+    """
+    Weather predictors of every (id, date) sample of the training table.
+
+    The pairs are resolved to positions of the weather store once and each
+    predictor is gathered with a single fancy-indexing pass on its variable.
+
+    Parameters:
+    - samples: pd.DataFrame, with the grid 'id' (column or index) and the 'date' of each sample
+    - store: WeatherStore
+    - weather_features: dict, daily predictors {name: variable}
+    - rolling_features: dict, rolling predictors {name: (variable, windows)}
+
+    Returns:
+    - predictors: pd.DataFrame with one column per predictor, same index as samples
+    - unmatched: pd.DataFrame, the samples whose id or date is not in the store (their predictors are NaN)
+    """
+    ids = samples['id'].to_numpy() if 'id' in samples.columns else samples.index.to_numpy()
+    found_rows, found_cols, matched = resolve_positions(store, ids, samples['date'])
+    rows, cols = np.where(matched, found_rows, -1), np.where(matched, found_cols, -1)
+
+    predictors = {}
+    for name in list(weather_features) + list(rolling_features):
+        predictors[name] = feature_values(store, name, rows, cols, weather_features, rolling_features)
+
+    unmatched = samples.loc[~matched, ['date']].copy()
+    unmatched['id'] = ids[~matched]
+    unmatched['id_found'] = found_rows[~matched] >= 0
+    unmatched['date_found'] = found_cols[~matched] >= 0
+    if len(unmatched):
+        print(f'{len(unmatched)} of {len(samples)} samples have no weather data '
+              f'({(~unmatched.id_found).sum()} unknown ids, {(~unmatched.date_found).sum()} unknown dates)')
+    return pd.DataFrame(predictors, index=samples.index), unmatched
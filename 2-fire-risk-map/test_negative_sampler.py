@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+import pytest
+from negative_sampler import sample_negatives
+
+
+def ignitions(ids, dates, n, seed=0):
+    """n distinct historical ignitions among the ids and dates."""
+    rng = np.random.default_rng(seed)
+    pairs = pd.MultiIndex.from_product([ids, dates], names=['id', 'date'])
+    return pairs[rng.choice(len(pairs), n, replace=False)].to_frame(index=False)
+
+
+def pairs(frame):
+    return set(zip(frame['id'], pd.to_datetime(frame['date'])))
+
+
+def test_no_ignition_nor_duplicate():
+    ids, dates = np.arange(1, 41), pd.date_range('2015-01-01', '2015-03-31')
+    positives = ignitions(ids, dates, 300)
+    negatives = sample_negatives(positives, ids, dates, seed=1)
+
+    assert len(negatives) == len(positives) == len(pairs(negatives))
+    assert not pairs(negatives) & pairs(positives)
+    assert negatives['id'].isin(ids).all() and negatives['date'].isin(dates).all()
+    pd.testing.assert_frame_equal(negatives, sample_negatives(positives, ids, dates, seed=1))
+    assert len(sample_negatives(positives, ids, dates, n=50, seed=1)) == 50
+
+
+def test_all_pairs_without_ignition():
+    # asking for every pair left: each is drawn exactly once, whatever the collisions
+    ids, dates = np.arange(5), pd.date_range('2015-07-01', periods=6)
+    positives = ignitions(ids, dates, 7)
+    negatives = sample_negatives(positives, ids, dates, n=30 - 7, seed=2)
+    assert len(negatives) == 23
+    assert pairs(negatives) == pairs(ignitions(ids, dates, 30)) - pairs(positives)
+
+    with pytest.raises(ValueError):
+        sample_negatives(positives, ids, dates, n=24, seed=2)
+
+
+def test_stratified():
+    ids, dates = np.arange(100, 160), pd.date_range('2015-05-01', '2015-08-31')
+    regions = pd.Series(np.where(ids < 120, 'north', 'south'), index=ids)
+    positives = ignitions(ids, dates, 400, seed=3)
+    negatives = sample_negatives(positives, ids, dates, seed=4, stratify=['month', 'region'], regions=regions)
+
+    def strata(frame):
+        return pd.Series(list(zip(regions[frame['id']].to_numpy(), pd.to_datetime(frame['date']).dt.month)))
+
+    assert strata(negatives).value_counts().to_dict() == strata(positives).value_counts().to_dict()
+    assert len(pairs(negatives)) == len(negatives) and not pairs(negatives) & pairs(positives)
+
+    with pytest.raises(ValueError):
+        sample_negatives(positives, ids, dates, n=10, stratify='month')
+    with pytest.raises(ValueError):
+        sample_negatives(positives, ids, dates, stratify='region')
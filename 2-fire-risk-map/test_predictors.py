@@ -0,0 +1,72 @@
+import numpy as np
+import pandas as pd
+import pytest
+from predictors import ROLLING_FEATURES, WEATHER_FEATURES, assemble_predictors, derive_rolling_features, rolling_window
+from weather_store import WeatherStore, write_rows
+
+
+def pandas_rolling(values, windows):
+    """The rolling windows of the original notebooks, applied to each row of values."""
+    frame = pd.DataFrame(values.T)
+    for days, how in windows:
+        frame = getattr(frame.rolling(days), how)()
+    return frame.to_numpy().T
+
+
+def weather_store(path, ids, dates, seed=0):
+    """Store with random daily weather, a few days missing."""
+    rng = np.random.default_rng(seed)
+    store = WeatherStore.create(path, ids, dates, chunks=(4, 16))
+    for variable in WEATHER_FEATURES.values():
+        values = rng.gamma(2.0, 3.0, store.shape).astype(np.float32)
+        values[0, 10] = values[2, 40] = np.nan
+        data = store.writer(variable)
+        write_rows(data, np.arange(store.shape[0]), np.arange(store.shape[1]), values)
+        store.commit(variable, data)
+    return store
+
+
+@pytest.mark.parametrize('how', ['sum', 'mean'])
+@pytest.mark.parametrize('days', [1, 7, 28])
+def test_rolling_window(days, how):
+    values = np.random.default_rng(days).normal(size=(5, 60))
+    values[1, 20] = values[3, [0, 59]] = np.nan
+    np.testing.assert_allclose(rolling_window(values, days, how), pandas_rolling(values, [(days, how)]),
+                               rtol=1e-10, atol=1e-12)
+
+
+def test_derived_features(tmp_path):
+    ids = np.arange(100, 111)
+    dates = pd.date_range('2015-06-01', periods=50)
+    store = weather_store(tmp_path / 'store', ids, dates)
+    assert derive_rolling_features(store, chunk_ids=3) == list(ROLLING_FEATURES)
+    assert derive_rolling_features(store) == []
+
+    for name, (variable, windows) in ROLLING_FEATURES.items():
+        expected = pandas_rolling(store[variable][:, :].astype(np.float64), windows)
+        np.testing.assert_allclose(store[name][:, :], expected, rtol=1e-5)
+
+
+@pytest.mark.parametrize('derived', [False, True])
+def test_assemble_predictors(tmp_path, derived):
+    ids = np.arange(100, 111)
+    dates = pd.date_range('2015-06-01', periods=50)
+    store = weather_store(tmp_path / 'store', ids, dates)
+    if derived:
+        derive_rolling_features(store)
+
+    samples = pd.DataFrame({'id': [104, 100, 110, 999, 102],
+                            'date': pd.to_datetime(['2015-07-20', '2015-06-20', '2015-06-03',
+                                                    '2015-07-01', '2015-07-15'])})
+    predictors, unmatched = assemble_predictors(samples, store)
+
+    assert list(unmatched['id']) == [999]
+    assert not unmatched['id_found'].iloc[0] and unmatched['date_found'].iloc[0]
+    assert predictors.loc[3].isna().all()
+    for i in [0, 1, 2, 4]:
+        row, col = store.id_positions([samples['id'][i]])[0], store.date_positions([samples['date'][i]])[0]
+        for name, variable in WEATHER_FEATURES.items():
+            assert predictors[name][i] == store[variable][row, col]
+        for name, (variable, windows) in ROLLING_FEATURES.items():
+            expected = pandas_rolling(store[variable][row:row + 1, :].astype(np.float64), windows)[0, col]
+            np.testing.assert_allclose(predictors[name][i], expected, rtol=1e-5)
@@ -0,0 +1,76 @@
+import numpy as np
+import pandas as pd
+from weather_store import WeatherStore, csv_to_store, parse_date_column, store_to_csv
+
+
+def weather_frame(ids, dates, seed=0):
+    """Random (id x date) values with a few missing cells."""
+    values = np.random.default_rng(seed).normal(20, 5, (len(ids), len(dates))).astype(np.float32)
+    values[1, 2] = np.nan
+    return pd.DataFrame(values, index=pd.Index(ids, name='id'), columns=pd.DatetimeIndex(dates))
+
+
+def test_parse_date_column():
+    assert parse_date_column('2015-07-01') == pd.Timestamp('2015-07-01')
+    assert parse_date_column('2015-07-01 00:00:00') == pd.Timestamp('2015-07-01')
+    # ERA5-Land: 'YYYYMM' + index of the day starting at 0
+    assert parse_date_column('2015070') == pd.Timestamp('2015-07-01')
+    assert parse_date_column('20150730') == pd.Timestamp('2015-07-31')
+    assert parse_date_column('20150231') is None
+    for name in ['id', 'geometry', 'centre', 'Unnamed: 0']:
+        assert parse_date_column(name) is None
+
+
+def test_csv_round_trip(tmp_path):
+    ids = [42, 7, 1003, 15, 8, 61, 300]
+    dates = pd.date_range('2015-06-28', '2015-07-06')
+    temp = weather_frame(ids, dates)
+    temp.set_axis(dates.strftime('%Y-%m-%d'), axis=1).assign(geometry='POINT').to_csv(tmp_path / 'temp.csv')
+
+    # small blocks so that the ids and dates span several of them
+    WeatherStore.create(tmp_path / 'store', ids, dates, chunks=(3, 4))
+    store = csv_to_store(tmp_path / 'temp.csv', tmp_path / 'store', 'temp', chunk_rows=2)
+    assert store.variables == ['temp']
+    pd.testing.assert_frame_equal(store.frame('temp'), temp, check_freq=False, check_column_type=False)
+
+    selection = store.frame('temp', ids=[15, 999, 42], dates=['2015-07-02', '2015-07-01'])
+    expected = temp.reindex(index=[15, 999, 42], columns=pd.to_datetime(['2015-07-02', '2015-07-01']))
+    np.testing.assert_array_equal(selection.to_numpy(), expected.to_numpy())
+    assert np.isnan(store['temp'].gather([-1, 0], [0, -1])).all()
+
+
+def test_csv_era5_columns(tmp_path):
+    ids = [1, 2, 3, 4, 5]
+    dates = pd.date_range('2015-06-29', '2015-07-02')
+    temp = weather_frame(ids, dates)
+    temp.set_axis(dates.strftime('%Y-%m-%d'), axis=1).to_csv(tmp_path / 'temp.csv')
+    csv_to_store(tmp_path / 'temp.csv', tmp_path / 'store', 'temp')
+
+    # the next variable has ERA5-Land columns, an id and a day not in the store and misses an id
+    wind = weather_frame([5, 3, 9, 1, 2], pd.date_range('2015-06-30', '2015-07-03'), seed=1)
+    era5_columns = [f'{d.year}{d.month:02d}{d.day - 1}' for d in wind.columns]
+    assert era5_columns == ['20150629', '2015070', '2015071', '2015072']
+    wind.set_axis(era5_columns, axis=1).to_csv(tmp_path / 'wind.csv')
+    store = csv_to_store(tmp_path / 'wind.csv', tmp_path / 'store', 'wind')
+
+    assert store.variables == ['temp', 'wind']
+    expected = wind.reindex(index=pd.Index(ids, name='id'), columns=dates)
+    pd.testing.assert_frame_equal(store.frame('wind'), expected, check_freq=False, check_column_type=False)
+    reopened = WeatherStore(tmp_path / 'store')
+    pd.testing.assert_frame_equal(reopened.frame('temp'), temp, check_freq=False, check_column_type=False)
+
+
+def test_store_to_csv(tmp_path):
+    ids = [10, 20, 30, 40, 50]
+    dates = pd.date_range('2030-01-01', periods=6)
+    proba = weather_frame(ids, dates)
+    WeatherStore.create(tmp_path / 'store', ids, dates, chunks=(2, 4))
+    proba.set_axis(dates.strftime('%Y-%m-%d'), axis=1).to_csv(tmp_path / 'proba.csv')
+    store = csv_to_store(tmp_path / 'proba.csv', tmp_path / 'store', 'probability')
+
+    store_to_csv(store, 'probability', tmp_path / 'out.csv', mean_column='mean', chunk_ids=2)
+    out = pd.read_csv(tmp_path / 'out.csv', index_col='id')
+    assert list(out.columns) == list(dates.strftime('%Y-%m-%d')) + ['mean']
+    np.testing.assert_allclose(out.iloc[:, :-1].to_numpy(), proba.to_numpy(), rtol=1e-6)
+    np.testing.assert_allclose(out['mean'], proba.mean(axis=1), rtol=1e-6)
+    assert list(out.index) == ids
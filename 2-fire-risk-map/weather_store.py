@@ -0,0 +1,243 @@
+import json
+import os
+import re
+import numpy as np
+import pandas as pd
+
+# Cells of a block: grid ids x dates, each block is contiguous on disk
+ID_CHUNK = 1024
+DATE_CHUNK = 64
+
+# Description of the store (chunks and variables), next to ids.npy and dates.npy
+STORE_FILE = 'store.json'
+
+# Columns of the weather CSVs holding a day: 'YYYY-MM-DD' (CLIMEX2) or
+# 'YYYYMM' + index of the day in the month starting at 0 (ERA5-Land)
+ISO_DATE = re.compile(r'^(\d{4})-(\d{2})-(\d{2})')
+ERA5_DATE = re.compile(r'^(\d{4})(\d{2})(\d{1,2})$')
+
+
+def parse_date_column(name):
+    """Date of a column of the wide weather CSVs, None for the other columns (id, geometry, centre...)."""
+    match = ISO_DATE.match(name)
+    if match:
+        year, month, day = (int(v) for v in match.groups())
+    else:
+        match = ERA5_DATE.match(name)
+        if not match:
+            return None
+        year, month, day = (int(v) for v in match.groups())
+        day += 1  # the days of the ERA5-Land files start from 0
+    try:
+        return pd.Timestamp(year=year, month=month, day=day)
+    except ValueError:
+        return None
+
+
+class WeatherCube:
+    """
+    One variable of the weather store: a float32 (grid id x date) array stored
+    in blocks of (ID_CHUNK x DATE_CHUNK) cells and memory-mapped, so only the
+    blocks of the requested cells are read from disk.
+
+    The cube is indexed by positions, see WeatherStore.id_positions and
+    WeatherStore.date_positions. Negative positions (unmatched ids or dates)
+    give NaN.
+
+    Parameters:
+    - path: str, .npy file of the blocks, shaped (id blocks, date blocks, ID_CHUNK, DATE_CHUNK)
+    - shape: tuple, (number of ids, number of dates)
+    """
+
+    def __init__(self, path, shape):
+        self.data = np.load(path, mmap_mode='r')
+        self.shape = tuple(shape)
+        self.chunks = self.data.shape[2:]
+
+    def gather(self, rows, cols):
+        """Values at the (row, col) positions, broadcast together (e.g. rows[:, None] and cols[None, :])."""
+        rows, cols = np.broadcast_arrays(np.asarray(rows, dtype=np.int64), np.asarray(cols, dtype=np.int64))
+        valid = (rows >= 0) & (cols >= 0) & (rows < self.shape[0]) & (cols < self.shape[1])
+        r, c = np.where(valid, rows, 0), np.where(valid, cols, 0)
+        ci, cd = self.chunks
+        values = np.asarray(self.data[r // ci, c // cd, r % ci, c % cd], dtype=np.float32)
+        values[~valid] = np.nan
+        return values
+
+    def __getitem__(self, key):
+        """Rectangular selection with integers, slices or position arrays: cube[rows, cols]."""
+        row_key, col_key = key if isinstance(key, tuple) else (key, slice(None))
+        rows = np.arange(self.shape[0])[row_key]
+        cols = np.arange(self.shape[1])[col_key]
+        values = self.gather(np.atleast_1d(rows)[:, None], np.atleast_1d(cols)[None, :])
+        if np.ndim(rows) == 0:
+            values = values[0]
+        if np.ndim(cols) == 0:
+            values = values[..., 0]
+        return values
+
+
+class WeatherStore:
+    """
+    Binary store of the daily weather of the 10 km grid, replacing the wide CSVs.
+
+    Each variable is a WeatherCube sharing the same id index (grid ids) and
+    date index (days), so (id, date) pairs are resolved to positions once and
+    used on every variable.
+
+    Layout of the folder:
+    - store.json: chunks and variables
+    - ids.npy, dates.npy: id and date of every row and column
+    - <variable>.npy: blocks of the cube of each variable
+
+    Parameters:
+    - path: str, folder of the store
+    """
+
+    def __init__(self, path):
+        self.path = str(path)
+        with open(os.path.join(self.path, STORE_FILE)) as f:
+            self.info = json.load(f)
+        self.ids = np.load(os.path.join(self.path, 'ids.npy'))
+        self.dates = np.load(os.path.join(self.path, 'dates.npy'))
+        self.id_index = pd.Index(self.ids)
+        self.date_index = pd.DatetimeIndex(self.dates)
+        self._cubes = {}
+
+    @classmethod
+    def create(cls, path, ids, dates, chunks=(ID_CHUNK, DATE_CHUNK)):
+        """Create an empty store for these grid ids and dates (sorted, one column per day)."""
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, 'ids.npy'), np.asarray(ids, dtype=np.int64))
+        np.save(os.path.join(path, 'dates.npy'), pd.DatetimeIndex(dates).sort_values().to_numpy().astype('datetime64[D]'))
+        with open(os.path.join(path, STORE_FILE), 'w') as f:
+            json.dump({'chunks': list(chunks), 'variables': []}, f, indent=4)
+        return cls(path)
+
+    @property
+    def variables(self):
+        return list(self.info['variables'])
+
+    @property
+    def shape(self):
+        return len(self.ids), len(self.dates)
+
+    def id_positions(self, ids):
+        """Row of each grid id, -1 if it is not in the store."""
+        return self.id_index.get_indexer(np.asarray(ids))
+
+    def date_positions(self, dates):
+        """Column of each date, -1 if it is not in the store."""
+        return self.date_index.get_indexer(pd.DatetimeIndex(pd.to_datetime(dates)).normalize())
+
+    def __getitem__(self, variable):
+        if variable not in self.info['variables']:
+            raise KeyError(f"No variable '{variable}' in {self.path}, available: {', '.join(self.variables)}")
+        if variable not in self._cubes:
+            self._cubes[variable] = WeatherCube(os.path.join(self.path, f'{variable}.npy'), self.shape)
+        return self._cubes[variable]
+
+    def frame(self, variable, ids=None, dates=None):
+        """A selection of a variable as a (id x date) DataFrame, as the wide CSVs."""
+        rows = np.arange(self.shape[0]) if ids is None else self.id_positions(ids)
+        cols = np.arange(self.shape[1]) if dates is None else self.date_positions(dates)
+        values = self[variable].gather(rows[:, None], cols[None, :])
+        return pd.DataFrame(values, index=pd.Index(self.ids[rows] if ids is None else np.asarray(ids), name='id'),
+                            columns=self.date_index[cols] if dates is None else pd.to_datetime(dates))
+
+    def writer(self, variable):
+        """Writable memory map of a new variable, filled with NaN (see write_rows)."""
+        ci, cd = self.info['chunks']
+        shape = (-(-self.shape[0] // ci), -(-self.shape[1] // cd), ci, cd)
+        data = np.lib.format.open_memmap(os.path.join(self.path, f'{variable}.npy.tmp'), mode='w+',
+                                         dtype=np.float32, shape=shape)
+        data[:] = np.nan
+        return data
+
+    def commit(self, variable, data):
+        """Flush a variable written with writer() and add it to the store."""
+        data.flush()
+        del data
+        os.replace(os.path.join(self.path, f'{variable}.npy.tmp'), os.path.join(self.path, f'{variable}.npy'))
+        self._cubes.pop(variable, None)
+        if variable not in self.info['variables']:
+            self.info['variables'].append(variable)
+        with open(os.path.join(self.path, STORE_FILE), 'w') as f:
+            json.dump(self.info, f, indent=4)
+
+
+def write_rows(data, rows, cols, values):
+    """Write a (rows x cols) block of values in the memory map of a variable."""
+    ci, cd = data.shape[2:]
+    rows, cols = np.asarray(rows)[:, None], np.asarray(cols)[None, :]
+    data[rows // ci, cols // cd, rows % ci, cols % cd] = values
+
+
+def csv_to_store(csv_path, store_path, variable, chunk_rows=ID_CHUNK * 4):
+    """
+    Convert a wide weather CSV (one row per grid id, one column per day) into
+    a variable of the weather store, reading the CSV by blocks of rows.
+
+    The first variable converted sets the ids and dates of the store; the
+    ids and dates of the next ones are matched to them and the cells of the
+    store without a value are NaN.
+
+    Parameters:
+    - csv_path: str, CSV with an 'id' column and one column per day
+      ('YYYY-MM-DD' or the 'YYYYMM' + day index keys of ERA5-Land)
+    - store_path: str, folder of the store (created if needed)
+    - variable: str, name of the variable in the store (e.g. 'temp')
+    - chunk_rows: int, rows of the CSV read at once
+
+    Returns the WeatherStore.
+    """
+    header = pd.read_csv(csv_path, nrows=0).columns
+    date_columns = {column: parse_date_column(column) for column in header}
+    date_columns = {column: date for column, date in date_columns.items() if date is not None}
+    ids = pd.read_csv(csv_path, usecols=['id'])['id'].astype(np.int64).to_numpy()
+
+    if os.path.exists(os.path.join(store_path, STORE_FILE)):
+        store = WeatherStore(store_path)
+    else:
+        store = WeatherStore.create(store_path, ids, sorted(set(date_columns.values())))
+
+    cols = store.date_positions(list(date_columns.values()))
+    matched = cols >= 0
+    if not matched.all():
+        print(f'{csv_path}: {(~matched).sum()} days not in the store are skipped')
+    columns = [column for column, ok in zip(date_columns, matched) if ok]
+    cols = cols[matched]
+
+    data = store.writer(variable)
+    missed = 0
+    dtypes = {column: np.float32 for column in columns}
+    for chunk in pd.read_csv(csv_path, usecols=['id'] + columns, dtype=dtypes, chunksize=chunk_rows):
+        rows = store.id_positions(chunk['id'].astype(np.int64).to_numpy())
+        found = rows >= 0
+        missed += int((~found).sum())
+        write_rows(data, rows[found], cols, chunk.loc[found, columns].to_numpy(dtype=np.float32))
+    if missed:
+        print(f'{csv_path}: {missed} grid ids not in the store are skipped')
+    store.commit(variable, data)
+    return store
+
+
+def store_to_csv(store, variable, csv_path, mean_column=None, chunk_ids=ID_CHUNK * 4):
+    """
+    Write a variable of the store as a wide CSV (one row per grid id, one
+    column per day 'YYYY-MM-DD'), by blocks of ids so that the whole variable
+    is never in memory.
+
+    Parameters:
+    - store: WeatherStore
+    - variable: str, variable of the store (e.g. 'probability')
+    - csv_path: str, output CSV, with the grid ids in a first column 'id'
+    - mean_column: str, name of a last column with the mean over the dates of every id (default: none)
+    - chunk_ids: int, grid ids written at once
+    """
+    for start in range(0, store.shape[0], chunk_ids):
+        block = store.frame(variable, ids=store.ids[start:start + chunk_ids])
+        block.columns = block.columns.strftime('%Y-%m-%d')
+        if mean_column is not None:
+            block[mean_column] = np.nanmean(block.to_numpy(), axis=1)
+        block.to_csv(csv_path, mode='w' if start == 0 else 'a', header=start == 0)
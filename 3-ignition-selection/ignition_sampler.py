@@ -0,0 +1,165 @@
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+
+# Ways of choosing the cells that can ignite on a day:
+# - 'thresh': the cells whose probability is above the threshold
+# - 'dice': the cells whose probability is above a random number drawn for each cell and day
+METHODS = ('thresh', 'dice')
+
+# Cells (grid id x date) drawn at once, bounds the memory of the random numbers of 'dice'.
+# The draws depend on it, keep it unchanged to reproduce a list with the same seed
+CHUNK_CELLS = 20_000_000
+
+# Rounds of new points for the points falling outside of their cell (cells that are not rectangles)
+MAX_TRIES = 100
+
+
+def daily_counts(counts):
+    """Number of fires of every day as integers: rounded, NaN and negative values as 0."""
+    counts = np.rint(np.nan_to_num(np.asarray(counts, dtype=np.float64), nan=0.0))
+    return np.clip(counts, 0, None).astype(np.int64)
+
+
+def choose_distinct(rng, available, counts):
+    """
+    min(counts[d], available[d]) distinct positions drawn uniformly in
+    [0, available[d]) for every day d, in the order of the draws.
+
+    Returns the day and the position of every draw.
+    """
+    counts = np.minimum(counts, available)
+    days_out, positions_out = [], []
+
+    # Days drawing most of their cells: a permutation of the cells
+    dense = np.flatnonzero((counts > 0) & (2 * counts > available))
+    for d in dense:
+        days_out.append(np.full(counts[d], d))
+        positions_out.append(rng.permutation(available[d])[:counts[d]])
+
+    # Other days: twice as many draws as needed with replacement, the repeated
+    # positions are dropped and the days still short are drawn again
+    days = np.flatnonzero((counts > 0) & (2 * counts <= available))
+    while len(days):
+        width = 2 * int(counts[days].max()) + 8
+        draws = (rng.random((len(days), width)) * available[days, None]).astype(np.int64)
+        draws = np.minimum(draws, available[days, None] - 1)
+        # keys of (row, position), pd.unique keeps the first draw of each in the order of the draws
+        keys = pd.unique((np.arange(len(days))[:, None] * available.max() + draws).ravel())
+        rows, positions = keys // available.max(), keys % available.max()
+        rank = np.arange(len(rows)) - np.searchsorted(rows, rows)
+        short = np.bincount(rows, minlength=len(days)) < counts[days]
+        keep = (rank < counts[days][rows]) & ~short[rows]
+        days_out.append(days[rows[keep]])
+        positions_out.append(positions[keep])
+        days = days[short]
+
+    if not days_out:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    return np.concatenate(days_out), np.concatenate(positions_out)
+
+
+def sample_ignitions(probabilities, counts, method='thresh', threshold=0.7, seed=None, chunk_cells=CHUNK_CELLS):
+    """
+    Grid cell of the fires of every day, drawn at random among the cells that can ignite.
+
+    All the days are drawn in one vectorized pass (by blocks of days): the
+    cells that can ignite are listed day by day, and counts[d] of the cells
+    of day d are drawn uniformly without replacement, as Series.sample(n).
+    A day with fewer cells that can ignite than fires keeps all of them, the
+    missing fires are reported.
+
+    Parameters:
+    - probabilities: pd.DataFrame, daily fire probability, grid ids as index and dates as columns
+    - counts: array, number of fires of every date of probabilities (in the order of the columns)
+    - method: str, 'thresh' or 'dice' (see METHODS)
+    - threshold: float, probability above which a cell can ignite, for 'thresh'
+    - seed: int or np.random.Generator, seed of the draws
+    - chunk_cells: int, cells drawn at once
+
+    Returns a pd.DataFrame with the date ('YYYY-MM-DD') and the grid id of every fire, sorted by date.
+    """
+    if method not in METHODS:
+        raise ValueError(f"Unknown method '{method}', use one of {', '.join(METHODS)}")
+    rng = np.random.default_rng(seed)
+    counts = daily_counts(counts)
+    n_ids, n_dates = probabilities.shape
+    if len(counts) != n_dates:
+        raise ValueError(f'{len(counts)} daily counts for {n_dates} dates of probabilities')
+
+    # (dates, ids), the layout of the values of a DataFrame of a single dtype
+    values = probabilities.to_numpy()
+    if values.dtype.kind != 'f':
+        values = values.astype(np.float64)
+    values = values.T
+    block = max(1, chunk_cells // max(n_ids, 1))
+    rows, cols, missing = [], [], 0
+    for start in range(0, n_dates, block):
+        stop = min(start + block, n_dates)
+        chunk = values[start:stop]
+        limit = threshold if method == 'thresh' else rng.random(chunk.shape, dtype=np.float32)
+        # cells that can ignite, day by day
+        eligible_days, eligible_ids = np.nonzero(chunk > limit)
+        available = np.bincount(eligible_days, minlength=stop - start)
+        first = np.concatenate([[0], np.cumsum(available)[:-1]])
+
+        days, positions = choose_distinct(rng, available, counts[start:stop])
+        rows.append(eligible_ids[first[days] + positions])
+        cols.append(days + start)
+        missing += int(np.clip(counts[start:stop] - available, 0, None).sum())
+
+    if not rows:  # no dates (e.g. no column in the years asked): an empty list
+        rows, cols = [np.empty(0, dtype=np.int64)], [np.empty(0, dtype=np.int64)]
+    rows, cols = np.concatenate(rows), np.concatenate(cols)
+    order = np.argsort(cols, kind='stable')
+    rows, cols = rows[order], cols[order]
+    if missing:
+        print(f'{missing} of {counts.sum()} fires are missing, their days have fewer cells that can ignite')
+    dates = pd.DatetimeIndex(pd.to_datetime(probabilities.columns)).strftime('%Y-%m-%d')
+    return pd.DataFrame({'date': dates[cols], 'id': probabilities.index.to_numpy()[rows]})
+
+
+def cell_geometries(grid, ids):
+    """Geometry of the cell of every id (grid indexed by id), None for the ids not in the grid."""
+    return grid.geometry.reindex(np.asarray(ids)).to_numpy()
+
+
+def sample_points(grid, ids, seed=None, crs=None):
+    """
+    A random point in the cell of every id, uniform within the cell.
+
+    The points are drawn in the bounds of the cells all at once, and the ones
+    falling outside of their cell (cells that are not rectangles in the CRS of
+    the grid) are drawn again, as GeoSeries.sample_points(1) but vectorized.
+
+    Parameters:
+    - grid: gpd.GeoDataFrame of the 10 km grid indexed by id
+    - ids: array of grid ids (repeated for the cells with several fires)
+    - seed: int or np.random.Generator, seed of the draws
+    - crs: CRS of the points (default: the one of the grid, e.g. 4326 for lon/lat)
+
+    Returns the x (lon) and y (lat) arrays of the points.
+    """
+    rng = np.random.default_rng(seed)
+    cells = grid.geometry.loc[np.asarray(ids)]
+    geometries = cells.to_numpy()
+    min_x, min_y, max_x, max_y = cells.bounds.to_numpy().T
+
+    x, y = np.empty(len(cells)), np.empty(len(cells))
+    todo = np.arange(len(cells))
+    for _ in range(MAX_TRIES):
+        x[todo] = min_x[todo] + rng.random(len(todo)) * (max_x[todo] - min_x[todo])
+        y[todo] = min_y[todo] + rng.random(len(todo)) * (max_y[todo] - min_y[todo])
+        todo = todo[~shapely.contains_xy(geometries[todo], x[todo], y[todo])]
+        if not len(todo):
+            break
+    if len(todo):
+        # cells too thin to be hit at random (e.g. slivers on the coast)
+        points = shapely.point_on_surface(geometries[todo])
+        x[todo], y[todo] = shapely.get_x(points), shapely.get_y(points)
+
+    if crs is not None:
+        points = gpd.GeoSeries(gpd.points_from_xy(x, y), crs=grid.crs).to_crs(crs)
+        x, y = points.x.to_numpy(), points.y.to_numpy()
+    return x, y
@@ -0,0 +1,77 @@
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+from ignition_sampler import choose_distinct, daily_counts, sample_ignitions, sample_points
+
+
+def probability_frame(n_ids=50, n_dates=30, seed=0):
+    """Random daily probabilities, grid ids as index and dates as columns."""
+    values = np.random.default_rng(seed).random((n_ids, n_dates))
+    return pd.DataFrame(values, index=np.arange(1000, 1000 + n_ids),
+                        columns=pd.date_range('2030-06-01', periods=n_dates).strftime('%Y-%m-%d'))
+
+
+def test_daily_counts():
+    assert list(daily_counts([1.4, 2.6, np.nan, -3, 0])) == [1, 3, 0, 0, 0]
+
+
+def test_choose_distinct():
+    rng = np.random.default_rng(0)
+    available = rng.integers(0, 40, 500)
+    counts = rng.integers(0, 30, 500)  # dense, sparse, empty and short days
+    days, positions = choose_distinct(rng, available, counts)
+
+    assert np.array_equal(np.bincount(days, minlength=500), np.minimum(counts, available))
+    assert ((positions >= 0) & (positions < available[days])).all()
+    assert len(set(zip(days, positions))) == len(days)
+
+
+def test_choose_distinct_uniform():
+    # 3 of 10 positions every day: each position is drawn on 30 % of the days
+    days, positions = choose_distinct(np.random.default_rng(1), np.full(20_000, 10), np.full(20_000, 3))
+    np.testing.assert_allclose(np.bincount(positions) / 20_000, 0.3, atol=0.015)
+
+
+def test_thresh():
+    probabilities = probability_frame()
+    counts = np.random.default_rng(2).integers(0, 25, probabilities.shape[1])
+    fires = sample_ignitions(probabilities, counts, threshold=0.7, seed=3, chunk_cells=200)
+
+    eligible = (probabilities > 0.7).sum()
+    assert fires.groupby('date').size().reindex(probabilities.columns, fill_value=0).tolist() == \
+        np.minimum(counts, eligible).tolist()
+    assert not fires.duplicated().any()
+    assert fires['date'].is_monotonic_increasing
+    assert all(probabilities.loc[fire.id, fire.date] > 0.7 for fire in fires.itertuples())
+    pd.testing.assert_frame_equal(fires, sample_ignitions(probabilities, counts, threshold=0.7, seed=3,
+                                                          chunk_cells=200))
+
+
+def test_dice():
+    probabilities = probability_frame()
+    probabilities.iloc[:10] = 0.0  # never ignite
+    probabilities.iloc[10:15] = 1.0  # can always ignite
+    fires = sample_ignitions(probabilities, np.full(probabilities.shape[1], 5), method='dice', seed=4)
+
+    assert len(fires) == 5 * probabilities.shape[1]
+    assert not fires['id'].isin(probabilities.index[:10]).any()
+    assert not fires.duplicated().any()
+
+
+def test_no_dates():
+    fires = sample_ignitions(probability_frame(n_dates=0), [], seed=5)
+    assert list(fires.columns) == ['date', 'id'] and len(fires) == 0
+
+
+def test_sample_points():
+    cells = [shapely.box(0, 0, 1, 1), shapely.box(1, 0, 3, 1), shapely.Polygon([(0, 1), (2, 1), (0, 3)])]
+    grid = gpd.GeoDataFrame(geometry=cells, index=pd.Index([7, 8, 9], name='id'), crs=3035)
+    ids = np.repeat([7, 8, 9], 200)
+    x, y = sample_points(grid, ids, seed=6)
+
+    assert shapely.contains_xy(grid.geometry.loc[ids].to_numpy(), x, y).all()
+    lon, lat = sample_points(grid, ids, seed=6, crs=4326)
+    expected = gpd.GeoSeries(gpd.points_from_xy(x, y), crs=3035).to_crs(4326)
+    np.testing.assert_allclose(lon, expected.x)
+    np.testing.assert_allclose(lat, expected.y)
@@ -0,0 +1,244 @@
+from concurrent.futures import ProcessPoolExecutor
+import glob
+import os
+import cartopy.crs as ccrs
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+
+def select_netCDF(path, year, month):
+    """
+    Selects the NetCDF file ending with *YYYYMM.nc (ERA5-Land).
+    """
+    files = glob.glob(os.path.join(path, '**', f'*{year}{month:02d}.nc'), recursive=True)
+    if not files:
+        raise FileNotFoundError(f'No file ending with {year}{month:02d}.nc in {path}')
+    return sorted(files)[0]
+
+
+def calculate_square_bounds(lon, lat, side_km):
+    """
+    Calculate the bounds of squares centered at given lon/lat (scalars or arrays).
+
+    Parameters:
+    - lon: float or array, longitude of the centers
+    - lat: float or array, latitude of the centers
+    - side_km: float, side length of the squares in kilometers
+
+    Returns:
+    - lat_min, lat_max, lon_min, lon_max
+    """
+    earth_circ_km = 40075 #km
+    km_per_degree = earth_circ_km / 360  # this gets how much is a degree in the equator
+
+    half_side_lat_degree = (side_km / 2) / km_per_degree
+    # meridians are closer together as you approach the poles
+    half_side_lon_degree = (side_km / 2) / (km_per_degree * np.cos(np.deg2rad(lat)))
+
+    return lat - half_side_lat_degree, lat + half_side_lat_degree, lon - half_side_lon_degree, lon + half_side_lon_degree
+
+
+def profile_times(dates, duration=24, step=3):
+    """
+    Times of the wind profile of every fire: from 12:00 of the fire date, every
+    step hours for duration hours. Returns a (fires, steps) datetime64 array.
+    """
+    start = pd.to_datetime(pd.Series(dates)).to_numpy() + np.timedelta64(12, 'h')
+    offsets = np.arange(0, duration, step) * np.timedelta64(1, 'h')
+    return start[:, None] + offsets[None, :]
+
+
+def open_month(directory, year, month, climate_data='climex2', ens=None):
+    """
+    Open the u/v winds of one month as a single dataset with the variables
+    'uas' and 'vas' (and the rotated pole of CLIMEX2).
+
+    Parameters:
+    - directory: str, folder of the climate data
+    - year, month: int, month of the files
+    - climate_data: str, 'climex2' (uas_/vas_ files in rotated coordinates) or 'era5-land'
+    - ens: str, ensemble of the CLIMEX2 files (epp, etp, eop)
+    """
+    if climate_data == 'climex2':
+        ufile = os.path.join(directory, str(year), f'uas_{ens}_{year}{month:02d}_se.nc')
+        vfile = os.path.join(directory, str(year), f'vas_{ens}_{year}{month:02d}_se.nc')
+        return xr.merge([xr.open_dataset(ufile), xr.open_dataset(vfile)], compat='override')
+
+    u_v = xr.open_dataset(select_netCDF(directory, year, month))
+    return u_v.rename({'valid_time': 'time',
+                       'latitude': 'lat',
+                       'longitude': 'lon',
+                       'u10': 'uas',
+                       'v10': 'vas'})
+
+
+def box_indices(coord, low, high):
+    """
+    Index ranges [start, stop) of the coordinate values between low and high
+    (inclusive, as xarray's sel with a slice) for arrays of bounds.
+    """
+    return np.searchsorted(coord, low, side='left'), np.searchsorted(coord, high, side='right')
+
+
+def box_means(data, times, rows, cols):
+    """
+    Mean of the valid values of a box at several times, for every fire at once.
+
+    A summed-area table of the values (NaN as 0) and of the valid cells is
+    built once, so the mean of any box is read with four lookups.
+
+    Parameters:
+    - data: (T, Y, X) array
+    - times: (F, S) int array, time index of every step of every fire
+    - rows, cols: tuples of (F,) int arrays, [start, stop) of the box of every fire
+
+    Returns a (F, S) array, NaN where a box has no valid value.
+    """
+    valid = ~np.isnan(data)
+    sums = np.zeros((data.shape[0], data.shape[1] + 1, data.shape[2] + 1))
+    counts = np.zeros_like(sums)
+    sums[:, 1:, 1:] = np.where(valid, data, 0).cumsum(axis=1).cumsum(axis=2)
+    counts[:, 1:, 1:] = valid.cumsum(axis=1).cumsum(axis=2)
+
+    (r0, r1), (c0, c1) = rows, cols
+    r0, r1, c0, c1 = (a[:, None] for a in (r0, r1, c0, c1))
+
+    def box(table):
+        return table[times, r1, c1] - table[times, r0, c1] - table[times, r1, c0] + table[times, r0, c0]
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return box(sums) / box(counts)
+
+
+def extract_month(fires, directory, folder_path, climate_data='climex2', ens=None, side_km=30, duration=24, step=3):
+    """
+    Write the wind profile of all the fires starting in the same month.
+
+    The month file pair (and the next month when a profile goes past the end
+    of the month) is opened once, the boxes of all the fires are converted to
+    index ranges in one transform and only the times and the area covering
+    them are read.
+
+    Parameters:
+    - fires: pd.DataFrame, fires of the month with the columns date (YYYY-MM-DD), lon, lat
+    - directory: str, folder of the climate data
+    - folder_path: str, output folder, one '{date}_{lon:.2f}E_{lat:.2f}N/wind_data.csv' per fire
+    - climate_data: str, 'climex2' or 'era5-land'
+    - ens: str, ensemble of the CLIMEX2 files
+    - side_km: float, side of the square averaged around the ignition
+    - duration, step: int, length and time step of the profile (hours)
+
+    Returns the list of wind_data.csv written.
+    """
+    lon = fires['lon'].to_numpy(dtype=float)
+    lat = fires['lat'].to_numpy(dtype=float)
+    times = profile_times(fires['date'], duration, step)
+
+    # Open the month, and the next one if a profile goes into it
+    first = pd.Timestamp(times.min())
+    months = pd.period_range(first.to_period('M'), pd.Timestamp(times.max()).to_period('M'), freq='M')
+    u_v = xr.concat([open_month(directory, m.year, m.month, climate_data, ens) for m in months], dim='time',
+                    data_vars='minimal', coords='minimal', compat='override')
+
+    # Boxes of all the fires in the coordinates of the grid
+    lat_min, lat_max, lon_min, lon_max = calculate_square_bounds(lon, lat, side_km)
+    if climate_data == 'climex2':
+        rotated_pole = ccrs.RotatedPole(pole_longitude=u_v.rotated_pole.grid_north_pole_longitude,
+                                        pole_latitude=u_v.rotated_pole.grid_north_pole_latitude)
+        corners = rotated_pole.transform_points(ccrs.PlateCarree(), np.concatenate([lon_min, lon_max]),
+                                                np.concatenate([lat_min, lat_max]))
+        x_name, y_name = 'rlon', 'rlat'
+        x_min, x_max = corners[:len(lon), 0], corners[len(lon):, 0]
+        y_min, y_max = corners[:len(lon), 1], corners[len(lon):, 1]
+    else:
+        x_name, y_name = 'lon', 'lat'
+        x_min, x_max, y_min, y_max = lon_min, lon_max, lat_min, lat_max
+    u_v = u_v.sortby([y_name, x_name])
+    x = u_v[x_name].to_numpy()
+    y = u_v[y_name].to_numpy()
+    cols = box_indices(x, x_min, x_max)
+    rows = box_indices(y, y_min, y_max)
+
+    # Only read the times of the profiles and the area covering every box
+    needed = np.unique(times)
+    available = pd.DatetimeIndex(u_v['time'].to_numpy())
+    found = needed[available.get_indexer(needed) >= 0]
+    row0, row1 = rows[0].min(), max(rows[1].max(), rows[0].min() + 1)
+    col0, col1 = cols[0].min(), max(cols[1].max(), cols[0].min() + 1)
+    region = u_v[['uas', 'vas']].sel(time=found).isel({y_name: slice(row0, row1), x_name: slice(col0, col1)})
+    region = region.transpose('time', y_name, x_name).load()
+
+    time_index = np.searchsorted(found, times).clip(0, max(len(found) - 1, 0))
+    missing = ~np.isin(times, found)
+    rows = (rows[0] - row0, rows[1] - row0)
+    cols = (cols[0] - col0, cols[1] - col0)
+    if len(found):
+        u_mean = box_means(region['uas'].to_numpy(), time_index, rows, cols)
+        v_mean = box_means(region['vas'].to_numpy(), time_index, rows, cols)
+    else:
+        u_mean = v_mean = np.full(times.shape, np.nan)
+    u_mean[missing] = np.nan
+    v_mean[missing] = np.nan
+
+    # calculate the wind speed magnitude and direction
+    wind_speed = np.sqrt(u_mean**2 + v_mean**2)
+    wind_direction = (180 / np.pi) * np.arctan2(-v_mean, -u_mean) % 360
+
+    csv_paths = []
+    for k, (date, fire_lon, fire_lat) in enumerate(zip(fires['date'], lon, lat)):
+        no_data = np.isnan(wind_speed[k]) | np.isnan(wind_direction[k])
+        if no_data.any():
+            print(f"{fire_lat} N, {fire_lon} E: no wind at {', '.join(str(t) for t in times[k][no_data])}")
+
+        wind_df = pd.DataFrame({
+            'date': pd.DatetimeIndex(times[k]).strftime('%Y-%m-%d_%H:%M:%SZ'),
+            'wind_speed': wind_speed[k],
+            'wind_direction': wind_direction[k],
+            'lon': fire_lon,
+            'lat': fire_lat,
+        }).fillna(0)
+
+        # Save the wind data in the folder of the fire
+        folder_name = os.path.join(folder_path, f"{date}_{fire_lon:.2f}E_{fire_lat:.2f}N")
+        os.makedirs(folder_name, exist_ok=True)
+        csv_path = os.path.join(folder_name, 'wind_data.csv')
+        wind_df.to_csv(csv_path, index=False)
+        csv_paths.append(csv_path)
+    return csv_paths
+
+
+def extract_winds(fires, directory, folder_path, climate_data='climex2', ens=None, side_km=30, duration=24, step=3,
+                  workers=4):
+    """
+    Write the wind_data.csv of every ignition, grouping the fires by (year, month)
+    so that each month of climate data is opened once, the months being processed
+    in parallel.
+
+    Parameters:
+    - fires: pd.DataFrame, ignitions with the columns date (YYYY-MM-DD), lon, lat
+    - directory: str, folder of the climate data
+    - folder_path: str, output folder
+    - climate_data: str, 'climex2' or 'era5-land'
+    - ens: str, ensemble of the CLIMEX2 files
+    - side_km: float, side of the square averaged around the ignition
+    - duration, step: int, length and time step of the profile (hours)
+    - workers: int, number of months processed at the same time
+
+    Returns the list of wind_data.csv written.
+    """
+    fire_dates = pd.to_datetime(fires['date'])
+    groups = [group for _, group in fires.groupby([fire_dates.dt.year, fire_dates.dt.month])]
+    options = dict(climate_data=climate_data, ens=ens, side_km=side_km, duration=duration, step=step)
+
+    csv_paths = []
+    if workers <= 1:
+        for group in groups:
+            csv_paths.extend(extract_month(group, directory, folder_path, **options))
+        return csv_paths
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(extract_month, group, directory, folder_path, **options) for group in groups]
+        for future in futures:
+            csv_paths.extend(future.result())
+    return csv_paths
@@ -0,0 +1,91 @@
+import json
+import numpy as np
+from transforms import transform_coords
+
+# Name of the file written in the folder of each fire
+AREA_DRAWS_NAME = 'area_draws.geojson'
+
+# Quantiles of the size distribution used by --quantiles without values
+DEFAULT_QUANTILES = [round(q, 2) for q in np.arange(0.05, 1.0, 0.05)]
+
+
+def sample_area_draws(distribution, draws=0, quantiles=None):
+    """
+    Maximum areas (ha) evaluated on the trajectory of one fire.
+
+    Parameters:
+    - distribution: scipy.stats frozen distribution of the historical fire sizes (ha)
+    - draws: int, number of independent random draws
+    - quantiles: list of float, quantiles of the distribution (used instead of the random draws)
+
+    Returns a list of dicts with the area_max of each draw (and its quantile).
+    """
+    if quantiles:
+        return [{'area_max': float(distribution.ppf(q)), 'quantile': float(q)} for q in quantiles]
+    return [{'area_max': float(a)} for a in np.atleast_1d(distribution.rvs(size=draws))]
+
+
+def truncation_steps(areas, area_max):
+    """
+    Step at which the fire stops for each maximum area.
+
+    The spread does not depend on area_max until the fire is stopped, so a
+    single trajectory run to the end of the wind data gives the final step of
+    any draw: the first step whose area exceeds area_max, or the last step.
+
+    Parameters:
+    - areas: array-like, burned area (ha) of every step of the trajectory
+    - area_max: array-like, maximum areas (ha)
+
+    Returns an int array with one step per area_max.
+    """
+    areas = np.asarray(areas, dtype=float)
+    area_max = np.asarray(area_max, dtype=float)
+    exceeded = areas[None, :] > area_max[:, None]
+    return np.where(exceeded.any(axis=1), exceeded.argmax(axis=1), len(areas) - 1)
+
+
+def write_area_draws(filepath, draws, perimeters, dates, areas, crs='epsg:4326'):
+    """
+    Write the final perimeter of every draw as a GeoJSON FeatureCollection.
+
+    Each feature holds the fronts of the step where the draw stops (a
+    MultiPolygon in crs) with the properties draw, area_max, quantile, step,
+    date, area_ha and stopped (False when the fire reached the end of the
+    wind data before area_max).
+
+    Parameters:
+    - filepath: str, output GeoJSON
+    - draws: list of dicts from sample_area_draws
+    - perimeters: dict {step: Perimeter}, at least the steps where a draw stops
+    - dates: list of str, date of every step
+    - areas: list of float, burned area (ha) of every step
+    - crs: str, CRS of the output coordinates (default: EPSG:4326)
+    """
+    steps = truncation_steps(areas, [draw['area_max'] for draw in draws])
+
+    # Several draws stop at the same step, each front is only transformed once
+    geometries = {}
+    for step in np.unique(steps):
+        perimeter = perimeters[int(step)]
+        polygons = []
+        for ring in perimeter.fronts:
+            coords = transform_coords(ring, perimeter.crs, crs).tolist()
+            coords.append(coords[0])  # Ensure the polygon is closed
+            polygons.append([coords])
+        geometries[int(step)] = {'type': 'MultiPolygon', 'coordinates': polygons}
+
+    features = []
+    for k, (draw, step) in enumerate(zip(draws, steps)):
+        step = int(step)
+        features.append({
+            'type': 'Feature',
+            'properties': {'draw': k, 'area_max': draw['area_max'], 'quantile': draw.get('quantile'),
+                           'step': step, 'date': str(dates[step]), 'area_ha': float(areas[step]),
+                           'stopped': bool(areas[step] > draw['area_max'])},
+            'geometry': geometries[step],
+        })
+
+    with open(filepath, 'w', encoding='utf-8') as f:
+        json.dump({'type': 'FeatureCollection', 'projection': crs, 'features': features}, f, ensure_ascii=False)
+    return filepath
@@ -0,0 +1,76 @@
+import os
+
+# Kinds of files kept by each retention policy, every other file of the fire is removed
+RETENTION_POLICIES = {
+    'finals': {'final'},
+    'perimeters': {'final', 'perimeter', 'ff'},
+    'all': None,  # keep everything
+}
+
+
+class FireArtifacts:
+    """
+    Files created by the simulation of one fire and their retention policy.
+
+    Only the files registered here and the content of the registered step
+    folders are considered, so the cleanup of a fire never looks outside its
+    own folder (the cost does not grow with the scenario and fires running at
+    the same time are left alone). Files of a step folder that were not
+    registered with a kind (WindNinja outputs, cfg, copied elevation...)
+    are scratch files.
+
+    Parameters:
+    - policy: str, one of RETENTION_POLICIES
+    """
+
+    def __init__(self, policy='perimeters'):
+        if policy not in RETENTION_POLICIES:
+            raise ValueError(f"Unknown retention policy '{policy}', use one of {', '.join(RETENTION_POLICIES)}")
+        self.policy = policy
+        self.kinds = {}
+        self.step_dirs = []
+
+    def add(self, path, kind):
+        """Register a file of the fire (kind: 'terrain', 'landscape', 'ff', 'perimeter', 'final'...)."""
+        self.kinds[os.path.abspath(path)] = kind
+
+    def add_step(self, step_dir, i):
+        """Register the folder of a time step and the files ForeFire reads and writes in it."""
+        step_dir = os.path.abspath(step_dir)
+        if step_dir not in self.step_dirs:
+            self.step_dirs.append(step_dir)
+        self.add(os.path.join(step_dir, 'landscape.nc'), 'landscape')
+        self.add(os.path.join(step_dir, f't{i}.ff'), 'ff')
+        self.add(os.path.join(step_dir, f't{i}.ffgeojson'), 'perimeter')
+
+    def kept(self, path):
+        keep = RETENTION_POLICIES[self.policy]
+        return keep is None or self.kinds.get(os.path.abspath(path), 'scratch') in keep
+
+    def cleanup(self):
+        """Remove the files of the fire that the policy does not keep, return how many were removed."""
+        if RETENTION_POLICIES[self.policy] is None:
+            return 0
+
+        paths = set(self.kinds)
+        for step_dir in self.step_dirs:
+            if os.path.isdir(step_dir):
+                paths.update(entry.path for entry in os.scandir(step_dir) if entry.is_file())
+
+        removed = 0
+        for path in sorted(paths):
+            if self.kept(path) or not os.path.exists(path):
+                continue
+            try:
+                os.remove(path)
+                removed += 1
+            except OSError as e:
+                print(f"Error removing {path}: {e}")
+
+        # Step folders left without any file
+        for step_dir in self.step_dirs:
+            try:
+                os.rmdir(step_dir)
+            except OSError:
+                pass  # not empty (or already removed)
+        return removed
@@ -0,0 +1,239 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+import rasterio
+from rasterio.transform import from_origin
+from rasterio.windows import Window
+
+from extend import get_utm_crs, process_raster_files
+from genWindNinjaFile_automatic import create_config_file
+from createLandscape import LandscapeBuilder, default_wind_generator
+from ff_file_generator_automatic import create_ff_file
+from ffgeojsonTogeojson import process_ffgeojson_files
+from perimeter import Perimeter
+from burn_state import BurnState
+
+# Stand-ins for WindNinja_cli and forefire
+STUBS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'stubs')
+
+# Synthetic fire: ignition point, size of the square cut in the DEM projection
+# (as size_km1 in main.py) relative to the simulated domain, number of steps
+LON, LAT = 9.5, 56.0
+SOURCE_FACTOR = 3.0
+NUM_STEPS = 8
+
+KM_PER_DEGREE = 111.32
+STRIP_ROWS = 1000
+
+# Land cover classes drawn for the synthetic CLC raster
+CLC_CLASSES = np.array([211, 231, 311, 312, 313, 321, 322, 324, 333], dtype=np.int16)
+
+# Stages timed, with the unit of their throughput
+STAGES = {
+    'process_raster_files': 'cells',
+    'create_config_file': 'files',
+    'landscape_init': 'cells',
+    'landscape_write': 'cells',
+    'create_ff_file': 'nodes',
+    'process_ffgeojson_files': 'nodes',
+    'perimeter_read': 'nodes',
+    'burn_update': 'nodes',
+    'stop_check': 'nodes',
+}
+
+
+def synthetic_rasters(output_dir, size_km, dem_res, clc_res, seed=0):
+    """
+    Write a synthetic DEM and land cover in EPSG:4326 (as EU-DEM.tif and EU-CLC_v2018.tif) around the ignition point.
+
+    The DEM is made of smooth hills and the land cover of random blocks of
+    CLC classes, large enough to cut the square of size SOURCE_FACTOR * size_km.
+    The rasters are written by strips so that the 90 km domain fits in memory.
+    """
+    rng = np.random.default_rng(seed)
+    half = SOURCE_FACTOR * size_km / KM_PER_DEGREE / 2 + 0.05
+
+    paths = {}
+    for name, res_m in (('dem', dem_res), ('clc', clc_res)):
+        res = res_m / 1000 / KM_PER_DEGREE
+        size = int(2 * half / res)
+        transform = from_origin(LON - half, LAT + half, res, res)
+        dtype = 'float32' if name == 'dem' else 'int16'
+        paths[name] = os.path.join(output_dir, f'synthetic_{name}.tif')
+        with rasterio.open(paths[name], 'w', driver='GTiff', width=size, height=size, count=1, dtype=dtype,
+                           crs='EPSG:4326', transform=transform, tiled=True, compress='deflate') as dst:
+            x = np.arange(size, dtype=np.float32) * res_m / 4000
+            for row in range(0, size, STRIP_ROWS):
+                rows = min(STRIP_ROWS, size - row)
+                if name == 'dem':
+                    y = np.arange(row, row + rows, dtype=np.float32) * res_m / 4000
+                    data = 200 + 150 * np.sin(x)[None, :] * np.cos(y)[:, None] + 0.01 * y[:, None] * 4000
+                else:
+                    # Blocks of 10x10 pixels with the same class
+                    blocks = rng.choice(CLC_CLASSES, size=(rows // 10 + 1, size // 10 + 1))
+                    data = np.kron(blocks, np.ones((10, 10), dtype=np.int16))[:rows, :size]
+                dst.write(data.astype(dtype), 1, window=Window(0, row, size, rows))
+    return paths['dem'], paths['clc']
+
+
+def synthetic_wind(run_dir, num_steps=NUM_STEPS):
+    """Write a *_data.csv wind file as produced by get_winds_u-v.ipynb."""
+    dates = pd.date_range('2020-07-01 12:00', periods=num_steps, freq='3h')
+    wind_data = pd.DataFrame({
+        'date': dates.strftime('%Y-%m-%dT%H:%M:%SZ'),
+        'wind_speed': np.linspace(4, 9, num_steps).round(1),
+        'wind_direction': np.linspace(200, 290, num_steps).round(),
+        'lon': LON,
+        'lat': LAT,
+    })
+    path = os.path.join(run_dir, 'benchmark_data.csv')
+    wind_data.to_csv(path, index=False)
+    return path
+
+
+class StageTimer:
+    """Collect the wall time and processed units of every call of each stage."""
+
+    def __init__(self):
+        self.records = {stage: [] for stage in STAGES}
+
+    @contextlib.contextmanager
+    def __call__(self, stage, units=1):
+        """Time a block; the units can be set in the yielded dict when only known at the end."""
+        record = {'units': units}
+        start = time.perf_counter()
+        yield record
+        self.records[stage].append((time.perf_counter() - start, record['units']))
+
+    def summary(self):
+        rows = []
+        for stage, records in self.records.items():
+            if not records:
+                continue
+            seconds = np.array([r[0] for r in records])
+            units = sum(r[1] for r in records)
+            rows.append({
+                'stage': stage,
+                'calls': len(records),
+                'median_ms': float(np.median(seconds) * 1000),
+                'p90_ms': float(np.percentile(seconds, 90) * 1000),
+                'total_s': float(seconds.sum()),
+                'throughput': float(units / seconds.sum()) if seconds.sum() > 0 else float('inf'),
+                'unit': STAGES[stage],
+            })
+        return rows
+
+
+def run_fire(run_dir, size_km, dem_path, clc_path, timer, area_max=np.inf):
+    """Run every stage of main.run_fire on the synthetic fire, with the stub binaries."""
+    wind_data = pd.read_csv(synthetic_wind(run_dir))
+    utm_crs = get_utm_crs(LON, LAT)
+
+    with timer('process_raster_files') as record:
+        elevation_path, landcover_path = process_raster_files(LON, LAT, SOURCE_FACTOR * size_km, size_km,
+                                                              dem_path, clc_path, run_dir, utm_crs)
+        with rasterio.open(elevation_path) as src:
+            record['units'] = src.width * src.height
+
+    with timer('landscape_init') as record:
+        builder = LandscapeBuilder(elevation_path, landcover_path)
+        record['units'] = builder.fuel_model_map.size
+    burn_state = BurnState(builder.fuel_model_map, builder.fuel_transform)
+
+    perimeter = None
+    for i, row in wind_data.iterrows():
+        step_dir = os.path.join(run_dir, f't{i}')
+        os.mkdir(step_dir)
+        shutil.copy(elevation_path, step_dir)
+
+        with timer('create_config_file'):
+            cfg_file = create_config_file(row['wind_speed'], row['wind_direction'], step_dir)
+        subprocess.run([sys.executable, os.path.join(STUBS_DIR, 'WindNinja_cli'), cfg_file], cwd=step_dir, check=True,
+                       stdout=subprocess.DEVNULL)
+
+        with timer('landscape_write', builder.fuel_model_map.size):
+            wind_dict = default_wind_generator(step_dir)
+            builder.write(os.path.join(step_dir, 'landscape.nc'), burn_state.fuel_model_map, wind_dict,
+                          previous=os.path.join(run_dir, f't{i-1}', 'landscape.nc') if i > 0 else None,
+                          fuel_changed=burn_state.changed)
+            burn_state.changed = False
+
+        nodes = len(perimeter.fronts[0]) if perimeter is not None else 1
+        with timer('create_ff_file', nodes):
+            create_ff_file(i, f't{i}', run_dir, row['date'], perimeter=perimeter)
+        subprocess.run([sys.executable, os.path.join(STUBS_DIR, 'forefire'), '-i', f't{i}.ff'], cwd=step_dir, check=True,
+                       stdout=subprocess.DEVNULL)
+
+        ffgeojson_file = os.path.join(step_dir, f't{i}.ffgeojson')
+        with open(ffgeojson_file) as f:
+            nodes = sum(len(feature['geometry']['coordinates'][0]) for feature in json.load(f)['features'])
+        with timer('process_ffgeojson_files', nodes):
+            process_ffgeojson_files(step_dir)
+        with timer('perimeter_read', nodes):
+            perimeter = Perimeter.from_ffgeojson(ffgeojson_file)
+        with timer('stop_check', nodes):
+            stop = perimeter.area_ha() > area_max
+        if stop:
+            break
+        with timer('burn_update', nodes):
+            burn_state.update(perimeter.polygon())
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time each stage of the fire-spread pipeline on synthetic data, '
+                                                 'with stand-ins for WindNinja_cli and forefire.')
+    parser.add_argument('--sizes', type=float, nargs='+', default=[10, 30, 90], help='Domain sizes in km (default: 10 30 90)')
+    parser.add_argument('--repeats', type=int, default=1, help='Fires simulated for each size (default: 1)')
+    parser.add_argument('--dem-res', type=float, default=25, help='Resolution of the synthetic DEM in m (default: 25, as EU-DEM)')
+    parser.add_argument('--clc-res', type=float, default=100, help='Resolution of the synthetic CLC in m (default: 100)')
+    parser.add_argument('--work-dir', default=None, help='Directory of the synthetic data (default: a temporary directory)')
+    parser.add_argument('--output', default=None, help='Write the results as JSON to this file')
+    args = parser.parse_args()
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix='forefire-benchmark-')
+    os.makedirs(work_dir, exist_ok=True)
+    results = {}
+    try:
+        for size_km in args.sizes:
+            size_dir = os.path.join(work_dir, f'{size_km:g}km')
+            os.makedirs(size_dir, exist_ok=True)
+            print(f'Domain {size_km:g} km: building synthetic rasters...', flush=True)
+            dem_path, clc_path = synthetic_rasters(size_dir, size_km, args.dem_res, args.clc_res)
+
+            timer = StageTimer()
+            for repeat in range(args.repeats):
+                run_dir = os.path.join(size_dir, f'fire{repeat}')
+                shutil.rmtree(run_dir, ignore_errors=True)
+                os.makedirs(run_dir)
+                # The helpers print their progress, keep the report readable
+                with contextlib.redirect_stdout(io.StringIO()):
+                    run_fire(run_dir, size_km, dem_path, clc_path, timer)
+            results[f'{size_km:g}km'] = timer.summary()
+
+            print(f"{'stage':<26}{'calls':>6}{'median ms':>12}{'p90 ms':>12}{'total s':>10}{'throughput':>14}")
+            for row in results[f'{size_km:g}km']:
+                print(f"{row['stage']:<26}{row['calls']:>6}{row['median_ms']:>12.1f}{row['p90_ms']:>12.1f}"
+                      f"{row['total_s']:>10.2f}{row['throughput']:>14.0f} {row['unit']}/s")
+            print()
+    finally:
+        if args.work_dir is None:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=4)
+        print(f'Results written to {args.output}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,155 @@
+import argparse
+import os
+from math import ceil, floor
+import rasterio
+from rasterio.crs import CRS
+from rasterio.enums import Resampling
+from rasterio.vrt import WarpedVRT
+from rasterio.warp import transform_bounds
+from affine import Affine
+
+# Layers of the store: name, resampling used for the reprojection
+LAYERS = {
+    'elevation': Resampling.bilinear,
+    'land_cover': Resampling.nearest,
+}
+
+# Extra longitude (degrees) added on both sides of a UTM zone so that the
+# square of a fire ignited close to the zone border is still covered
+ZONE_MARGIN_DEG = 1.0
+
+BLOCK_SIZE = 512
+
+
+def store_path(store_dir, layer, epsg):
+    """Path of one layer of the store for a UTM CRS ('EPSG:326XX' or its code)."""
+    code = str(epsg).split(':')[-1]
+    return os.path.join(store_dir, f'{layer}_{code}.tif')
+
+
+def utm_zones(raster_path):
+    """List the northern-hemisphere UTM zones covered by a raster."""
+    with rasterio.open(raster_path) as src:
+        west, south, east, north = transform_bounds(src.crs, 'EPSG:4326', *src.bounds, densify_pts=21)
+    first = int((west + 180) / 6) + 1
+    last = int((east + 180) / 6) + 1
+    return list(range(max(first, 1), min(last, 60) + 1))
+
+
+def zone_grid(src, zone, resolution, margin_deg=ZONE_MARGIN_DEG):
+    """
+    Define the grid of a UTM zone covering the raster, aligned on its resolution.
+
+    Parameters:
+    - src: rasterio dataset of the pan-European raster
+    - zone: int, UTM zone number
+    - resolution: float, pixel size of the store (m)
+    - margin_deg: float, extra longitude added on both sides of the zone
+
+    Returns the destination CRS, transform, width and height.
+    """
+    dst_crs = CRS.from_epsg(32600 + zone)
+
+    # Longitude band of the zone (plus margin), latitude range of the raster
+    west, south, east, north = transform_bounds(src.crs, 'EPSG:4326', *src.bounds, densify_pts=21)
+    zone_west = -180 + (zone - 1) * 6 - margin_deg
+    zone_east = -180 + zone * 6 + margin_deg
+    band = (max(west, zone_west), south, min(east, zone_east), north)
+
+    left, bottom, right, top = transform_bounds('EPSG:4326', dst_crs, *band, densify_pts=101)
+
+    # Snap the grid to the resolution so every fire window falls on whole pixels
+    left = floor(left / resolution) * resolution
+    top = ceil(top / resolution) * resolution
+    width = ceil((right - left) / resolution)
+    height = ceil((top - bottom) / resolution)
+    transform = Affine(resolution, 0.0, left, 0.0, -resolution, top)
+
+    return dst_crs, transform, width, height
+
+
+def build_zone(raster_path, output_path, zone, resample_method, resolution=None):
+    """
+    Reproject a pan-European raster into a tiled GeoTIFF for one UTM zone.
+
+    The warp is done block by block through a WarpedVRT, so the memory use
+    does not depend on the size of the zone. The output is tiled, compressed
+    and has no overviews: a fire only reads the blocks of its own window.
+
+    Parameters:
+    - raster_path: str, path of the pan-European raster (EU-DEM, CLC...)
+    - output_path: str, path of the store file of the zone
+    - zone: int, UTM zone number (northern hemisphere)
+    - resample_method: Rasterio resampling method
+    - resolution: float, pixel size (m), by default the one of the source
+    """
+    with rasterio.open(raster_path) as src:
+        if resolution is None:
+            resolution = round(abs(src.res[0]))
+        dst_crs, transform, width, height = zone_grid(src, zone, resolution)
+
+        profile = {
+            'driver': 'GTiff',
+            'dtype': src.dtypes[0],
+            'count': 1,
+            'crs': dst_crs,
+            'transform': transform,
+            'width': width,
+            'height': height,
+            'nodata': src.nodata,
+            'tiled': True,
+            'blockxsize': BLOCK_SIZE,
+            'blockysize': BLOCK_SIZE,
+            'compress': 'deflate',
+            'predictor': 3 if src.dtypes[0].startswith('float') else 2,
+            'BIGTIFF': 'YES',
+        }
+
+        vrt_options = {
+            'resampling': resample_method,
+            'crs': dst_crs,
+            'transform': transform,
+            'width': width,
+            'height': height,
+        }
+
+        temp_path = output_path + '.part'
+        with WarpedVRT(src, **vrt_options) as vrt:
+            with rasterio.open(temp_path, 'w', **profile) as dst:
+                for _, window in dst.block_windows(1):
+                    dst.write(vrt.read(1, window=window), 1, window=window)
+
+    # Only expose complete stores to the fires
+    os.replace(temp_path, output_path)
+    print(f"Terrain store written: {output_path}")
+    return output_path
+
+
+def build_store(DEM_path, CLC_path, store_dir, zones=None):
+    """
+    Build the per-UTM-zone elevation and land cover stores used by extend.process_raster_store.
+
+    Parameters:
+    - DEM_path: str, path to the pan-European DEM
+    - CLC_path: str, path to the pan-European land cover
+    - store_dir: str, directory where the store is written
+    - zones: list of int, UTM zones to build (default: every zone covered by the DEM)
+    """
+    os.makedirs(store_dir, exist_ok=True)
+    if zones is None:
+        zones = utm_zones(DEM_path)
+
+    for zone in zones:
+        for layer, raster_path in (('elevation', DEM_path), ('land_cover', CLC_path)):
+            build_zone(raster_path, store_path(store_dir, layer, 32600 + zone), zone, LAYERS[layer])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Build the per-UTM-zone terrain store of the fire-spread simulations.')
+    parser.add_argument('store_dir', help='Output directory of the store')
+    parser.add_argument('--dem', default='/home/jsoma/europeData/EU-DEM.tif', help='Pan-European DEM')
+    parser.add_argument('--clc', default='/home/jsoma/europeData/EU-CLC_v2018.tif', help='Pan-European land cover')
+    parser.add_argument('--zones', type=int, nargs='+', default=None, help='UTM zones to build (default: all)')
+    args = parser.parse_args()
+
+    build_store(args.dem, args.clc, args.store_dir, args.zones)
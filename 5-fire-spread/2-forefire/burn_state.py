@@ -0,0 +1,73 @@
+import numpy as np
+from rasterio.features import rasterize
+from rasterio.windows import Window
+from rasterio.windows import transform as window_transform
+
+# Fuel index given to the burned cells
+BURNED_FUEL = 324
+
+
+class BurnState:
+    """
+    Fuel map of a fire on the landscape grid, kept in memory between time steps.
+
+    Each update only rasterizes the area burned since the previous update
+    (the difference between the new perimeter and what already burned), on
+    the window of the grid covering it, so the cost follows the growth of
+    the fire and not the size of the domain. A cell burns when its centre
+    is inside the perimeter, as with rasterio.mask.
+
+    Parameters:
+    - fuel_model_map: 2D array, unburned fuel map on the landscape grid
+    - transform: Affine, transform of the landscape grid
+    """
+
+    def __init__(self, fuel_model_map, transform):
+        self.fuel_model_map = np.array(fuel_model_map, dtype=np.int32)
+        self.transform = transform
+        self.burned = None
+        self.burned_cells = np.empty(0, dtype=np.int64)  # flat indices of the cells burned by the last update
+        self.changed = True  # the fuel map has not been written yet
+
+    def update(self, perimeter):
+        """Burn the cells inside the new perimeter, return the number of newly burned cells."""
+        self.burned_cells = np.empty(0, dtype=np.int64)
+        if self.burned is None:
+            new_area = perimeter
+            self.burned = perimeter
+        else:
+            new_area = perimeter.difference(self.burned)
+            self.burned = self.burned.union(perimeter)
+
+        if new_area.is_empty:
+            return 0
+
+        # Window of the grid covering the newly burned area
+        height, width = self.fuel_model_map.shape
+        minx, miny, maxx, maxy = new_area.bounds
+        col0, row0 = ~self.transform * (minx, maxy)
+        col1, row1 = ~self.transform * (maxx, miny)
+        col_start = max(int(np.floor(min(col0, col1))), 0)
+        col_stop = min(int(np.ceil(max(col0, col1))), width)
+        row_start = max(int(np.floor(min(row0, row1))), 0)
+        row_stop = min(int(np.ceil(max(row0, row1))), height)
+        if col_start >= col_stop or row_start >= row_stop:
+            return 0
+        window = Window(col_start, row_start, col_stop - col_start, row_stop - row_start)
+
+        mask = rasterize(
+            [new_area],
+            out_shape=(row_stop - row_start, col_stop - col_start),
+            transform=window_transform(window, self.transform),
+            fill=0,
+            default_value=1,
+            dtype='uint8'
+        ).astype(bool)
+
+        fuel = self.fuel_model_map[row_start:row_stop, col_start:col_stop]
+        rows, cols = np.nonzero(mask & (fuel != BURNED_FUEL))
+        fuel[mask] = BURNED_FUEL
+        self.burned_cells = (rows + row_start).astype(np.int64) * width + cols + col_start
+        if len(rows):
+            self.changed = True
+        return len(rows)
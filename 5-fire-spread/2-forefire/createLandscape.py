@@ -1,6 +1,7 @@
 import os
 import sys
 import glob
+import shutil
 import argparse
 import rasterio as rio
 from rasterio.crs import CRS
@@ -9,20 +10,19 @@ from rasterio.vrt import WarpedVRT
 import numpy as np
 from datetime import datetime
 import netCDF4 as netcdf
-from pyproj import Transformer
+from transforms import transform_xy
 import affine
 from math import floor
 
-def prop_vrt_Warp(src_path, epsg):
-    src = rio.open(src_path)
-    bbox = src.bounds
+def warp_options(src_path, epsg):
+    with rio.open(src_path) as src:
+        bbox = src.bounds
+        src_crs = src.crs
 
     min_long, min_lat = (bbox[0], bbox[1])
     max_long, max_lat = (bbox[2], bbox[3])
 
-    transformer = Transformer.from_crs(src.crs, f'epsg:{epsg}', always_xy=True)
-    min_x, min_y = transformer.transform(min_long, min_lat)
-    max_x, max_y = transformer.transform(max_long, max_lat)
+    (min_x, max_x), (min_y, max_y) = transform_xy([min_long, max_long], [min_lat, max_lat], src_crs, f'epsg:{epsg}')
     
     right = max_x
     bottom = min_y
@@ -47,6 +47,11 @@ def prop_vrt_Warp(src_path, epsg):
         'height': dst_height,
         'width': dst_width,
     }
+    return vrt_options
+
+def prop_vrt_Warp(src_path, epsg, vrt_options=None):
+    if vrt_options is None:
+        vrt_options = warp_options(src_path, epsg)
 
     with rio.open(src_path) as src:
         with WarpedVRT(src, **vrt_options) as vrt:
@@ -69,31 +74,26 @@ def default_wind_generator(common_path):
     ang_files = glob.glob(os.path.join(common_path, '*_ang.asc'))
     
     if not vel_files:
-        print(f"Error: No velocity files ending with '_vel.asc' found in {common_path}.")
-        sys.exit(1)
+        raise FileNotFoundError(f"No velocity files ending with '_vel.asc' found in {common_path}.")
     if not ang_files:
-        print(f"Error: No angle files ending with '_ang.asc' found in {common_path}.")
-        sys.exit(1)
+        raise FileNotFoundError(f"No angle files ending with '_ang.asc' found in {common_path}.")
     
     vel_path = vel_files[0]
     ang_path = ang_files[0]
     
-    vel = np.loadtxt(vel_path, skiprows=6)
-    ang = np.loadtxt(ang_path, skiprows=6)
+    # GDAL's AAIGrid driver parses the grids much faster than np.loadtxt
+    with rio.open(vel_path) as src:
+        vel = src.read(1, out_dtype='float32')
+    with rio.open(ang_path) as src:
+        ang = src.read(1, out_dtype='float32')
     
+    # The wind field is the same for every direction: compute u/v only once
+    math_ang = np.radians(270 - ang)
+
     wind_dict = {}
-    wind_dict['wind_u'] = []    
-    wind_dict['wind_v'] = []
+    wind_dict['wind_u'] = vel * np.cos(math_ang)
+    wind_dict['wind_v'] = vel * np.sin(math_ang)
     wind_dict['wind_shape'] = vel.shape
-    
-    directions = [0, 45, 90, 135, 180, 225, 270, 315, 360]
-    math_ang = 270 - ang
-
-    for i in range(len(directions)):
-        u = vel * np.cos(np.radians(math_ang))
-        v = vel * np.sin(np.radians(math_ang))
-        wind_dict['wind_u'].append(u)
-        wind_dict['wind_v'].append(v)
         
     return wind_dict
 
@@ -120,7 +120,7 @@ def domainGenerator(fuelModelMap):
     domainProperties['Ly']   = np.float32(Ly)
     domainProperties['Lz']   = np.float32(0)
     domainProperties['t0']   = np.float32(0)
-    domainProperties['Lt']   = np.float32(np.Inf)
+    domainProperties['Lt']   = np.float32(np.inf)
 
     return domainProperties
 
@@ -138,6 +138,18 @@ def parameter_generator(projection):
     parameters_properties['refDay']  = np.int32(day)
     return parameters_properties
 
+def write_wind(wind, wind_dict):
+    # ForeFire expects 8 wind directions in the landscape: the same flipped
+    # field is written to each of them, without keeping per-direction copies
+    wind_u = np.flip(wind_dict['wind_u'], axis=0)
+    wind_v = np.flip(wind_dict['wind_v'], axis=0)
+    for i in range(8):           
+        wind[0,i,:,:] = wind_u
+        wind[1,i,:,:] = wind_v
+
+def write_fuel(fuel, fuel_model_map):
+    fuel[0,0,:,:] = np.flip(fuel_model_map, axis=0)
+
 def landscape_generator(filename, domain_properties, parameters_properties, projection, fuel_model_map, wind_dict, elevation=None):
     ncfile = netcdf.Dataset(filename, 'w', format='NETCDF3_CLASSIC')
     
@@ -176,13 +188,10 @@ def landscape_generator(filename, domain_properties, parameters_properties, proj
     
     wind = ncfile.createVariable('wind', 'f4', ('wind_dimensions', 'wind_directions', 'wind_rows', 'wind_columns'))
     wind.type = "wind"          
-        
-    for i in range(8):           
-        wind[0,i,:,:] = np.flip(wind_dict['wind_u'][i], axis=0)
-        wind[1,i,:,:] = np.flip(wind_dict['wind_v'][i], axis=0)
+    write_wind(wind, wind_dict)
 
     fuel = ncfile.createVariable('fuel', 'i4', ('ft', 'fz', 'fy', 'fx'))
-    fuel[0,0,:,:] = np.flip(fuel_model_map, axis=0)
+    write_fuel(fuel, fuel_model_map)
     fuel.type = "fuel"
     
     if elevation is not None:
@@ -195,6 +204,65 @@ def landscape_generator(filename, domain_properties, parameters_properties, proj
     ncfile.close()
     return ncfile
 
+def update_landscape(filename, fuel_model_map=None, wind_dict=None):
+    """Rewrite only the fuel and/or wind layers of an existing landscape file."""
+    ncfile = netcdf.Dataset(filename, 'a')
+    try:
+        if wind_dict is not None:
+            write_wind(ncfile.variables['wind'], wind_dict)
+        if fuel_model_map is not None:
+            write_fuel(ncfile.variables['fuel'], fuel_model_map)
+        print(f"updating {filename}")
+        ncfile.sync()
+    finally:
+        ncfile.close()
+
+class LandscapeBuilder:
+    """
+    Build the landscape files of one fire inside the calling process.
+
+    The elevation grid, the fuel grid, the domain and the parameters do not
+    change between the time steps of a fire, so they are computed once when
+    the builder is created. Each step then only writes the fuel and wind
+    layers, the fuel map being kept up to date by the BurnState of the fire.
+
+    Parameters:
+    - elevation_filepath: str, elevation.tif of the fire
+    - fuel_filepath: str, land_cover.tif of the fire
+    """
+
+    def __init__(self, elevation_filepath, fuel_filepath):
+        with rio.open(elevation_filepath) as src:
+            self.epsg = src.crs.to_epsg()
+
+        self.elevation_map = elevation_generator(elevation_filepath, self.epsg)
+        self.fuel_vrt_options = warp_options(fuel_filepath, self.epsg)
+        self.fuel_transform = self.fuel_vrt_options['transform']
+        self.crs = self.fuel_vrt_options['crs']
+        fuel_ds = prop_vrt_Warp(fuel_filepath, self.epsg, self.fuel_vrt_options)
+        self.fuel_model_map = fuel_ds[1]
+        self.domain = domainGenerator(fuel_ds)
+        self.parameters = parameter_generator(self.epsg)
+
+    def write(self, filename, fuel_model_map, wind_dict, previous=None, fuel_changed=True):
+        """
+        Write the landscape file of a time step.
+
+        If the landscape of the previous step is given and has the same wind
+        grid, it is copied and only its wind layer (and its fuel layer when
+        fuel_changed) is rewritten.
+        """
+        if previous is not None and os.path.exists(previous):
+            with netcdf.Dataset(previous, 'r') as ncfile:
+                wind_shape = (ncfile.dimensions['wind_rows'].size, ncfile.dimensions['wind_columns'].size)
+            if wind_shape == tuple(wind_dict['wind_shape']):
+                shutil.copyfile(previous, filename)
+                update_landscape(filename, fuel_model_map if fuel_changed else None, wind_dict)
+                return filename
+
+        landscape_generator(filename, self.domain, self.parameters, self.epsg, fuel_model_map, wind_dict, self.elevation_map)
+        return filename
+
 def main():
     parser = argparse.ArgumentParser(description='Generate landscape.nc file.')
     # parser.add_argument('output_name', type=str, help='Output filename for the landscape.nc')
@@ -213,18 +281,15 @@ def main():
         print(f"Error: {fuel_filepath} does not exist.")
         sys.exit(1)
     
-    
-    with rio.open(elevation_filepath) as src:
-        epsg = src.crs.to_epsg()
-        print(f"EPSG: {epsg}")
+    try:
+        wind_dict = default_wind_generator(common_path_wind)
+    except FileNotFoundError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
 
-    elevation_map = elevation_generator(elevation_filepath, epsg)
-    fuel_model_map = fuel_model_map_generator(fuel_filepath, epsg)
-    wind_dict = default_wind_generator(common_path_wind)
-    src = prop_vrt_Warp(fuel_filepath, epsg)
-    domain = domainGenerator(src)
-    parameters = parameter_generator(epsg)
-    landscape = landscape_generator(fixed_output_name, domain, parameters, epsg, fuel_model_map, wind_dict, elevation_map)
+    builder = LandscapeBuilder(elevation_filepath, fuel_filepath)
+    print(f"EPSG: {builder.epsg}")
+    builder.write(fixed_output_name, builder.fuel_model_map, wind_dict)
 
 if __name__ == "__main__":
     main()
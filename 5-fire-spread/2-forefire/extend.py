@@ -2,7 +2,7 @@ import geopandas as gpd
 import matplotlib.pyplot as plt
 import numpy as np
 import os
-from pyproj import Transformer, CRS
+from pyproj import CRS
 import rasterio
 from rasterio.enums import Resampling
 from shapely.geometry import box, Point
@@ -11,6 +11,9 @@ from rasterio.warp import calculate_default_transform, reproject, Resampling
 from rasterio.windows import from_bounds
 import warnings
 
+from build_terrain_store import store_path
+from transforms import transform_xy
+
 warnings.filterwarnings("ignore", category=FutureWarning, module="pyproj")
 
 def get_utm_crs(lon, lat):
@@ -162,8 +165,7 @@ def create_reprojected_square(lon, lat, size_km, reprojected_path, output_path,
 
         # Convert coordinates from lon/lat to UTM
         utm_crs = crs.to_proj4()  # UTM projection as PROJ string
-        transformer = Transformer.from_crs("EPSG:4326", utm_crs, always_xy=True)
-        easting, northing = transformer.transform(lon, lat)
+        easting, northing = transform_xy(lon, lat, "EPSG:4326", utm_crs)
 
         # Create a square around the point in UTM coordinates
         square = box(
@@ -263,6 +265,73 @@ def process_raster_files(lon, lat, size_km1, size_km2, DEM_path, CLC_path, outpu
 
     return elevation_path, landcover_path
 
+def extract_from_store(lon, lat, size_km, store_file, output_path):
+    """
+    Cut a square around a point from a per-UTM-zone terrain store.
+
+    The store is already in the UTM projection of the fire, so the square is
+    a single windowed read written straight to the output file.
+
+    Parameters:
+    - lon: float, longitude in degrees
+    - lat: float, latitude in degrees
+    - size_km: float, size of the square in kilometers
+    - store_file: str, path of the store of the UTM zone (see build_terrain_store.py)
+    - output_path: str, path to save the output raster file
+    """
+    with rasterio.open(store_file) as src:
+        # Convert coordinates from lon/lat to UTM
+        easting, northing = transform_xy(lon, lat, "EPSG:4326", src.crs)
+
+        # Window of the square, aligned on the pixels of the store
+        half_size_m = size_km * 1000 / 2
+        window = from_bounds(
+            easting - half_size_m,
+            northing - half_size_m,
+            easting + half_size_m,
+            northing + half_size_m,
+            transform=src.transform
+        ).round_offsets().round_lengths()
+
+        # Check if the square is within the raster bounds
+        if (window.col_off < 0 or window.row_off < 0 or
+            window.col_off + window.width > src.width or window.row_off + window.height > src.height):
+            raise ValueError("The square is out of the raster bounds.")
+
+        data = src.read(1, window=window)
+
+        with rasterio.open(output_path, 'w', driver='GTiff',
+                           height=data.shape[0], width=data.shape[1],
+                           count=1, dtype=data.dtype,
+                           crs=src.crs, nodata=src.nodata,
+                           transform=src.window_transform(window)) as dst:
+            dst.write(data, 1)
+
+    return output_path
+
+def process_raster_store(lon, lat, size_km2, store_dir, output_dir, dstCrs_UCTM):
+    """
+    Extract the elevation and landcover files of a fire from the terrain store.
+
+    Same outputs as process_raster_files, without the temporary squares and
+    the per-fire reprojection.
+
+    Parameters:
+    - lon: float, longitude in degrees
+    - lat: float, latitude in degrees
+    - size_km2: float, size of the square in kilometers
+    - store_dir: str, directory of the store built by build_terrain_store.py
+    - output_dir: str, directory to save the output files
+    - dstCrs_UCTM: Coordinate reference system in UTM
+    """
+    elevation_path = os.path.join(output_dir, 'elevation.tif')
+    extract_from_store(lon, lat, size_km2, store_path(store_dir, 'elevation', dstCrs_UCTM), elevation_path)
+
+    landcover_path = os.path.join(output_dir, 'land_cover.tif')
+    extract_from_store(lon, lat, size_km2, store_path(store_dir, 'land_cover', dstCrs_UCTM), landcover_path)
+
+    return elevation_path, landcover_path
+
 if __name__ == "__main__":
 
     process_raster_files()
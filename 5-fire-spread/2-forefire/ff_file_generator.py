@@ -3,7 +3,7 @@ import rasterio as rio
 from datetime import datetime, timedelta
 import geojson
 from shapely.geometry import shape
-from pyproj import Transformer
+from transforms import transform_coords
 
 def create_ff_file(i, folderName, run_dir, initial_date, time_step, propagation_model="Rothermel"):
     fuel_table_file =  '/home/jsoma/europeData/fuels.ff'
@@ -51,9 +51,7 @@ def create_ff_file(i, folderName, run_dir, initial_date, time_step, propagation_
 
             # Reproject and write the fire node locations
             t_file.write("FireFront[t=0.]\n")
-            transformer = Transformer.from_crs("epsg:4326", EPSG.to_string(), always_xy=True)
-            for coord in list(perimeter.exterior.coords):
-                x, y = transformer.transform(coord[0], coord[1])
+            for x, y in transform_coords(perimeter.exterior.coords, "epsg:4326", EPSG):
                 t_file.write(f"\tFireNode[loc=({x},{y},0);;vel=(0.,0.,0.);;t=0.]\n")
 
         # Add remaining lines for fire propagation
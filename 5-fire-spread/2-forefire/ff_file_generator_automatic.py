@@ -1,51 +1,60 @@
 import os
 import rasterio as rio
-import geojson
-from shapely.geometry import shape
 from pathlib import Path
-from pyproj import Transformer
 import textwrap
+from perimeter import Perimeter
 
-def create_ff_file(i, folder_name, run_dir, date, propagation_model="Rothermel"):
+FUEL_TABLE_FILE = '/home/jsoma/europeData/fuels.ff'
+
+def ff_parameters(projection, case_directory='.', propagation_model="Rothermel"):
+    """setParameter lines of a simulation whose input and output files are in case_directory."""
+    return textwrap.dedent(f"""\
+        setParameter[dumpMode=geojson]
+        setParameter[caseDirectory={case_directory}]
+        setParameter[ForeFireDataDirectory={case_directory}]
+        setParameter[projection={projection}]
+        setParameter[fuelsTableFile={FUEL_TABLE_FILE}]
+        setParameter[propagationModel={propagation_model}]
+    """)
+
+def ignition_point(elevation_file):
+    """Projection of the fire domain and ignition point at the centre of its elevation raster."""
+    with rio.open(elevation_file) as src:
+        x, y = src.xy(src.width // 2, src.height // 2)
+    return src.crs, (float(x), float(y), 0)
+
+def ff_fire_front(nodes):
+    """FireFront block from (x, y) nodes, or (x, y, vx, vy) nodes to keep their velocity."""
+    lines = []
+    for node in nodes:
+        vx, vy = (node[2], node[3]) if len(node) > 2 else ('0.', '0.')
+        lines.append(f"\tFireNode[loc=({node[0]},{node[1]},0);;vel=({vx},{vy},0.);;t=0.]")
+    fire_nodes = "\n".join(lines)
+    return f"FireFront[t=0.]\n{fire_nodes}\n"
+
+def create_ff_file(i, folder_name, run_dir, date, propagation_model="Rothermel", perimeter=None):
     #
     print(propagation_model)
     # Define file paths
     run_dir = Path(run_dir)  # Ensure run_dir is a Path object
-    fuel_table_file = '/home/jsoma/europeData/fuels.ff'
     elevation_file = run_dir / 'elevation.tif'
     t_ff_path = run_dir / folder_name / f't{i}.ff'
-    
+
     # Read raster projection and get fire ignition point for the first time step
-    with rio.open(elevation_file) as src:
-        EPSG = src.crs
-        if i == 0:
-            fire_ignition = (*src.xy(src.width // 2, src.height // 2), 0)
+    EPSG, fire_ignition = ignition_point(elevation_file)
 
     # Prepare the content of the file
-    content = textwrap.dedent(f"""\
-        setParameter[dumpMode=geojson]
-        setParameter[caseDirectory=.]
-        setParameter[ForeFireDataDirectory=.]
-        setParameter[projection={EPSG}]
-        setParameter[fuelsTableFile={fuel_table_file}]
-        setParameter[propagationModel={propagation_model}]
-        loadData[landscape.nc;{date}]
-    """)
+    content = ff_parameters(EPSG, '.', propagation_model)
+    content += f"loadData[landscape.nc;{date}]\n"
 
     # Add fire ignition or perimeter for subsequent steps
     if i == 0:
         content += f"startFire[loc={fire_ignition};t=0]\n"
     else:
-        geojson_file = run_dir / f't{i-1}' / f't{i-1}.geojson'
-        with open(geojson_file) as f:
-            perimeter = shape(geojson.load(f)['features'][0]['geometry'])
-        
-        transformer = Transformer.from_crs("epsg:4326", EPSG.to_string(), always_xy=True)
-        fire_nodes = "\n".join(
-            f"\tFireNode[loc=({x},{y},0);;vel=(0.,0.,0.);;t=0.]"
-            for x, y in (transformer.transform(*coord) for coord in perimeter.exterior.coords)
-        )
-        content += f"FireFront[t=0.]\n{fire_nodes}\n"
+        # Front of the previous step, already in the projection of the simulation
+        if perimeter is None:
+            perimeter = Perimeter.from_ffgeojson(run_dir / f't{i-1}' / f't{i-1}.ffgeojson')
+        content += ff_fire_front(perimeter.fronts[0])
 
     # Add propagation steps and output
     content += textwrap.dedent(f"""\
@@ -1,6 +1,6 @@
 import json
 import os
-from pyproj import Transformer
+from transforms import transform_coords, transform_xy
 
 
 def load_json(file_path):
@@ -10,8 +10,7 @@ def load_json(file_path):
 
 def reproject(xy, inEpsg, outEpsg='epsg:4326'):
     x1, y1 = xy
-    transformer = Transformer.from_crs(inEpsg, outEpsg, always_xy=True)
-    x2, y2 = transformer.transform(x1, y1)
+    x2, y2 = transform_xy(x1, y1, inEpsg, outEpsg)
     return [x2, y2]
 
 def ffjson2geojson(filepath):
@@ -20,7 +19,7 @@ def ffjson2geojson(filepath):
     # Reproject coordinates
     inEpsg = ff_geojson['projection'].lower()
     for feature in ff_geojson["features"]:
-        reproj = [reproject(xy, inEpsg) for xy in feature['geometry']['coordinates'][0]]
+        reproj = transform_coords(feature['geometry']['coordinates'][0], inEpsg).tolist()
         reproj.append(reproj[0])  # Ensure the polygon is closed
         feature['geometry']['coordinates'][0] = reproj
     ff_geojson['projection'] = 'epsg:4326'
@@ -33,8 +32,9 @@ def ffjson2geojson(filepath):
     
     return savePath
 
-def process_ffgeojson_files():
-    current_dir = os.getcwd()
+def process_ffgeojson_files(current_dir=None):
+    if current_dir is None:
+        current_dir = os.getcwd()
     ffgeojson_files = [f for f in os.listdir(current_dir) if f.endswith('.ffgeojson')]
     
     for ffgeojson_file in ffgeojson_files:
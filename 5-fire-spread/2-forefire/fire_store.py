@@ -0,0 +1,178 @@
+import os
+import numpy as np
+import netCDF4 as netcdf
+import rasterio as rio
+from affine import Affine
+from burn_state import BURNED_FUEL
+from perimeter import Perimeter
+
+# Name of the container written in the folder of each fire
+FIRE_STORE_NAME = 'fire.nc'
+
+CHUNK_SIZE = 256
+
+
+def _variable(group, name, dtype, dims, data):
+    """Create (or overwrite) a compressed variable of a group, dimensions named 'n_*' are unlimited."""
+    shape = np.shape(data)
+    for dim, size in zip(dims, shape):
+        if dim not in group.dimensions:
+            group.createDimension(dim, None if dim.startswith('n_') else size)
+    if name not in group.variables:
+        chunks = [4096 if dim.startswith('n_') else max(1, min(CHUNK_SIZE, size)) for dim, size in zip(dims, shape)]
+        group.createVariable(name, dtype, dims, zlib=True, complevel=4, chunksizes=chunks)
+    variable = group.variables[name]
+    if dims[0].startswith('n_'):
+        variable[:len(data)] = data  # the counts are kept as attributes of the group
+    else:
+        variable[:] = data
+    return variable
+
+
+def _group(ds, path):
+    """Get (or create) a nested group such as 'steps/t3'."""
+    group = ds
+    for name in path.split('/'):
+        group = group.groups[name] if name in group.groups else group.createGroup(name)
+    return group
+
+
+class FireStore:
+    """
+    Single chunked netCDF4/HDF5 container with the persistent results of one fire.
+
+    It replaces the dozens of small files written in the step folders (which
+    can then live in a RAM-backed scratch directory): the terrain is stored
+    once, and each step only adds the cells burned in its fuel map, its wind
+    arrays, its perimeter and its metadata. The file is opened for each write
+    and closed right after, so an interrupted fire keeps every completed step.
+
+    Layout:
+    - terrain/: elevation and land_cover as extracted for the fire
+    - landscape/: fuel map of the landscape grid before the fire
+    - steps/tX/: wind_u, wind_v, burned_cells (flat indices on the landscape
+      grid), front_x, front_y, front_size and the attributes date, area_ha, ff
+
+    Parameters:
+    - path: str, path of the container (default name: fire.nc in the fire folder)
+    """
+
+    def __init__(self, path):
+        self.path = str(path)
+
+    def _open(self, mode='a'):
+        if mode == 'a' and not os.path.exists(self.path):
+            mode = 'w'
+        ds = netcdf.Dataset(self.path, mode, format='NETCDF4')
+        ds.set_auto_mask(False)
+        return ds
+
+    # Writing -----------------------------------------------------------
+    def write_attributes(self, **attributes):
+        """Metadata of the fire (name, area_max...)."""
+        with self._open() as ds:
+            ds.setncatts(attributes)
+
+    def write_terrain(self, elevation_path, landcover_path):
+        """Store the elevation and land cover rasters extracted for the fire."""
+        with self._open() as ds:
+            group = _group(ds, 'terrain')
+            for name, path in (('elevation', elevation_path), ('land_cover', landcover_path)):
+                with rio.open(path) as src:
+                    variable = _variable(group, name, src.dtypes[0], (f'{name}_y', f'{name}_x'), src.read(1))
+                    variable.setncatts({'crs': src.crs.to_wkt(), 'transform': list(src.transform)[:6]})
+
+    def write_fuel(self, fuel_model_map, transform, crs):
+        """Store the unburned fuel map on the landscape grid, the base of the step deltas."""
+        with self._open() as ds:
+            group = _group(ds, 'landscape')
+            _variable(group, 'fuel', 'i4', ('fuel_y', 'fuel_x'), fuel_model_map)
+            group.setncatts({'crs': str(crs), 'transform': list(transform)[:6]})
+
+    def write_wind(self, i, wind_dict):
+        """Store the u/v wind arrays of a step."""
+        with self._open() as ds:
+            group = _group(ds, f'steps/t{i}')
+            _variable(group, 'wind_u', 'f4', ('wind_y', 'wind_x'), wind_dict['wind_u'])
+            _variable(group, 'wind_v', 'f4', ('wind_y', 'wind_x'), wind_dict['wind_v'])
+
+    def write_burned_cells(self, i, cells):
+        """Store the cells of the fuel map burned by the front of a step."""
+        with self._open() as ds:
+            group = _group(ds, f'steps/t{i}')
+            _variable(group, 'burned_cells', 'i8', ('n_cells',), np.asarray(cells, dtype=np.int64))
+            group.setncattr('n_cells', len(cells))
+
+    def write_step(self, i, perimeter, date, area_ha, ff_file=None):
+        """Store the front (in the projection of the simulation) and the metadata of a step."""
+        fronts = perimeter.fronts
+        nodes = np.concatenate(fronts) if fronts else np.empty((0, 2))
+        with self._open() as ds:
+            group = _group(ds, f'steps/t{i}')
+            _variable(group, 'front_x', 'f8', ('n_nodes',), nodes[:, 0])
+            _variable(group, 'front_y', 'f8', ('n_nodes',), nodes[:, 1])
+            _variable(group, 'front_size', 'i4', ('n_fronts',), [len(ring) for ring in fronts])
+            attributes = {'date': str(date), 'area_ha': area_ha, 'projection': perimeter.crs,
+                          'n_nodes': len(nodes), 'n_fronts': len(fronts)}
+            if ff_file is not None and os.path.exists(ff_file):
+                with open(ff_file) as f:
+                    attributes['ff'] = f.read()
+            group.setncatts(attributes)
+
+    # Reading -----------------------------------------------------------
+    def attributes(self):
+        with self._open('r') as ds:
+            return {key: ds.getncattr(key) for key in ds.ncattrs()}
+
+    def steps(self):
+        """Time steps with a stored front, in order."""
+        with self._open('r') as ds:
+            if 'steps' not in ds.groups:
+                return []
+            steps = [int(name[1:]) for name, group in ds['steps'].groups.items() if 'front_x' in group.variables]
+        return sorted(steps)
+
+    def step_attributes(self, i):
+        """Metadata of a step (date, area_ha, projection, ff...)."""
+        with self._open('r') as ds:
+            group = ds[f'steps/t{i}']
+            return {key: group.getncattr(key) for key in group.ncattrs()}
+
+    def terrain(self, layer='elevation'):
+        """Return a terrain layer ('elevation' or 'land_cover') with its transform and crs."""
+        with self._open('r') as ds:
+            variable = ds['terrain'][layer]
+            return variable[:], Affine(*variable.getncattr('transform')), variable.getncattr('crs')
+
+    def wind(self, i):
+        """Return the (u, v) wind arrays of a step."""
+        with self._open('r') as ds:
+            group = ds[f'steps/t{i}']
+            return group['wind_u'][:], group['wind_v'][:]
+
+    def perimeter(self, i):
+        """Return the front of a step as a Perimeter (UTM coordinates)."""
+        with self._open('r') as ds:
+            group = ds[f'steps/t{i}']
+            n_nodes, n_fronts = int(group.getncattr('n_nodes')), int(group.getncattr('n_fronts'))
+            x = group['front_x'][:n_nodes]
+            y = group['front_y'][:n_nodes]
+            sizes = group['front_size'][:n_fronts]
+            crs = group.getncattr('projection')
+        fronts = np.split(np.column_stack([x, y]), np.cumsum(sizes)[:-1]) if n_fronts else []
+        ff_geojson = {'type': 'FeatureCollection', 'projection': crs,
+                      'features': [{'type': 'Feature', 'properties': {},
+                                    'geometry': {'type': 'Polygon', 'coordinates': [ring.tolist()]}} for ring in fronts]}
+        return Perimeter(fronts, crs, ff_geojson)
+
+    def fuel_map(self, i):
+        """Fuel map used to simulate step i: the unburned map with the cells burned by the steps before."""
+        with self._open('r') as ds:
+            fuel = ds['landscape/fuel'][:].astype(np.int32)
+            steps = ds.groups['steps'].groups if 'steps' in ds.groups else {}
+            for j in range(i):
+                group = steps.get(f't{j}')
+                if group is not None and 'burned_cells' in group.variables:
+                    cells = group['burned_cells'][:int(group.getncattr('n_cells'))]
+                    fuel.reshape(-1)[cells] = BURNED_FUEL
+        return fuel
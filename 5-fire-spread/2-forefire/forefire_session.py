@@ -0,0 +1,175 @@
+import os
+import re
+import selectors
+import shutil
+import subprocess
+import time
+import uuid
+from ff_file_generator_automatic import ff_parameters, ff_fire_front
+
+FOREFIRE_COMMAND = 'forefire'
+
+# Duration of a simulation step (3h between two wind fields)
+STEP_DURATION = '10800s'
+
+# Seconds ForeFire has to run the commands of a step before it is killed
+SYNC_TIMEOUT = 3600
+
+FRONT_PATTERN = re.compile(r'^\s*FireFront\[')
+NODE_PATTERN = re.compile(r'FireNode\[.*?loc=\(([^)]*)\).*?vel=\(([^)]*)\)')
+
+
+def parse_fire_front(lines):
+    """
+    Read the nodes of the first fire front from a print[] dump of ForeFire.
+
+    Returns a list of (x, y, vx, vy) tuples, empty if the dump has no front.
+    """
+    nodes = []
+    in_front = False
+    for line in lines:
+        if FRONT_PATTERN.match(line):
+            if in_front:
+                break  # only the first (outer) front is kept, as in the .ff files
+            in_front = True
+            continue
+        match = NODE_PATTERN.search(line)
+        if in_front and match:
+            x, y = (float(v) for v in match.group(1).split(',')[:2])
+            vx, vy = (float(v) for v in match.group(2).split(',')[:2])
+            nodes.append((x, y, vx, vy))
+    return nodes
+
+
+class ForeFireSession:
+    """
+    One interactive ForeFire process driving every time step of a fire.
+
+    Commands are written to the standard input of ForeFire and its answers
+    read back from the standard output. After the commands of a step, a
+    token is set with setParameter and read back with getParameter: once it
+    is printed, ForeFire has run everything sent before. The front dumped by
+    print[] is kept and used to seed the next step with the velocities of its
+    nodes, instead of starting every step from a front at rest.
+
+    What is saved is the start-up of a ForeFire process per step. The
+    landscape is still reloaded at every step (loadData[landscape.nc]), as
+    its wind fields and burned fuel change from one step to the next and
+    ForeFire has no command to replace a single layer, and the front is
+    sent again with the velocities of its nodes.
+
+    Every step is also written as a regular tX.ff file in its folder, so it
+    can be replayed with 'forefire -i tX.ff'.
+
+    Parameters:
+    - projection: CRS of the fire domain
+    - command: str, ForeFire binary (e.g. stubs/forefire for tests)
+    - propagation_model: str, ForeFire propagation model
+    - timeout: float, seconds ForeFire has to run the commands of a step, it is killed after
+    """
+
+    def __init__(self, projection, command=FOREFIRE_COMMAND, propagation_model="Rothermel", timeout=SYNC_TIMEOUT):
+        self.projection = projection
+        self.propagation_model = propagation_model
+        self.timeout = timeout
+        self.front = []
+        self.pending = b''  # output read but not split in lines yet
+
+        # ForeFire only flushes its output at the end of a line when asked to
+        args = [command]
+        if shutil.which('stdbuf'):
+            args = ['stdbuf', '-oL'] + args
+        self.process = subprocess.Popen(args, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                        text=True, bufsize=1)
+
+    def send(self, commands):
+        """Write ForeFire commands (one per line) to the process."""
+        self.process.stdin.write(commands if commands.endswith('\n') else commands + '\n')
+        self.process.stdin.flush()
+
+    def sync(self):
+        """
+        Wait until ForeFire has run every command sent, return the lines it printed.
+
+        The output is polled until the deadline of the timeout: ForeFire is
+        killed if it does not answer in time, and an error is raised as soon
+        as it exits.
+        """
+        token = uuid.uuid4().hex
+        self.send(f"setParameter[syncToken={token}]\ngetParameter[syncToken]")
+        deadline = time.monotonic() + self.timeout
+        stdout = self.process.stdout.fileno()
+        lines = []
+        with selectors.DefaultSelector() as selector:
+            selector.register(stdout, selectors.EVENT_READ)
+            while True:
+                # read from the pipe directly, the lines buffered by the text stream would not be polled
+                while b'\n' in self.pending:
+                    line, self.pending = self.pending.split(b'\n', 1)
+                    line = line.decode(errors='replace') + '\n'
+                    if token in line:
+                        return lines
+                    lines.append(line)
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.process.kill()
+                    self.process.wait()
+                    raise TimeoutError(f"ForeFire did not answer within {self.timeout} s and was killed")
+                if not selector.select(min(remaining, 1.0)):
+                    if self.process.poll() is not None:
+                        raise RuntimeError(f"ForeFire stopped with exit code {self.process.returncode}")
+                    continue
+                chunk = os.read(stdout, 65536)
+                if not chunk:
+                    raise RuntimeError(f"ForeFire stopped with exit code {self.process.wait()}")
+                self.pending += chunk
+
+    def run_step(self, i, step_dir, date, ignition=None, perimeter=None):
+        """
+        Load the landscape of a step, propagate the fire and write tX.ffgeojson.
+
+        Parameters:
+        - i: int, time step
+        - step_dir: str, folder of the step containing landscape.nc
+        - date: str, date of the step (ForeFire format)
+        - ignition: tuple, ignition point of the first step
+        - perimeter: Perimeter, front of the previous step, only used when the
+          session did not run it (resumed fire)
+
+        Returns the path of the .ffgeojson written by ForeFire.
+        """
+        step_dir = os.path.abspath(step_dir)
+        content = ff_parameters(self.projection, step_dir, self.propagation_model)
+        content += f"loadData[landscape.nc;{date}]\n"
+        if self.front:
+            content += ff_fire_front(self.front)
+        elif perimeter is not None:
+            content += ff_fire_front(perimeter.fronts[0])
+        else:
+            content += f"startFire[loc={ignition};t=0]\n"
+        content += f"step[dt={STEP_DURATION}]\nprint[t{i}.ffgeojson]\nprint[]\n"
+
+        # Keep the commands of the step with the other outputs
+        with open(os.path.join(step_dir, f't{i}.ff'), 'w') as t_file:
+            t_file.write(content)
+
+        self.send(content)
+        self.front = parse_fire_front(self.sync())
+        return os.path.join(step_dir, f't{i}.ffgeojson')
+
+    def close(self):
+        """End the ForeFire process."""
+        if self.process.poll() is None:
+            try:
+                self.process.stdin.close()
+                self.process.wait(timeout=30)
+            except (OSError, subprocess.TimeoutExpired):
+                self.process.kill()
+                self.process.wait()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -1,4 +1,7 @@
-def create_config_file(wind_speed, wind_direction):
+import os
+
+
+def create_config_file(wind_speed, wind_direction, output_dir='.', num_threads=8):
 
     # Get user inputs
     input_speed = wind_speed
@@ -16,7 +19,7 @@ def create_config_file(wind_speed, wind_direction):
 #    except for the ASCII output files which are set to 200 meters.
 #          
 
-num_threads                = 8
+num_threads                = {num_threads}
 momentum_flag              = false
 number_of_iterations       = 100
 elevation_file             = ./elevation.tif
@@ -41,8 +44,10 @@ write_farsite_atm          = false
 """
 
     # Write to the cfg file
-    with open("wind_domain_avg.cfg", "w") as file:
+    cfg_path = os.path.join(output_dir, "wind_domain_avg.cfg")
+    with open(cfg_path, "w") as file:
         file.write(file_content)
 
-    print("Configuration file 'wind_domain_avg.cfg' has been created successfully.")
+    print(f"Configuration file '{cfg_path}' has been created successfully.")
+    return cfg_path
 
@@ -1,63 +1,129 @@
-from datetime import datetime, timedelta
-import geojson
-import geopandas as gpd
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import hashlib
 import numpy as np
 import os
 from pathlib import Path
 import pandas as pd
-from pyproj import Transformer, CRS
-import rasterio as rio
-from rasterio.mask import mask
 import scipy.stats as stats
-from shapely.geometry import Polygon
-from shapely.geometry import shape
 import shutil
 import subprocess
 import time
 
 # IMPORT FUNCTIONS --------------------------------------------------------
-from ff_file_generator_automatic import create_ff_file
-from ffgeojsonTogeojson import process_ffgeojson_files
+from ff_file_generator_automatic import create_ff_file, ignition_point
+from perimeter import Perimeter
+from forefire_session import FOREFIRE_COMMAND, ForeFireSession
+from artifacts import RETENTION_POLICIES, FireArtifacts
 
 # Import the relevant functions from extend.py
-from extend import get_utm_crs, process_raster_files
+from extend import get_utm_crs, process_raster_files, process_raster_store
 
 # Import the creation of the cfg file for windNinja
 from genWindNinjaFile_automatic import create_config_file
-# -------------------------------------------------------------------------
 
-# .........................
-start_time = time.time()# .
-# .........................
+# Build the landscape.nc files without starting a new interpreter
+from createLandscape import LandscapeBuilder, default_wind_generator
+
+# Fuel map of the fire updated with the burned area of each step
+from burn_state import BurnState
+
+# Record of the progress of every fire, used to resume interrupted runs
+from manifest import RunManifest
+
+# Cache of the WindNinja solutions shared between fires
+from windninja_cache import WindNinjaCache, raster_digest, windninja_outputs
 
-# Load the historical size distribution -----------------------------
-region = 'North'
-print(f' > PROCESSING REGION: {region}')
-parameters_distirbution = pd.read_csv('/home/jsoma/wildfire-repo/Fire-spread/historical-fires/lognormal_params_EFFIS_fires_{region}.csv')
-sigma, loc, scale = parameters_distirbution.iloc[0] # extract the values
-historical_distri_ha = stats.lognorm(s=sigma, loc=loc, scale=scale) # Fit the log-nromal distribution
+# Single container with the results of a fire (with --scratch-dir)
+from fire_store import FIRE_STORE_NAME, FireStore
+
+# Time, CPU and I/O of every stage of every step
+from tracing import Tracer
+
+# Final perimeters of several area_max draws from one trajectory (--draws, --quantiles)
+from area_draws import AREA_DRAWS_NAME, DEFAULT_QUANTILES, sample_area_draws, write_area_draws
+# -------------------------------------------------------------------------
+
+# Historical size distribution --------------------------------------
+REGION = 'North'
+DISTRIBUTION_PATH = '/home/jsoma/wildfire-repo/Fire-spread/historical-fires/lognormal_params_EFFIS_fires_{region}.csv'
 
- 
 # Directories -------------------------------------------------------
 DEM_path = '/home/jsoma/europeData/EU-DEM.tif'
 CLC_path = '/home/jsoma/europeData/EU-CLC_v2018.tif'
- 
-# Directory where all the different folders that we want to run are located
-parent_dir = Path.cwd()
 
-print(f' The parent directory is {parent_dir}...')
+# Size of the squares (km) cut around the ignition
+size_km1 = 90
+size_km2 = 30
+
+# Threads used by a single WindNinja run when fires are processed one at a time
+WINDNINJA_THREADS = 8
+
+
+def load_size_distribution(region):
+    """Fit the log-normal distribution of the historical fire sizes (ha) of a region."""
+    parameters_distirbution = pd.read_csv(DISTRIBUTION_PATH.format(region=region))
+    sigma, loc, scale = parameters_distirbution.iloc[0] # extract the values
+    return stats.lognorm(s=sigma, loc=loc, scale=scale)
+
+
+def load_perimeter(manifest, fire, i):
+    """Front of a completed step, from its .ffgeojson or from the container of the fire."""
+    outputs = manifest.get(fire, i)['outputs']
+    if 'store' in outputs:
+        return FireStore(outputs['store']).perimeter(i)
+    return Perimeter.from_ffgeojson(outputs['ffgeojson'])
 
-# Iterate through each subdirectory in the parent directory
-for subdir in sorted(parent_dir.iterdir()):
 
+def run_fire(subdir, area_max, manifest, windninja_threads=WINDNINJA_THREADS, terrain_store=None, wind_cache=None,
+             forefire_command=FOREFIRE_COMMAND, forefire_session=False, retention='perimeters', scratch_dir=None,
+             tracer=None, area_draws=None):
+    """
+    Run the iterative WindNinja/ForeFire simulation of one ignition folder.
+
+    Every path is absolute and the external programs are started with the
+    folder of the time step as working directory, so the process-wide cwd
+    is never changed and several fires can run at the same time.
+
+    Each completed step is recorded in the run manifest: a fire interrupted
+    by a previous run continues from its last completed step, and the
+    output of a step that was cut halfway is removed and computed again.
+
+    Parameters:
+    - subdir: Path, folder of the fire containing the '*_data.csv' wind file
+    - area_max: float, maximum extension of the fire (ha)
+    - manifest: RunManifest, progress record of the scenario
+    - windninja_threads: int, threads given to each WindNinja run
+    - terrain_store: str, per-UTM-zone store of build_terrain_store.py (default: cut the European rasters)
+    - wind_cache: WindNinjaCache, cache of the WindNinja solutions (default: always run WindNinja)
+    - forefire_command: str, ForeFire binary
+    - forefire_session: bool, drive one interactive ForeFire process for all the steps
+      of the fire (ForeFireSession) instead of running 'forefire -i tX.ff' per step
+    - retention: str, files kept once the fire is finished ('finals', 'perimeters' or 'all', see artifacts.py)
+    - scratch_dir: str, RAM-backed directory (e.g. /dev/shm) for the files of the steps; the results
+      are then stored in a single container per fire (fire_store.py) instead of the step folders
+    - tracer: Tracer, trace of the time and I/O of each stage (default: no trace)
+    - area_draws: list of dicts, maximum areas evaluated on the trajectory (see area_draws.py); the
+      fire is then run until area_max (usually np.inf) and the final perimeter of every draw is
+      written in area_draws.geojson
+    """
     print(f"Processing folder: {subdir}")
     run_dir = str(subdir)
+    fire = subdir.name
+    if tracer is None:
+        tracer = Tracer()
+
+    # Folder of the terrain and of the time steps
+    store = None
+    work_dir = run_dir
+    if scratch_dir is not None:
+        work_dir = os.path.join(scratch_dir, f"{fire}-{hashlib.sha1(run_dir.encode()).hexdigest()[:8]}")
+        os.makedirs(work_dir, exist_ok=True)
+        store = FireStore(os.path.join(run_dir, FIRE_STORE_NAME))
 
-    # Change to the folder
-    os.chdir(subdir)
     # Find the file that ends with '_data.csv'
-    wind_data_file = next((file for file in os.listdir('.') if file.endswith('_data.csv')), None)
-    wind_data = pd.read_csv(wind_data_file)
+    wind_data_file = next((file for file in os.listdir(run_dir) if file.endswith('_data.csv')), None)
+    wind_data = pd.read_csv(os.path.join(run_dir, wind_data_file))
     num_steps = np.shape(wind_data)[0]
 
     # Parameters -------------------------------------------------------
@@ -65,134 +131,306 @@ for subdir in sorted(parent_dir.iterdir()):
     common_data = wind_data.iloc[[0]]
     lat = common_data['lat'].iloc[0]
     lon = common_data['lon'].iloc[0]
-    size_km1 = 90  # Size of the square in kilometers
-    size_km2 = 30
-
-    # Get the UTM CRS
-    dstCrs_UCTM = get_utm_crs(lon, lat)
-    output_dir = os.getcwd()
-    elevation_path, landcover_path = process_raster_files(lon, lat, size_km1, size_km2, DEM_path, CLC_path, output_dir, dstCrs_UCTM)
-    
-    # set randomly the maximun area of the fire
-    area_max = historical_distri_ha.rvs()
+
+    # 1) Terrain of the fire (skipped if already extracted) -----------
+    outputs = manifest.get(fire).get('outputs', {})
+    if manifest.completed(fire, 'extracted') and all(os.path.exists(p) for p in outputs.values()):
+        elevation_path, landcover_path = outputs['elevation'], outputs['land_cover']
+    else:
+        with tracer.stage(fire, None, 'extract'):
+            # Get the UTM CRS
+            dstCrs_UCTM = get_utm_crs(lon, lat)
+            if terrain_store is not None:
+                elevation_path, landcover_path = process_raster_store(lon, lat, size_km2, terrain_store, work_dir, dstCrs_UCTM)
+            else:
+                elevation_path, landcover_path = process_raster_files(lon, lat, size_km1, size_km2, DEM_path, CLC_path, work_dir, dstCrs_UCTM)
+            if store is not None:
+                store.write_attributes(fire=fire, area_max=area_max)
+                store.write_terrain(elevation_path, landcover_path)
+            draws_info = {'area_draws': area_draws} if area_draws else {}
+            manifest.record(fire, 'extracted', area_max=area_max, **draws_info,
+                            outputs={'elevation': elevation_path, 'land_cover': landcover_path})
+
     print(f'The maximum extension of this fire is: {area_max} ha')
-    
+
+    artifacts = FireArtifacts(retention)
+    artifacts.add(elevation_path, 'terrain')
+    artifacts.add(landcover_path, 'terrain')
+
     # loop over the rows of wind_data to run the simulation
-    # for i in range(num_steps):
-    for i, row in wind_data.iterrows():
-        
-        folderName = f't{i}'
-
-        if not os.path.exists(folderName):
-            os.mkdir(folderName)
-            shutil.copy('elevation.tif', folderName)  # Copy elevation file for all folders
-
-            if i == 0:
-                shutil.copy('land_cover.tif', folderName)  # Copy land_cover.tif only for t0
-            else: 
-                # Modify land cover based on previous step's GeoJSON output
-                print(f"Attempting to read file: {geojson_file}")
-                land_cover = os.path.join(subdir, 'land_cover.tif')
-                out_forefire_geojson = gpd.read_file(geojson_file)
-
-                with rio.open(land_cover) as src:
-                    land_cover_array = src.read(1)
-                    land_cover_array_copy = land_cover_array.copy()
-                    land_cover_crs = src.crs
-
-                    if out_forefire_geojson.crs != land_cover_crs:
-                        out_forefire_geojson = out_forefire_geojson.to_crs(land_cover_crs)
-
-                    geometries = [geom for geom in out_forefire_geojson.geometry]
-                    out_image, out_transform = mask(src, geometries, crop=False, nodata=-1, filled=True)
-
-                    land_cover_array_copy[out_image[0] != -1] = 324  # Set burned areas to specific value
-                    land_cover_array_copy = land_cover_array_copy.astype(np.int16)
-
-                    out_meta = src.meta.copy()
-
-                    # Save modified land cover for the next iteration
-                    output_path = os.path.join(folderName, 'land_cover.tif')
-                    with rio.open(output_path, 'w', **out_meta) as dest:
-                        dest.write(land_cover_array_copy, 1)
-    
-        
-        os.chdir(folderName)
-        print('-------------------')
-        print(folderName)
-        print('-------------------')
-        # Store teh variables for this time-step
-        wind_speed =  round(wind_data['wind_speed'][i], 1)
-        wind_direction = round(wind_data['wind_direction'][i])
-        date =  wind_data['date'][i]
-
-        # 3) WindNinja Simulation  --------------------
-        # Gen cfg file
-        create_config_file(wind_speed, wind_direction)
-        # run WindNinja
-        subprocess.run(['WindNinja_cli', 'wind_domain_avg.cfg'])
-
-        # 4) Create landscape.nc file once WindNinja is done --------
-        subprocess.run(['python3', '/home/jsoma/wildfire-repo/Fire-spread/all-together/createLandscape.py'], check=True)
-
-                                   
-        # 5) Create a tX.ff file -------------------------------------
-        
-        create_ff_file(i, folderName, run_dir, date)
-        
-        # 6) Run ForeFire -------------------------------------------
-        subprocess.run(['forefire', '-i', f't{i}.ff'], check=True)
-
-        # 7) Proccess the output of ForeFire -----------------------
-        process_ffgeojson_files()
-        geojson_file = os.path.join(run_dir, f't{i}', f't{i}.geojson')
-
-        # 8) Prepare for the next iteration ---------------------------
-        # Break if the geojson file is bigger than 2500 ha
-        geojson_file_step = gpd.read_file(geojson_file)
-        geojson_file_step = geojson_file_step.to_crs("EPSG:3857")  # Reproject to a projected CRS (e.g., Web Mercator)
-        geojson_file_step['area_ha'] = geojson_file_step.geometry.area/10_000 #calculate the ha of the fire
-        print(geojson_file_step['area_ha'])
-        if (geojson_file_step['area_ha'] > area_max).any(): #------------------------------------------
-            print(f"Stopping simulation at t{i} because an area exceeds {area_max} ha.")
-            final_name = os.path.join(run_dir, f't{i}', f'final_t{i}.geojson')
-            os.rename(geojson_file, final_name)
-            for root, dirs, files in os.walk(parent_dir):
-                for file in files:
-                    if not (file.endswith('.ff') or file.endswith('.geojson') or file.endswith('.csv')):
-                        file_path = os.path.join(root, file)
-                        try:
-                            os.remove(file_path)
-                        except Exception as e:
-                            print(f"Error removing {file_path}: {e}")
-            # stop the code
-            break
-
-        # break if time is complete  ------------------------------------------
-        os.chdir(subdir)
-        if i == num_steps - 1:
-            final_name = os.path.join(run_dir, f't{i}', f'final_t{i}.geojson')
-            os.rename(geojson_file, final_name)
-            
-            for root, dirs, files in os.walk(parent_dir):
-                for file in files:
-                    if not (file.endswith('.ff') or file.endswith('.geojson') or file.endswith('.nc') or file.endswith('.csv')):
-                        file_path = os.path.join(root, file)
-                        try:
-                            os.remove(file_path)
-                        except Exception as e:
-                            print(f"Error removing {file_path}: {e}")
-            # stop the code
-            break
-    
-
-
-    # Change back to the parent directory
-    os.chdir(parent_dir)
-
-# Record the end time
-end_time = time.time()
-
-# Calculate and print the elapsed time
-elapsed_time = end_time - start_time
-print(f"Total elapsed time: {elapsed_time / 60:.2f} minutes")
\ No newline at end of file
+    perimeter = None
+    landscape_builder = None
+    burn_state = None
+    elevation_digest = None
+    session = None
+    try:
+        for i, row in wind_data.iterrows():
+            i = int(i)
+
+            folderName = f't{i}'
+            step_dir = os.path.join(work_dir, folderName)
+            artifacts.add_step(step_dir, i)
+
+            # The files of a step that was not finished are gone (e.g. scratch cleared by a reboot)
+            restart = (manifest.state(fire, i) is not None and not manifest.completed(fire, 'spread_done', i)
+                       and not os.path.isdir(step_dir))
+
+            if manifest.state(fire, i) is None or restart:
+                # Start the step from scratch, removing what an interrupted run left behind
+                if os.path.exists(step_dir):
+                    shutil.rmtree(step_dir)
+                os.mkdir(step_dir)
+                shutil.copy(elevation_path, step_dir)  # Copy elevation file for all folders
+
+            print('-------------------')
+            print(f'{fire}: {folderName}')
+            print('-------------------')
+            # Store teh variables for this time-step
+            wind_speed =  round(wind_data['wind_speed'][i], 1)
+            wind_direction = round(wind_data['wind_direction'][i])
+            date =  wind_data['date'][i]
+
+            # 3) WindNinja Simulation  --------------------
+            if restart or not manifest.completed(fire, 'wind_done', i):
+                with tracer.stage(fire, i, 'wind') as trace:
+                    # Gen cfg file
+                    cfg_file = create_config_file(wind_speed, wind_direction, step_dir, num_threads=windninja_threads)
+
+                    # Reuse the solution of an identical run if it is cached
+                    wind_files = None
+                    if wind_cache is not None:
+                        if elevation_digest is None:
+                            elevation_digest = raster_digest(elevation_path)
+                        wind_key = wind_cache.key(elevation_digest, cfg_file)
+                        wind_files = wind_cache.restore(wind_key, step_dir)
+                    trace['cache_hit'] = bool(wind_files)
+
+                    if not wind_files:
+                        # run WindNinja
+                        result = subprocess.run(['WindNinja_cli', cfg_file], cwd=step_dir)
+                        trace['exit_code'] = result.returncode
+                        wind_files = windninja_outputs(step_dir)
+                        if not wind_files:
+                            raise RuntimeError(f"WindNinja did not produce any wind field in {step_dir}")
+                        if wind_cache is not None:
+                            wind_cache.store(wind_key, wind_files)
+                    manifest.record(fire, 'wind_done', step=i, outputs={'wind': wind_files})
+
+            # 4) Create landscape.nc file once WindNinja is done --------
+            if restart or not manifest.completed(fire, 'landscape_built', i):
+                with tracer.stage(fire, i, 'landscape'):
+                    # The elevation, domain and fuel grid are only computed once per fire
+                    if landscape_builder is None:
+                        landscape_builder = LandscapeBuilder(elevation_path, landcover_path)
+                    if burn_state is None:
+                        # Burn the perimeters of the steps done before (by a previous run)
+                        burn_state = BurnState(landscape_builder.fuel_model_map, landscape_builder.fuel_transform)
+                        for j in range(i):
+                            burn_state.update(load_perimeter(manifest, fire, j).polygon())
+                            if store is not None:
+                                store.write_burned_cells(j, burn_state.burned_cells)
+                        if store is not None:
+                            store.write_fuel(landscape_builder.fuel_model_map, landscape_builder.fuel_transform, landscape_builder.crs)
+                    wind_dict = default_wind_generator(step_dir)
+                    landscape_file = landscape_builder.write(os.path.join(step_dir, 'landscape.nc'), burn_state.fuel_model_map, wind_dict,
+                                                             previous=os.path.join(work_dir, f't{i-1}', 'landscape.nc') if i > 0 else None,
+                                                             fuel_changed=burn_state.changed)
+                    burn_state.changed = False
+                    if store is not None:
+                        store.write_wind(i, wind_dict)
+                    manifest.record(fire, 'landscape_built', step=i, outputs={'landscape': landscape_file})
+
+            ffgeojson_file = os.path.join(step_dir, f't{i}.ffgeojson')
+            if not manifest.completed(fire, 'spread_done', i):
+                with tracer.stage(fire, i, 'spread') as trace:
+                    if forefire_session:
+                        # 5-6) Run the step in the ForeFire process of the fire ----
+                        if session is None:
+                            projection, ignition = ignition_point(elevation_path)
+                            session = ForeFireSession(projection, forefire_command)
+                        session.run_step(i, step_dir, date, ignition=ignition if i == 0 else None, perimeter=perimeter)
+                    else:
+                        # 5) Create a tX.ff file -------------------------------------
+                        # (seeded with the front of the previous step kept in memory)
+                        create_ff_file(i, folderName, work_dir, date, perimeter=perimeter)
+
+                        # 6) Run ForeFire -------------------------------------------
+                        result = subprocess.run([forefire_command, '-i', f't{i}.ff'], cwd=step_dir)
+                        trace['exit_code'] = result.returncode
+                        result.check_returncode()
+
+                with tracer.stage(fire, i, 'perimeter') as trace:
+                    # 7) Read the front written by ForeFire, in the UTM projection of the simulation
+                    perimeter = Perimeter.from_ffgeojson(ffgeojson_file)
+
+                    # Calculate the burned area of the step
+                    area_ha = perimeter.area_ha()
+                    trace.update(nodes=sum(len(ring) for ring in perimeter.fronts), area_ha=area_ha)
+                    print(f'{fire}: {folderName} burned area {area_ha:.1f} ha')
+                    ff_file = os.path.join(step_dir, f't{i}.ff')
+                    if store is not None:
+                        store.write_step(i, perimeter, date, area_ha, ff_file)
+                        step_outputs = {'store': store.path}
+                    else:
+                        step_outputs = {'ff': ff_file, 'ffgeojson': ffgeojson_file}
+                    manifest.record(fire, 'spread_done', step=i, area_ha=area_ha, outputs=step_outputs)
+            else:
+                perimeter = load_perimeter(manifest, fire, i)
+
+            # 8) Prepare for the next iteration ---------------------------
+            # Stop if the fire is bigger than the maximum area or if time is complete
+            area_ha = manifest.get(fire, i)['area_ha']
+            if area_ha > area_max or i == num_steps - 1:
+                if area_ha > area_max:
+                    print(f"Stopping simulation at t{i} because an area exceeds {area_max} ha.")
+
+                with tracer.stage(fire, i, 'final'):
+                    # Only the final perimeter is written in EPSG:4326 (always in the folder of the fire)
+                    final_dir = os.path.join(run_dir, folderName)
+                    os.makedirs(final_dir, exist_ok=True)
+                    final_name = perimeter.to_geojson(os.path.join(final_dir, f'final_t{i}.geojson'))
+                    artifacts.add(final_name, 'final')
+                    final_outputs = {'final': final_name}
+                    if area_draws:
+                        # Truncate the trajectory at the first step above each area_max
+                        areas = [manifest.get(fire, j)['area_ha'] for j in range(i + 1)]
+                        perimeters = {j: load_perimeter(manifest, fire, j) for j in range(i)}
+                        perimeters[i] = perimeter
+                        draws_name = write_area_draws(os.path.join(run_dir, AREA_DRAWS_NAME), area_draws, perimeters,
+                                                      list(wind_data['date'][:i + 1]), areas)
+                        artifacts.add(draws_name, 'final')
+                        final_outputs['draws'] = draws_name
+                    if store is None:
+                        artifacts.cleanup()
+                    else:
+                        shutil.rmtree(work_dir, ignore_errors=True)  # everything else is in the container
+                    manifest.record(fire, 'final', outputs=final_outputs)
+                # stop the code
+                break
+
+            # Burn the area of this step in the fuel map of the next one
+            if burn_state is not None:
+                with tracer.stage(fire, i, 'burn') as trace:
+                    trace['burned_cells'] = burn_state.update(perimeter.polygon())
+                    if store is not None:
+                        store.write_burned_cells(i, burn_state.burned_cells)
+
+    finally:
+        if session is not None:
+            session.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the ForeFire simulations of every ignition folder.')
+    parser.add_argument('--parent-dir', type=Path, default=Path.cwd(),
+                        help='Directory containing one folder per ignition (default: current directory)')
+    parser.add_argument('--region', default=REGION, help='Region of the historical size distribution')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Number of fires simulated at the same time (default: 1)')
+    parser.add_argument('--manifest', type=Path, default=None,
+                        help='Run manifest used to resume interrupted runs (default: <parent-dir>/run_manifest.jsonl)')
+    parser.add_argument('--terrain-store', default=None,
+                        help='Per-UTM-zone DEM/CLC store built by build_terrain_store.py')
+    parser.add_argument('--windninja-cache', default=None,
+                        help='Directory of the WindNinja result cache, shared between runs (default: no cache)')
+    parser.add_argument('--forefire', default=FOREFIRE_COMMAND,
+                        help='ForeFire binary (e.g. stubs/forefire to test the pipeline without ForeFire)')
+    parser.add_argument('--forefire-session', action='store_true',
+                        help='Run all the steps of a fire in one interactive ForeFire process')
+    parser.add_argument('--keep', choices=list(RETENTION_POLICIES), default='perimeters',
+                        help='Files kept for each finished fire: final perimeter only, perimeters and .ff '
+                             'of every step (default), or everything')
+    parser.add_argument('--scratch-dir', default=None,
+                        help='RAM-backed directory (e.g. /dev/shm) for the files of the time steps, '
+                             'the results of each fire are then stored in a single fire.nc')
+    parser.add_argument('--trace', type=Path, default=None,
+                        help='JSON-lines trace of every stage of every step, e.g. <parent-dir>/run_trace.jsonl '
+                             '(default: no trace), see trace_summary.py')
+    parser.add_argument('--windninja-cache-gb', type=float, default=20,
+                        help='Maximum size of the WindNinja cache in GB (default: 20)')
+    draws = parser.add_mutually_exclusive_group()
+    draws.add_argument('--draws', type=int, default=0,
+                       help='Run each fire until the end of the wind data and write the final perimeter of '
+                            'this number of area_max draws in area_draws.geojson (default: a single draw)')
+    draws.add_argument('--quantiles', type=float, nargs='*', default=None,
+                       help='Same as --draws with these quantiles of the size distribution '
+                            '(default without values: 0.05 to 0.95 by 0.05)')
+    args = parser.parse_args()
+
+    # .........................
+    start_time = time.time()# .
+    # .........................
+
+    print(f' > PROCESSING REGION: {args.region}')
+    historical_distri_ha = load_size_distribution(args.region)
+
+    # Directory where all the different folders that we want to run are located
+    parent_dir = args.parent_dir.resolve()
+    print(f' The parent directory is {parent_dir}...')
+
+    manifest = RunManifest(args.manifest or parent_dir / 'run_manifest.jsonl')
+
+    # Draw the maximum area of every fire up front, so that the draws do not
+    # depend on the number of workers (forked workers share the random state).
+    # Fires started by a previous run keep the area drawn at that time.
+    # With --draws/--quantiles the trajectory is run to the end of the wind
+    # data and the area_max draws are only applied at the end.
+    quantiles = (args.quantiles or DEFAULT_QUANTILES) if args.quantiles is not None else None
+    ensemble = args.draws > 0 or quantiles is not None
+    fires = []
+    for subdir in sorted(parent_dir.iterdir()):
+        if not subdir.is_dir():
+            continue
+        if ensemble:
+            area_max, area_draws = np.inf, sample_area_draws(historical_distri_ha, args.draws, quantiles)
+        else:
+            area_max, area_draws = historical_distri_ha.rvs(), None
+        if manifest.completed(subdir.name, 'final'):
+            print(f"Skipping finished folder: {subdir}")
+            continue
+        recorded = manifest.get(subdir.name)
+        if ensemble:
+            fires.append((subdir, area_max, recorded.get('area_draws', area_draws)))
+        else:
+            fires.append((subdir, recorded.get('area_max', area_max), None))
+
+    options = {'terrain_store': args.terrain_store,
+               'forefire_command': os.path.abspath(args.forefire) if os.sep in args.forefire else args.forefire,
+               'forefire_session': args.forefire_session,
+               'retention': args.keep,
+               'scratch_dir': args.scratch_dir,
+               'tracer': Tracer(args.trace)}
+    if args.windninja_cache is not None:
+        options['wind_cache'] = WindNinjaCache(args.windninja_cache, int(args.windninja_cache_gb * 1024**3))
+
+    if args.workers <= 1:
+        for subdir, area_max, area_draws in fires:
+            run_fire(subdir, area_max, manifest, area_draws=area_draws, **options)
+    else:
+        # Share the cores between the WindNinja runs of the different workers
+        options['windninja_threads'] = max(1, min(WINDNINJA_THREADS, (os.cpu_count() or 1) // args.workers))
+        failed = []
+        with ProcessPoolExecutor(max_workers=args.workers) as executor:
+            futures = {executor.submit(run_fire, subdir, area_max, manifest, area_draws=area_draws, **options): subdir
+                       for subdir, area_max, area_draws in fires}
+            for future in as_completed(futures):
+                subdir = futures[future]
+                try:
+                    future.result()
+                    print(f"Finished folder: {subdir}")
+                except Exception as e:
+                    print(f"Error processing {subdir}: {e}")
+                    failed.append(subdir)
+        if failed:
+            print(f"{len(failed)} fire(s) failed: {', '.join(str(f.name) for f in failed)}")
+
+    # Record the end time
+    end_time = time.time()
+
+    # Calculate and print the elapsed time
+    elapsed_time = end_time - start_time
+    print(f"Total elapsed time: {elapsed_time / 60:.2f} minutes")
+
+
+if __name__ == "__main__":
+    main()
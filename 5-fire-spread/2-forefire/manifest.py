@@ -0,0 +1,82 @@
+import fcntl
+import json
+import os
+from datetime import datetime
+
+# States reached by a fire (step=None) and by each of its time steps, in order
+FIRE_STATES = ('extracted', 'final')
+STEP_STATES = ('wind_done', 'landscape_built', 'spread_done')
+
+
+def append_record(path, record, sync=True):
+    """Append a JSON record as one line, under an exclusive lock so several processes can share the file."""
+    line = json.dumps(record) + '\n'
+    with open(path, 'a+') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            # Do not glue the record to a line cut by a killed process
+            f.seek(0, os.SEEK_END)
+            if f.tell() > 0:
+                f.seek(f.tell() - 1)
+                if f.read(1) != '\n':
+                    line = '\n' + line
+            f.write(line)
+            f.flush()
+            if sync:
+                os.fsync(f.fileno())
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class RunManifest:
+    """
+    Persistent JSON-lines record of the progress of every fire of a scenario.
+
+    Each line stores the fire folder name, the time step (None for the fire
+    itself), the state reached and any extra information such as the sampled
+    area_max or the output paths. Lines are only appended, under an exclusive
+    lock, so several workers can share the same manifest, and a line cut by a
+    killed process is ignored when the manifest is read back.
+    """
+
+    def __init__(self, path):
+        self.path = str(path)
+        self.records = {}
+        self.load()
+
+    def load(self):
+        """Replay the manifest file, the last record of each fire/step wins."""
+        self.records = {}
+        if not os.path.exists(self.path):
+            return
+        with open(self.path) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # incomplete line written by a killed process
+                self._update(record)
+
+    def _update(self, record):
+        key = (record['fire'], record['step'])
+        self.records.setdefault(key, {}).update(record)
+
+    def record(self, fire, state, step=None, **info):
+        """Append a new state of a fire (or of one of its steps) to the manifest."""
+        record = {'fire': fire, 'step': step, 'state': state,
+                  'time': datetime.now().isoformat(timespec='seconds'), **info}
+        append_record(self.path, record)
+        self._update(record)
+
+    def get(self, fire, step=None):
+        """Return everything recorded for a fire (or one of its steps)."""
+        return self.records.get((fire, step), {})
+
+    def state(self, fire, step=None):
+        return self.get(fire, step).get('state')
+
+    def completed(self, fire, state, step=None):
+        """Check if a fire (or one of its steps) already reached the given state."""
+        states = FIRE_STATES if step is None else STEP_STATES
+        current = self.state(fire, step)
+        return current is not None and states.index(current) >= states.index(state)
@@ -0,0 +1,67 @@
+import copy
+import json
+import numpy as np
+from transforms import transform_coords
+from shapely.geometry import Polygon
+from shapely.ops import unary_union
+
+
+def ring_area(ring):
+    """Area of a ring of (x, y) coordinates with the shoelace formula, in CRS units squared."""
+    x, y = ring[:, 0], ring[:, 1]
+    return 0.5 * abs(np.dot(x, np.roll(y, -1)) - np.dot(y, np.roll(x, -1)))
+
+
+class Perimeter:
+    """
+    Fire fronts of a ForeFire step, kept in the projection of the simulation.
+
+    The fronts are stored as (N, 2) coordinate arrays in the UTM CRS used by
+    ForeFire, so the area is computed and the next step is seeded without any
+    reprojection. The EPSG:4326 GeoJSON is only written for the final product.
+
+    Parameters:
+    - fronts: list of (N, 2) arrays, open rings of the fire fronts
+    - crs: str, projection of the coordinates (e.g. 'EPSG:32632')
+    - ff_geojson: dict, ForeFire GeoJSON the fronts come from (kept for its properties)
+    """
+
+    def __init__(self, fronts, crs, ff_geojson):
+        self.fronts = fronts
+        self.crs = crs
+        self.ff_geojson = ff_geojson
+
+    @classmethod
+    def from_ffgeojson(cls, filepath):
+        """Read the .ffgeojson written by ForeFire's print[] command."""
+        with open(filepath) as f:
+            ff_geojson = json.load(f)
+
+        fronts = []
+        for feature in ff_geojson['features']:
+            ring = np.asarray(feature['geometry']['coordinates'][0], dtype=float)[:, :2]
+            if len(ring) > 1 and np.array_equal(ring[0], ring[-1]):
+                ring = ring[:-1]  # ForeFire rings are open
+            fronts.append(ring)
+        return cls(fronts, ff_geojson['projection'], ff_geojson)
+
+    def area_ha(self):
+        """Area of the largest front (ha), computed in the projection of the simulation."""
+        return max((ring_area(ring) for ring in self.fronts), default=0.0) / 10_000
+
+    def polygon(self):
+        """Burned area as a single shapely geometry in the projection of the simulation."""
+        return unary_union([Polygon(ring).buffer(0) for ring in self.fronts if len(ring) > 2])
+
+    def to_geojson(self, filepath, crs='epsg:4326'):
+        """Write the fronts as a GeoJSON in another CRS (closed rings), same layout as ffgeojsonTogeojson."""
+        geojson = copy.deepcopy(self.ff_geojson)
+        for feature, ring in zip(geojson['features'], self.fronts):
+            coords = transform_coords(ring, self.crs, crs).tolist()
+            coords.append(coords[0])  # Ensure the polygon is closed
+            feature['geometry']['coordinates'][0] = coords
+        geojson['projection'] = crs
+
+        with open(filepath, 'w', encoding='utf-8') as f:
+            json.dump(geojson, f, ensure_ascii=False, indent=4)
+        return filepath
@@ -0,0 +1,51 @@
+import numpy as np
+import shapely
+from rasterio.features import rasterize
+from rasterio.transform import from_origin
+from burn_state import BURNED_FUEL, BurnState
+
+TRANSFORM = from_origin(500000, 4800000, 45, 45)
+SHAPE = (80, 120)
+
+
+def fuel_map(seed=0):
+    fuel = np.random.default_rng(seed).integers(1, 60, SHAPE)
+    fuel[38:42, 40:60] = BURNED_FUEL  # burned before the fire, e.g. a previous fire
+    return fuel
+
+
+def growing_perimeters():
+    """Perimeters of a fire spreading east, the last one leaving the grid."""
+    centre = shapely.Point(500000 + 45 * 30.3, 4800000 - 45 * 40.6)
+    return [shapely.affinity.scale(centre.buffer(45 * r), 1 + r / 5, 1) for r in (3, 8, 14, 25)]
+
+
+def test_incremental_update():
+    fuel = fuel_map()
+    state = BurnState(fuel, TRANSFORM)
+    total = 0
+    for perimeter in growing_perimeters():
+        before = state.fuel_model_map.copy()
+        new_cells = state.update(perimeter)
+        total += new_cells
+
+        # same fuel map as burning the whole perimeter at once (cell centres inside, as rasterio.mask)
+        mask = rasterize([perimeter], out_shape=SHAPE, transform=TRANSFORM, fill=0, default_value=1,
+                         dtype='uint8').astype(bool)
+        np.testing.assert_array_equal(state.fuel_model_map, np.where(mask, BURNED_FUEL, fuel))
+        changed = np.flatnonzero(state.fuel_model_map != before)
+        assert new_cells == len(changed)
+        np.testing.assert_array_equal(np.sort(state.burned_cells), changed)
+
+    assert total == (state.fuel_model_map == BURNED_FUEL).sum() - (fuel == BURNED_FUEL).sum()
+
+
+def test_no_new_cells():
+    state = BurnState(fuel_map(), TRANSFORM)
+    perimeter = growing_perimeters()[1]
+    assert state.update(perimeter) > 0
+    state.changed = False
+
+    # the same perimeter again, then one outside of the grid
+    assert state.update(perimeter) == 0 and not state.changed and len(state.burned_cells) == 0
+    assert state.update(shapely.box(0, 0, 1000, 1000)) == 0 and not state.changed
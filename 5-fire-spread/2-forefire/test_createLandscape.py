@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+from createLandscape import default_wind_generator, write_wind
+
+
+def write_asc(path, values):
+    """ESRI ASCII grid as written by WindNinja."""
+    rows, cols = values.shape
+    header = f'ncols {cols}\nnrows {rows}\nxllcorner 500000\nyllcorner 4790000\ncellsize 45\nNODATA_value -9999\n'
+    np.savetxt(path, values, fmt='%.2f', header=header.strip(), comments='')
+
+
+def test_wind_grids(tmp_path):
+    rng = np.random.default_rng(0)
+    write_asc(tmp_path / 'dem_270_5_45m_vel.asc', rng.uniform(0, 15, (25, 40)))
+    write_asc(tmp_path / 'dem_270_5_45m_ang.asc', rng.uniform(0, 360, (25, 40)))
+    wind_dict = default_wind_generator(str(tmp_path))
+
+    # as the grids were read with np.loadtxt, for the 8 directions
+    vel = np.loadtxt(tmp_path / 'dem_270_5_45m_vel.asc', skiprows=6)
+    ang = np.loadtxt(tmp_path / 'dem_270_5_45m_ang.asc', skiprows=6)
+    assert wind_dict['wind_shape'] == vel.shape
+    np.testing.assert_allclose(wind_dict['wind_u'], vel * np.cos(np.radians(270 - ang)), atol=1e-4)
+    np.testing.assert_allclose(wind_dict['wind_v'], vel * np.sin(np.radians(270 - ang)), atol=1e-4)
+
+    wind = np.zeros((2, 8) + vel.shape)
+    write_wind(wind, wind_dict)
+    for i in range(8):
+        np.testing.assert_array_equal(wind[0, i], wind_dict['wind_u'][::-1])
+        np.testing.assert_array_equal(wind[1, i], wind_dict['wind_v'][::-1])
+
+
+def test_missing_grids(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        default_wind_generator(str(tmp_path))
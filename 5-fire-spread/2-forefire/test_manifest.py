@@ -0,0 +1,66 @@
+import json
+import multiprocessing
+from manifest import RunManifest, append_record
+
+
+def record_steps(path, fire, steps):
+    manifest = RunManifest(path)
+    for step in range(steps):
+        manifest.record(fire, 'spread_done', step=step, area=step * 1.5)
+
+
+def test_resume_order(tmp_path):
+    path = tmp_path / 'run_manifest.jsonl'
+    manifest = RunManifest(path)
+    manifest.record('fire_1', 'extracted', area_max=250.0)
+    manifest.record('fire_1', 'wind_done', step=0)
+    manifest.record('fire_1', 'landscape_built', step=0)
+
+    # what a restarted run reads back
+    resumed = RunManifest(path)
+    assert resumed.completed('fire_1', 'extracted') and not resumed.completed('fire_1', 'final')
+    assert resumed.completed('fire_1', 'wind_done', step=0)
+    assert resumed.completed('fire_1', 'landscape_built', step=0)
+    assert not resumed.completed('fire_1', 'spread_done', step=0)
+    assert not resumed.completed('fire_1', 'wind_done', step=1)
+    assert not resumed.completed('fire_2', 'extracted')
+
+    # the last record wins, the information of the earlier ones is kept
+    resumed.record('fire_1', 'final', perimeter='final_t0.geojson')
+    fire = RunManifest(path).get('fire_1')
+    assert fire['state'] == 'final' and fire['area_max'] == 250.0 and fire['perimeter'] == 'final_t0.geojson'
+
+
+def test_cut_line(tmp_path):
+    path = tmp_path / 'run_manifest.jsonl'
+    RunManifest(path).record('fire_1', 'extracted')
+    with open(path, 'a') as f:
+        f.write('{"fire": "fire_1", "step": 0, "sta')  # killed while writing
+
+    manifest = RunManifest(path)
+    assert manifest.state('fire_1') == 'extracted' and manifest.state('fire_1', 0) is None
+    manifest.record('fire_1', 'wind_done', step=0)
+    assert RunManifest(path).completed('fire_1', 'wind_done', step=0)
+
+
+def test_shared_between_processes(tmp_path):
+    path = tmp_path / 'run_manifest.jsonl'
+    workers = [multiprocessing.Process(target=record_steps, args=(path, f'fire_{i}', 50)) for i in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    with open(path) as f:
+        records = [json.loads(line) for line in f]
+    assert len(records) == 200
+    manifest = RunManifest(path)
+    assert all(manifest.get(f'fire_{i}', 49)['area'] == 73.5 for i in range(4))
+
+
+def test_append_record(tmp_path):
+    path = tmp_path / 'trace.jsonl'
+    append_record(path, {'stage': 'wind'}, sync=False)
+    append_record(path, {'stage': 'spread'}, sync=False)
+    with open(path) as f:
+        assert [json.loads(line)['stage'] for line in f] == ['wind', 'spread']
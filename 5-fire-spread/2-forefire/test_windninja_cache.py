@@ -0,0 +1,76 @@
+import os
+import numpy as np
+import rasterio as rio
+from rasterio.transform import from_origin
+from windninja_cache import WindNinjaCache, raster_digest, windninja_outputs
+
+ROWS, COLS = 20, 30
+
+
+def write_elevation(path, values):
+    with rio.open(path, 'w', driver='GTiff', height=ROWS, width=COLS, count=1, dtype='float32', crs='EPSG:32632',
+                  transform=from_origin(500000, 4800000, 45, 45)) as dst:
+        dst.write(values.astype(np.float32), 1)
+
+
+def write_cfg(path, speed, threads=4, comment=''):
+    with open(path, 'w') as f:
+        f.write(f'# {comment}\ninitialization_method = domainAverageInitialization\n'
+                f'num_threads = {threads}\ninput_speed = {speed}  # m/s\ninput_direction = 270\n')
+
+
+def write_outputs(directory, name, size=1000):
+    """The grids of a WindNinja run, size bytes each."""
+    os.makedirs(directory, exist_ok=True)
+    for suffix in ['_vel.asc', '_ang.asc', '_vel.prj', '_ang.prj']:
+        with open(os.path.join(directory, name + suffix), 'w') as f:
+            f.write(name[0] * size)
+    return windninja_outputs(directory)
+
+
+def test_key(tmp_path):
+    elevation = np.random.default_rng(0).random((ROWS, COLS)) * 1000
+    write_elevation(tmp_path / 'a.tif', elevation)
+    write_elevation(tmp_path / 'b.tif', elevation)
+    write_elevation(tmp_path / 'c.tif', elevation + 1)
+    assert raster_digest(tmp_path / 'a.tif') == raster_digest(tmp_path / 'b.tif')
+    assert raster_digest(tmp_path / 'a.tif') != raster_digest(tmp_path / 'c.tif')
+
+    cache = WindNinjaCache(tmp_path / 'cache')
+    digest = raster_digest(tmp_path / 'a.tif')
+    write_cfg(tmp_path / '1.cfg', 5)
+    write_cfg(tmp_path / '2.cfg', 5, threads=1, comment='fire 12, step 3')
+    write_cfg(tmp_path / '3.cfg', 6)
+    assert cache.key(digest, tmp_path / '1.cfg') == cache.key(digest, tmp_path / '2.cfg')
+    assert cache.key(digest, tmp_path / '1.cfg') != cache.key(digest, tmp_path / '3.cfg')
+    assert cache.key(digest, tmp_path / '1.cfg') != cache.key(raster_digest(tmp_path / 'c.tif'), tmp_path / '1.cfg')
+
+
+def test_hit_and_miss(tmp_path):
+    cache = WindNinjaCache(tmp_path / 'cache')
+    assert cache.restore('a' * 64, str(tmp_path)) is None
+
+    files = write_outputs(tmp_path / 'run', 'dem_270_5_45m')
+    cache.store('a' * 64, files)
+    os.makedirs(tmp_path / 'step')
+    restored = cache.restore('a' * 64, str(tmp_path / 'step'))
+    assert sorted(os.path.basename(f) for f in restored) == ['dem_270_5_45m_ang.asc', 'dem_270_5_45m_vel.asc']
+    assert sorted(os.listdir(tmp_path / 'step')) == sorted(os.path.basename(f) for f in files)
+    with open(restored[0]) as f:
+        assert f.read() == 'd' * 1000
+
+
+def test_lru_eviction(tmp_path):
+    # room for two entries of 4 files of 1000 bytes
+    cache = WindNinjaCache(tmp_path / 'cache', max_bytes=8000)
+    for age, name in enumerate(['a', 'b']):
+        cache.store(name * 64, write_outputs(tmp_path / name, name))
+        os.utime(tmp_path / 'cache' / (name * 64), (age + 1, age + 1))
+
+    # 'a' is used again, so 'b' is now the least recently used entry
+    os.makedirs(tmp_path / 'step')
+    assert cache.restore('a' * 64, str(tmp_path / 'step'))
+    cache.store('c' * 64, write_outputs(tmp_path / 'c', 'c'))
+
+    assert sorted(os.listdir(tmp_path / 'cache')) == ['a' * 64, 'c' * 64]
+    assert cache.restore('b' * 64, str(tmp_path / 'step')) is None
@@ -0,0 +1,81 @@
+import argparse
+import json
+import pandas as pd
+
+PERCENTILES = [0.5, 0.9, 0.99]
+
+
+def load_trace(path):
+    """Read a trace written by tracing.Tracer, skipping lines cut by a killed process."""
+    records = []
+    with open(path) as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    return pd.DataFrame.from_records(records)
+
+
+def stage_percentiles(trace, column='wall_s'):
+    """Count, percentiles and total of a column for every stage."""
+    summary = trace.groupby('stage')[column].describe(percentiles=PERCENTILES)
+    summary['total'] = trace.groupby('stage')[column].sum()
+    columns = ['count'] + [f'{int(p * 100)}%' for p in PERCENTILES] + ['max', 'total']
+    return summary[columns].sort_values('total', ascending=False)
+
+
+def slowest_fires(trace, top=10):
+    """Fires with the largest total wall time, with their slowest stage."""
+    per_stage = trace.groupby(['fire', 'stage'])['wall_s'].sum().unstack(fill_value=0)
+    fires = pd.DataFrame({
+        'wall_s': per_stage.sum(axis=1),
+        'cpu_s': trace.groupby('fire')['cpu_s'].sum(),
+        'steps': trace.dropna(subset=['step']).groupby('fire')['step'].nunique(),
+        'slowest_stage': per_stage.idxmax(axis=1),
+    })
+    if 'area_ha' in trace:
+        fires['area_ha'] = trace.groupby('fire')['area_ha'].max()
+    return fires.sort_values('wall_s', ascending=False).head(top)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Summarise the stage trace of a ForeFire scenario run.')
+    parser.add_argument('trace', help='Trace file (run_trace.jsonl)')
+    parser.add_argument('--top', type=int, default=10, help='Number of slowest fires shown (default: 10)')
+    args = parser.parse_args()
+
+    trace = load_trace(args.trace)
+    if trace.empty:
+        print(f'No record in {args.trace}')
+        return
+
+    pd.set_option('display.width', 160)
+    print(f"{trace['fire'].nunique()} fires, {len(trace)} stage records\n")
+
+    print('Wall time per stage (s)')
+    print(stage_percentiles(trace, 'wall_s').round(3).to_string())
+    print('\nCPU time per stage (s)')
+    print(stage_percentiles(trace, 'cpu_s').round(3).to_string())
+
+    io = trace.groupby('stage')[['bytes_read', 'bytes_written']].sum() / 1024**2
+    print('\nI/O per stage (MB)')
+    print(io.round(1).to_string())
+
+    print(f'\nSlowest {args.top} fires')
+    print(slowest_fires(trace, args.top).round(2).to_string())
+
+    if 'error' in trace:
+        errors = trace.dropna(subset=['error'])
+        if not errors.empty:
+            print(f'\n{len(errors)} failed stage(s)')
+            print(errors[['fire', 'step', 'stage', 'error']].to_string(index=False))
+    if 'exit_code' in trace:
+        failed = trace[trace['exit_code'].fillna(0) != 0]
+        if not failed.empty:
+            print(f'\n{len(failed)} external run(s) with a non-zero exit code')
+            print(failed[['fire', 'step', 'stage', 'exit_code']].to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
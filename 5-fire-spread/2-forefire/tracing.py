@@ -0,0 +1,76 @@
+import contextlib
+import os
+import resource
+import time
+from datetime import datetime
+from manifest import append_record
+
+
+def io_counters():
+    """
+    Bytes read and written so far by this process and its finished child processes.
+
+    The Python process is measured with /proc/self/io (rchar/wchar, every
+    read/write call) and the external programs (WindNinja, ForeFire) with the
+    block I/O of their resource usage. Returns (None, None) when unavailable.
+    """
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    try:
+        with open('/proc/self/io') as f:
+            counters = dict(line.split(':') for line in f)
+    except OSError:
+        return None, None
+    read = int(counters['rchar']) + children.ru_inblock * 512
+    written = int(counters['wchar']) + children.ru_oublock * 512
+    return read, written
+
+
+def cpu_time():
+    """CPU time (user + system) of this process and its finished child processes."""
+    times = os.times()
+    return times.user + times.system + times.children_user + times.children_system
+
+
+class Tracer:
+    """
+    Append-only JSON-lines trace with one record per stage of each time step.
+
+    A record holds the fire, the step, the stage name, the wall and CPU time,
+    the bytes read and written, and what the stage adds to the yielded dict
+    (exit_code of the external program, nodes of the perimeter, area_ha...).
+    A stage that raises is recorded with its error before the exception goes
+    on. Several workers can share the same trace file.
+
+    Parameters:
+    - path: str, trace file (None: nothing is written)
+    """
+
+    def __init__(self, path=None):
+        self.path = str(path) if path is not None else None
+
+    @contextlib.contextmanager
+    def stage(self, fire, step, name):
+        record = {}
+        if self.path is None:  # no trace, not even the counters
+            yield record
+            return
+        start_wall, start_cpu = time.perf_counter(), cpu_time()
+        start_read, start_written = io_counters()
+        try:
+            yield record
+        except BaseException as e:
+            record['error'] = f'{type(e).__name__}: {e}'
+            raise
+        finally:
+            read, written = io_counters()
+            append_record(self.path, {
+                'fire': fire,
+                'step': step,
+                'stage': name,
+                'time': datetime.now().isoformat(timespec='seconds'),
+                'wall_s': round(time.perf_counter() - start_wall, 4),
+                'cpu_s': round(cpu_time() - start_cpu, 4),
+                'bytes_read': read - start_read if read is not None else None,
+                'bytes_written': written - start_written if written is not None else None,
+                **record,
+            }, sync=False)
@@ -0,0 +1,64 @@
+from functools import lru_cache
+import numpy as np
+from pyproj import CRS, Transformer
+
+# Number of (src, dst) transformers kept alive in each process
+TRANSFORMER_CACHE_SIZE = 32
+
+
+# Number of CRS strings (or EPSG codes) whose key is kept in each process
+CRS_KEY_CACHE_SIZE = 128
+
+
+@lru_cache(maxsize=CRS_KEY_CACHE_SIZE)
+def _parsed_crs_key(crs):
+    return CRS.from_user_input(crs).to_wkt()
+
+
+def crs_key(crs):
+    """
+    Normalise a CRS ('epsg:4326', 'EPSG:32632', rasterio or pyproj CRS, proj4...) to a hashable key.
+
+    Parsing a CRS costs about as much as looking up the transformer, so the
+    keys of the strings and EPSG codes, the usual inputs, are cached too.
+    """
+    if isinstance(crs, (str, int)):
+        return _parsed_crs_key(crs)
+    return CRS.from_user_input(crs).to_wkt()
+
+
+@lru_cache(maxsize=TRANSFORMER_CACHE_SIZE)
+def _cached_transformer(src_key, dst_key):
+    return Transformer.from_crs(CRS.from_wkt(src_key), CRS.from_wkt(dst_key), always_xy=True)
+
+
+def get_transformer(src_crs, dst_crs):
+    """
+    Return the (x, y) ordered transformer between two CRS.
+
+    Building a pyproj Transformer is much more expensive than using it, so
+    transformers are cached by normalised (src, dst) CRS: 'epsg:4326',
+    'EPSG:4326' or the rasterio CRS of a raster share the same instance.
+    """
+    return _cached_transformer(crs_key(src_crs), crs_key(dst_crs))
+
+
+def transform_xy(x, y, src_crs, dst_crs):
+    """Transform x/y coordinates (scalars or arrays) between two CRS."""
+    return get_transformer(src_crs, dst_crs).transform(x, y)
+
+
+def transform_coords(coords, src_crs, dst_crs='epsg:4326'):
+    """
+    Transform a whole ring (or any list of points) in one vectorized call.
+
+    Parameters:
+    - coords: array-like of shape (N, 2) or more columns, only x and y are used
+    - src_crs: source CRS
+    - dst_crs: destination CRS (default: EPSG:4326)
+
+    Returns an (N, 2) float array.
+    """
+    coords = np.asarray(coords, dtype=float)
+    x, y = transform_xy(coords[:, 0], coords[:, 1], src_crs, dst_crs)
+    return np.column_stack([x, y])
@@ -0,0 +1,121 @@
+import glob
+import hashlib
+import os
+import shutil
+import tempfile
+import rasterio as rio
+
+# Files written by WindNinja that are needed to build the landscape
+WINDNINJA_OUTPUTS = ('*_vel.asc', '*_ang.asc', '*_vel.prj', '*_ang.prj')
+
+# Settings of the cfg file that do not change the solution
+IGNORED_SETTINGS = ('num_threads',)
+
+
+def windninja_outputs(directory):
+    """List the WindNinja wind grids found in a folder."""
+    files = []
+    for pattern in WINDNINJA_OUTPUTS:
+        files.extend(glob.glob(os.path.join(directory, pattern)))
+    return sorted(files)
+
+
+def raster_digest(raster_path):
+    """Hash the content of a raster (CRS, transform and values), not its file."""
+    digest = hashlib.sha256()
+    with rio.open(raster_path) as src:
+        digest.update(src.crs.to_wkt().encode())
+        digest.update(repr(tuple(src.transform)).encode())
+        digest.update(src.read(1).tobytes())
+    return digest.hexdigest()
+
+
+def cfg_settings(cfg_path):
+    """Return the solver settings of a WindNinja cfg file, without comments and ignored keys."""
+    settings = []
+    with open(cfg_path) as f:
+        for line in f:
+            line = line.split('#', 1)[0].strip()
+            if not line:
+                continue
+            key, _, value = line.partition('=')
+            if key.strip() in IGNORED_SETTINGS:
+                continue
+            settings.append(f'{key.strip()}={value.strip()}')
+    return '\n'.join(settings)
+
+
+class WindNinjaCache:
+    """
+    Content-addressed cache of WindNinja output grids.
+
+    An entry is a folder named after the hash of the elevation raster and of
+    the solver settings of the cfg file (rounded speed, direction, mesh...),
+    so the same domain-average run is only solved once, whatever the fire or
+    scenario asking for it. Entries are published with an atomic rename and
+    the least recently used ones are removed once the cache exceeds max_bytes,
+    which makes the cache safe to share between workers.
+
+    Parameters:
+    - cache_dir: str, directory of the cache
+    - max_bytes: int, size above which the oldest entries are evicted
+    """
+
+    def __init__(self, cache_dir, max_bytes=20 * 1024**3):
+        self.cache_dir = str(cache_dir)
+        self.max_bytes = max_bytes
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def key(self, elevation_digest, cfg_path):
+        """Key of a WindNinja run from the elevation hash and the cfg file."""
+        digest = hashlib.sha256()
+        digest.update(elevation_digest.encode())
+        digest.update(cfg_settings(cfg_path).encode())
+        return digest.hexdigest()
+
+    def restore(self, key, output_dir):
+        """Copy the grids of a cached run into output_dir, return their paths or None on a miss."""
+        entry = os.path.join(self.cache_dir, key)
+        try:
+            files = [shutil.copy(os.path.join(entry, name), output_dir) for name in sorted(os.listdir(entry))]
+            os.utime(entry)  # mark as recently used
+        except OSError:
+            return None  # not cached (or evicted while copying)
+        print(f"WindNinja cache hit: {key[:12]}")
+        return [f for f in files if f.endswith('.asc')]
+
+    def store(self, key, files):
+        """Add the output grids of a WindNinja run to the cache."""
+        entry = os.path.join(self.cache_dir, key)
+        if os.path.exists(entry):
+            return
+
+        temp_dir = tempfile.mkdtemp(prefix='.tmp-', dir=self.cache_dir)
+        for file in files:
+            shutil.copy(file, temp_dir)
+        try:
+            os.rename(temp_dir, entry)
+        except OSError:
+            # Another worker stored the same run in the meantime
+            shutil.rmtree(temp_dir, ignore_errors=True)
+        self.evict()
+
+    def evict(self):
+        """Remove the least recently used entries until the cache fits in max_bytes."""
+        entries = []
+        total = 0
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.startswith('.') or not entry.is_dir():
+                continue
+            try:
+                size = sum(f.stat().st_size for f in os.scandir(entry.path))
+                entries.append((entry.stat().st_mtime, size, entry.path))
+            except OSError:
+                continue  # removed by another worker
+            total += size
+
+        for mtime, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
@@ -1,36 +1,232 @@
+import argparse
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import glob
+from itertools import repeat
+import json
 import os
+import shutil
+import sqlite3
+import time
 import geopandas as gpd
-import json
+import pandas as pd
+from shapely.geometry import shape
 
 # Directory path
 simulation_dir = '/home/jsoma/runs/mediterranean'
 save_dir = '/home/jsoma/results/mediterranean'
+save_name = 'mediterraneaFires_2010_2019.gpkg'
+
+# Layers of the output store
+FINALS_LAYER = 'finals'
+DRAWS_LAYER = 'area_draws'
+
+# Finals parsed by a worker before being sent back, and written at once
+CHUNK_SIZE = 64
+BATCH_SIZE = 5000
+
+# Perimeters are stored in EPSG:4326, as written by main.py
+CRS = 'EPSG:4326'
+
+
+def is_step_dir(name):
+    return name.startswith('t') and name[1:].isdigit()
+
+
+def find_finals(top):
+    """
+    Walk a part of the run tree for the final perimeters of its fires
+    (YYYY-MM-DD_lon_lat/tX/final_tX.geojson) and their area_draws.geojson
+    if main.py was run with --draws/--quantiles. The step folders are not walked.
+    """
+    finals, draws = [], []
+    for root, dirs, files in os.walk(top):
+        if any(is_step_dir(d) for d in dirs):
+            finals.extend(sorted(glob.glob(os.path.join(root, 't*', 'final_*'))))
+            if 'area_draws.geojson' in files:
+                draws.append(os.path.join(root, 'area_draws.geojson'))
+            dirs.clear()
+    return finals, draws
+
+
+def discover(simulation_dir, workers=16):
+    """Find the results of the run tree, each folder of the simulation directory is walked by a thread."""
+    entries = sorted(os.scandir(simulation_dir), key=lambda entry: entry.name)
+    if any(is_step_dir(entry.name) for entry in entries):
+        return find_finals(simulation_dir)  # a single fire
+
+    finals, draws = [], []
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        tops = [entry.path for entry in entries if entry.is_dir()]
+        for top_finals, top_draws in executor.map(find_finals, tops):
+            finals.extend(top_finals)
+            draws.extend(top_draws)
+    return finals, draws
+
+
+def fire_key(path, simulation_dir):
+    """Fire folder of a result, relative to the simulation directory (unique in the store)."""
+    fire_dir = os.path.dirname(path)
+    if os.path.basename(path).startswith('final_'):
+        fire_dir = os.path.dirname(fire_dir)
+    return os.path.relpath(fire_dir, simulation_dir)
+
+
+def read_result(path, simulation_dir):
+    """
+    Parse a final (or area_draws) GeoJSON into plain records, in a worker process.
+
+    Each feature gives the fire, the date of the event (from the folder
+    name YYYY-MM-DD_lon_lat), the step, its properties (one column each, the
+    lists and objects as JSON) and its geometry as WKB so that the records
+    are cheap to send back to the main process.
+    """
+    fire = fire_key(path, simulation_dir)
+    date_str = os.path.basename(fire).split('_')[0]  # YYYY-MM-DD
+    step = os.path.basename(os.path.dirname(path)) if os.path.basename(path).startswith('final_') else None
+
+    with open(path) as f:
+        geojson = json.load(f)
+
+    records = []
+    for feature in geojson['features']:
+        properties = feature.get('properties') or {}
+        record = {'fire': fire, 'date': date_str, 'step': properties.get('step', step), 'source': os.path.basename(path)}
+        if 'draw' in properties:
+            record.update({key: properties.get(key) for key in ('draw', 'area_max', 'quantile', 'area_ha', 'stopped')})
+            record['step'] = f"t{properties['step']}"
+        else:
+            record.update({key: json.dumps(value) if isinstance(value, (dict, list)) else value
+                           for key, value in properties.items() if key not in record})
+        record['geometry'] = shape(feature['geometry']).wkb
+        records.append(record)
+    return records
+
+
+def stored_fires(output, layer):
+    """Fires already in the output store (empty if it does not exist yet)."""
+    if os.path.isdir(output):  # GeoParquet dataset, one file per batch
+        parts = glob.glob(os.path.join(output, layer, '*.parquet'))
+        # without the geometry column, read as a plain table (gpd.read_parquet needs the geometry)
+        return set().union(*(set(pd.read_parquet(p, columns=['fire'])['fire']) for p in parts)) if parts else set()
+    if not os.path.exists(output):
+        return set()
+    # The GeoPackage is a SQLite database, read the column without the geometries
+    with sqlite3.connect(output) as con:
+        exists = con.execute("SELECT 1 FROM gpkg_contents WHERE table_name = ?", (layer,)).fetchone()
+        if not exists:
+            return set()
+        return {row[0] for row in con.execute(f'SELECT DISTINCT fire FROM "{layer}"')}
+
+
+def read_store(output, layer):
+    """Read a layer of the output store, the files of a GeoParquet dataset may have different columns."""
+    if os.path.isdir(output):
+        parts = sorted(glob.glob(os.path.join(output, layer, '*.parquet')))
+        return gpd.GeoDataFrame(pd.concat([gpd.read_parquet(p) for p in parts], ignore_index=True), crs=CRS)
+    return gpd.read_file(output, layer=layer)
+
+
+def gpkg_type(dtype):
+    """SQLite type of a GeoPackage column for a pandas dtype."""
+    if pd.api.types.is_bool_dtype(dtype):
+        return 'BOOLEAN'
+    if pd.api.types.is_integer_dtype(dtype):
+        return 'INTEGER'
+    if pd.api.types.is_float_dtype(dtype):
+        return 'REAL'
+    return 'TEXT'
+
+
+class StoreWriter:
+    """
+    Append batches of records to a GeoPackage layer (with its R-tree spatial
+    index) or to a GeoParquet dataset (a folder per layer, one file per batch).
+
+    The properties of the perimeters may differ from a batch to the other:
+    the columns a GeoPackage layer does not have yet are added to it, and
+    the files of a GeoParquet dataset keep their own columns (see read_store).
+    """
+
+    def __init__(self, output, layer):
+        self.output = output
+        self.layer = layer
+        self.parquet = output.endswith('.parquet')
+        self.rows = 0
+
+    def write(self, records):
+        if not records:
+            return
+        gdf = gpd.GeoDataFrame(records)
+        gdf['geometry'] = gpd.GeoSeries.from_wkb(gdf['geometry'], crs=CRS)
+        gdf = gdf.set_geometry('geometry')
+        if self.parquet:
+            layer_dir = os.path.join(self.output, self.layer)
+            os.makedirs(layer_dir, exist_ok=True)
+            part = len(glob.glob(os.path.join(layer_dir, '*.parquet')))
+            gdf.to_parquet(os.path.join(layer_dir, f'part-{part:05d}.parquet'), write_covering_bbox=True)
+        else:
+            exists = os.path.exists(self.output) and self.layer in gpd.list_layers(self.output)['name'].values
+            if exists:
+                self.add_columns(gdf)
+            gdf.to_file(self.output, layer=self.layer, driver='GPKG', mode='a' if exists else 'w')
+        self.rows += len(gdf)
+
+    def add_columns(self, gdf):
+        """Add the columns of gdf missing from the GeoPackage layer (NULL for the features already stored)."""
+        with sqlite3.connect(self.output) as con:
+            columns = {row[1] for row in con.execute(f'PRAGMA table_info("{self.layer}")')}
+            for column in gdf.columns.drop(gdf.geometry.name):
+                if column not in columns:
+                    con.execute(f'ALTER TABLE "{self.layer}" ADD COLUMN "{column}" {gpkg_type(gdf[column].dtype)}')
+
+
+def aggregate(paths, simulation_dir, writer, workers):
+    """Parse the results in a process pool and stream them to the writer by batches."""
+    batch = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for records in executor.map(read_result, paths, repeat(simulation_dir), chunksize=CHUNK_SIZE):
+            batch.extend(records)
+            if len(batch) >= BATCH_SIZE:
+                writer.write(batch)
+                batch = []
+    writer.write(batch)
+    return writer.rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Collect the final perimeters of a ForeFire scenario in a single GeoPackage or GeoParquet.')
+    parser.add_argument('--simulation-dir', default=simulation_dir, help='Run tree of the scenario')
+    parser.add_argument('--output', default=os.path.join(save_dir, save_name),
+                        help='Output GeoPackage (.gpkg) or GeoParquet dataset folder (.parquet)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Worker processes reading the perimeters')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Only add the fires that are not in the output yet (default: rebuild the output)')
+    parser.add_argument('--draws', action='store_true',
+                        help=f"Also collect the area_draws.geojson of the fires (layer '{DRAWS_LAYER}')")
+    args = parser.parse_args()
+
+    start_time = time.time()
+    if not args.incremental and os.path.exists(args.output):
+        print(f'Replacing {args.output}')
+        if os.path.isdir(args.output):
+            shutil.rmtree(args.output)
+        else:
+            os.remove(args.output)
+
+    finals, draws = discover(args.simulation_dir)
+    print(f'Found {len(finals)} final perimeters in {args.simulation_dir}')
+
+    layers = [(FINALS_LAYER, finals)] + ([(DRAWS_LAYER, draws)] if args.draws else [])
+    for layer, paths in layers:
+        if args.incremental:
+            done = stored_fires(args.output, layer)
+            paths = [p for p in paths if fire_key(p, args.simulation_dir) not in done]
+            print(f'{layer}: {len(done)} fires already stored, {len(paths)} files to add')
+        rows = aggregate(paths, args.simulation_dir, StoreWriter(args.output, layer), args.workers)
+        print(f'{layer}: {rows} features written to {args.output}')
+
+    print(f'Total elapsed time: {(time.time() - start_time) / 60:.2f} minutes')
+
 
-# List to store GeoDataFrames
-gdf_list = []
-
-# Walk through the root directory to find the GeoJSON files
-for root, dirs, files in os.walk(simulation_dir):
-    for file in files:
-        if file.startswith('final_'):
-            # Extract the date from the folder name (YYYY-MM-DD_lon_lat)
-            folder_name = os.path.basename(os.path.dirname(root))
-            date_str = folder_name.split('_')[0]  # YYYY-MM-DD
-            
-            # Full path to the GeoJSON file
-            geojson_path = os.path.join(root, file)
-            
-            # Read the GeoJSON file into a GeoDataFrame
-            gdf = gpd.read_file(geojson_path)
-            
-            gdf['date'] = date_str
-            
-            # Append the GeoDataFrame to the list
-            gdf_list.append(gdf)
-            
-# Concatenate all GeoDataFrames into a single GeoDataFrame
-combined_gdf = gpd.pd.concat(gdf_list, ignore_index=True)
-
-#save thw GeoDataFrame
-save_name = save_dir + '/mediterraneaFires_2010_2019.shp'
-combined_gdf.to_file(save_name)
+if __name__ == '__main__':
+    main()
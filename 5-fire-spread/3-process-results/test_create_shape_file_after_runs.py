@@ -0,0 +1,46 @@
+import json
+import os
+import pytest
+from create_shape_file_after_runs import (FINALS_LAYER, StoreWriter, aggregate, discover, fire_key, read_store,
+                                          stored_fires)
+
+
+def write_final(simulation_dir, fire, properties):
+    """Final perimeter of a fire at simulation_dir/fire/t0/final_t0.geojson."""
+    step_dir = os.path.join(simulation_dir, fire, 't0')
+    os.makedirs(step_dir, exist_ok=True)
+    lon, lat = (float(v) for v in fire.split('_')[1:])
+    ring = [[lon, lat], [lon + 0.01, lat], [lon + 0.01, lat + 0.01], [lon, lat]]
+    geojson = {'type': 'FeatureCollection',
+               'features': [{'type': 'Feature', 'properties': properties,
+                             'geometry': {'type': 'Polygon', 'coordinates': [ring]}}]}
+    with open(os.path.join(step_dir, 'final_t0.geojson'), 'w') as f:
+        json.dump(geojson, f)
+
+
+def add_new_fires(simulation_dir, output):
+    """One --incremental run: only the fires not in the output yet."""
+    finals, _ = discover(simulation_dir)
+    done = stored_fires(output, FINALS_LAYER)
+    paths = [p for p in finals if fire_key(p, simulation_dir) not in done]
+    return aggregate(paths, simulation_dir, StoreWriter(output, FINALS_LAYER), workers=1)
+
+
+@pytest.mark.parametrize('name', ['fires.parquet', 'fires.gpkg'])
+def test_incremental_append(tmp_path, name):
+    simulation_dir, output = str(tmp_path / 'runs'), str(tmp_path / name)
+    write_final(simulation_dir, '2015-07-01_10.0_40.0', {'fireNumber': 1, 'area_ha': 12.5})
+    assert add_new_fires(simulation_dir, output) == 1
+
+    # the second run adds the new fire only, with a property the first one did not have
+    write_final(simulation_dir, '2015-07-02_11.0_41.0', {'fireNumber': 2, 'area_ha': 30.0, 'note': 'late'})
+    assert stored_fires(output, FINALS_LAYER) == {'2015-07-01_10.0_40.0'}
+    assert add_new_fires(simulation_dir, output) == 1
+    assert add_new_fires(simulation_dir, output) == 0
+
+    stored = read_store(output, FINALS_LAYER).sort_values('fire', ignore_index=True)
+    assert list(stored['fire']) == ['2015-07-01_10.0_40.0', '2015-07-02_11.0_41.0']
+    assert list(stored['fireNumber']) == [1, 2]
+    assert list(stored['area_ha']) == [12.5, 30.0]
+    assert stored['note'].isna()[0] and stored['note'][1] == 'late'
+    assert stored.crs == 'EPSG:4326'